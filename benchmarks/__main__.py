@@ -0,0 +1,65 @@
+"""Runs the benchmark suite on synthetic data or compares results of two runs.
+
+Usage:
+    python -m benchmarks run [--suites layers,losses,pipelines] [--quick] [--output results.json]
+    python -m benchmarks compare base.json new.json [--threshold 0.1]
+"""
+import argparse
+import sys
+
+from benchmarks import layers, losses, pipelines
+from benchmarks._results import write_results, load_results, compare_results, result_key
+
+
+SUITES = {"layers": layers, "losses": losses, "pipelines": pipelines}
+
+
+def run(args):
+    results = []
+    for name in args.suites.split(","):
+        suite_results = SUITES[name].run(quick=args.quick)
+        for result in suite_results:
+            value = f"{result['median_s'] * 1000:.2f} ms" if "median_s" in result \
+                else f"{result['images_per_sec']:.0f} images/sec"
+            print(f"{result_key(result)}: {value}")
+        results.extend(suite_results)
+
+    write_results(results, args.output)
+    print(f"Results are written to {args.output}")
+
+
+def compare(args):
+    comparison = compare_results(load_results(args.base), load_results(args.new), args.threshold)
+    regressions_count = 0
+    for key, metric, base_value, new_value, change, is_regression in comparison:
+        regressions_count += int(is_regression)
+        flag = "REGRESSION" if is_regression else ""
+        print(f"{key} {metric}: {base_value:.4g} -> {new_value:.4g} ({change:+.1%}) {flag}".rstrip())
+    print(f"{len(comparison)} results compared, {regressions_count} regressions")
+    return 1 if regressions_count else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run benchmarks and write results as JSON")
+    run_parser.add_argument("--suites", default=",".join(SUITES), help="Comma-separated suites to run")
+    run_parser.add_argument("--quick", action="store_true", help="Use small inputs, e.g. to check that suites work")
+    run_parser.add_argument("--output", default="benchmark_results.json")
+
+    compare_parser = subparsers.add_parser("compare", help="Compare two runs and flag regressions")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=0.1,
+                                help="Relative slowdown that is considered a regression")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    else:
+        sys.exit(compare(args))
+
+
+if __name__ == "__main__":
+    main()
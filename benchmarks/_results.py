@@ -0,0 +1,68 @@
+"""Machine-readable benchmark results and comparison of two runs."""
+import json
+import os
+import platform
+import time
+
+import tensorflow as tf
+
+
+# Metrics that are compared between runs, with True for the ones where higher values are better
+COMPARED_METRICS = {"median_s": False, "images_per_sec": True}
+
+
+def timing_result(name, params, times):
+    """Creates a result of a timed operation from a dict returned by measure_time()."""
+    return {"name": name, "params": params,
+            "mean_s": times["mean"], "median_s": times["median"], "min_s": times["min"]}
+
+
+def throughput_result(name, params, images_per_sec):
+    """Creates a result of an input pipeline throughput measurement."""
+    return {"name": name, "params": params, "images_per_sec": images_per_sec}
+
+
+def result_key(result):
+    params = ",".join(f"{name}={value}" for name, value in sorted(result["params"].items()))
+    return f"{result['name']}[{params}]"
+
+
+def write_results(results, path):
+    """Writes results with environment metadata as JSON."""
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": {"tensorflow": tf.__version__, "python": platform.python_version(),
+                        "machine": platform.machine(), "cpu_count": os.cpu_count()},
+        "results": results
+    }
+    with open(path, "w") as file:
+        json.dump(report, file, indent=2)
+
+
+def load_results(path):
+    with open(path) as file:
+        return json.load(file)["results"]
+
+
+def compare_results(base_results, new_results, threshold=0.1):
+    """Compares results of two runs.
+
+    :param base_results: A list of results of the base run
+    :param new_results: A list of results of the new run
+    :param threshold: A relative change of a metric in the worse direction that is considered a regression
+    :return: A list of (key, metric, base value, new value, relative change, is regression) tuples for results that are
+        present in both runs, where the relative change is positive if the new value is better
+    """
+    base_results = {result_key(result): result for result in base_results}
+    comparison = []
+    for new_result in new_results:
+        key = result_key(new_result)
+        if key not in base_results:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            if metric not in new_result or metric not in base_results[key]:
+                continue
+            base_value, new_value = base_results[key][metric], new_result[metric]
+            change = new_value / base_value - 1 if higher_is_better else base_value / new_value - 1
+            comparison.append((key, metric, base_value, new_value, change, change < -threshold))
+    return comparison
@@ -0,0 +1,23 @@
+"""Utilities shared by benchmarks."""
+import time
+
+import numpy as np
+
+
+def measure_time(fn, repeats=10, warmup=2):
+    """Measures execution time of a function.
+
+    :param fn: A function without arguments to measure
+    :param repeats: Number of measured calls
+    :param warmup: Number of calls before measurement (e.g. to trace tf.function)
+    :return: A dict with mean, median and min time of a call in seconds
+    """
+    for _ in range(warmup):
+        fn()
+
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {"mean": float(np.mean(times)), "median": float(np.median(times)), "min": float(np.min(times))}
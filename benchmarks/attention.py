@@ -0,0 +1,121 @@
+"""Compares multi-headed attention with the previous implementation, that used Dense layers for projections and created
+the output one in call(), in the TransformerEncoder configuration used for MJSynth training (5 layers, 512 dims, 8
+heads).
+
+Each implementation is measured in a separate process, so that peak memory usage is reported independently.
+
+Usage: python -m benchmarks.attention [--batch-size N] [--steps N]
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+
+import tensorflow as tf
+
+import vit
+from benchmarks._utils import measure_time
+
+
+NUM_LAYERS = 5
+MODEL_DIM = 512
+NUM_HEADS = 8
+MLP_DIM = 2048
+POSITIONS = 25
+
+VARIANTS = ("legacy", "current")
+
+
+class LegacyMultiHeadAttention(tf.keras.layers.Layer):
+    """The previous implementation of multi-headed attention with separate Dense projections."""
+
+    def __init__(self, num_heads, key_dim):
+        super().__init__()
+        self.num_heads = num_heads
+        self.key_dim = key_dim
+        self.dense_query = tf.keras.layers.Dense(num_heads * key_dim)
+        self.dense_value = tf.keras.layers.Dense(num_heads * key_dim)
+        self.dense_key = tf.keras.layers.Dense(num_heads * key_dim)
+        self.dense_output = None
+
+    def call(self, query, value=None, key=None):
+        value = query if value is None else value
+        key = value if key is None else key
+        if self.dense_output is None:
+            self.dense_output = tf.keras.layers.Dense(key.shape[-1])
+
+        query = self._split_heads(self.dense_query(query))
+        value = self._split_heads(self.dense_value(value))
+        key = self._split_heads(self.dense_key(key))
+
+        attention = tf.matmul(query, key, transpose_b=True)
+        attention = attention / tf.math.sqrt(tf.cast(tf.shape(key)[-1], tf.float32))
+        output = tf.matmul(tf.nn.softmax(attention, axis=-1), value)
+
+        output = tf.transpose(output, [0, 2, 1, 3])
+        output = tf.reshape(output, [-1, tf.shape(output)[1], self.num_heads * self.key_dim])
+        return self.dense_output(output)
+
+    def _split_heads(self, concat_heads):
+        concat_heads_shape = tf.shape(concat_heads)
+        concat_heads = tf.reshape(concat_heads, [concat_heads_shape[0], concat_heads_shape[1], self.num_heads, -1])
+        return tf.transpose(concat_heads, [0, 2, 1, 3])
+
+
+def build_encoder(variant):
+    encoder = vit.layers.TransformerEncoder(NUM_LAYERS, MODEL_DIM, NUM_HEADS, MLP_DIM)
+    if variant == "legacy":
+        for encoder_layer in encoder.encoder_layers:
+            encoder_layer.mha = LegacyMultiHeadAttention(NUM_HEADS, MODEL_DIM // NUM_HEADS)
+    return encoder
+
+
+def run_variant(variant, batch_size, steps):
+    """Measures a training step (forward and backward passes) of the encoder and returns results as a dict."""
+    inputs = tf.random.normal([batch_size, POSITIONS, MODEL_DIM])
+    encoder = build_encoder(variant)
+    encoder(inputs)
+
+    @tf.function
+    def step():
+        with tf.GradientTape() as tape:
+            loss = tf.reduce_mean(tf.square(encoder(inputs, training=True)))
+        return tape.gradient(loss, encoder.trainable_variables)
+
+    step()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    timing = measure_time(step, repeats=steps, warmup=1)
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return {"variant": variant, "step_time": timing["median"],
+            "peak_rss_mb": rss_after / 1024, "step_rss_growth_mb": (rss_after - rss_before) / 1024}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=512)
+    parser.add_argument("--steps", type=int, default=10)
+    parser.add_argument("--variant", choices=VARIANTS, help="Measure a single variant in the current process")
+    args = parser.parse_args()
+
+    if args.variant is not None:
+        print(json.dumps(run_variant(args.variant, args.batch_size, args.steps)))
+        return
+
+    results = {}
+    for variant in VARIANTS:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.attention", "--variant", variant,
+             "--batch-size", str(args.batch_size), "--steps", str(args.steps)],
+            check=True, capture_output=True, text=True).stdout
+        results[variant] = json.loads(output.strip().splitlines()[-1])
+        print(f"{variant:>6}: step time {results[variant]['step_time'] * 1000:.1f} ms, "
+              f"peak RSS {results[variant]['peak_rss_mb']:.0f} MB")
+
+    print(f"Step time speedup: {results['legacy']['step_time'] / results['current']['step_time']:.2f}x, "
+          f"peak RSS reduction: {results['legacy']['peak_rss_mb'] - results['current']['peak_rss_mb']:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Compares the full attention with the blocked one (MultiHeadAttention(block_size=...)), that doesn't store attention
+matrices, in the TransformerEncoder configuration used for MJSynth training for increasing numbers of patches (e.g.
+of wide images or of narrower patches).
+
+Each variant and number of patches is measured in a separate process, so that peak memory usage is reported
+independently.
+
+Usage: python -m benchmarks.blocked_attention [--batch-size N] [--steps N] [--positions 25 50 100 200 400]
+    [--block-size N]
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+
+import tensorflow as tf
+
+import vit
+from benchmarks._utils import measure_time
+
+
+NUM_LAYERS = 5
+MODEL_DIM = 512
+NUM_HEADS = 8
+MLP_DIM = 2048
+
+VARIANTS = ("full", "blocked")
+
+
+def run_variant(variant, positions, batch_size, block_size, steps):
+    """Measures a training step (forward and backward passes) of the encoder and returns results as a dict."""
+    inputs = tf.random.normal([batch_size, positions, MODEL_DIM])
+    encoder = vit.layers.TransformerEncoder(NUM_LAYERS, MODEL_DIM, NUM_HEADS, MLP_DIM,
+                                            mha_block_size=block_size if variant == "blocked" else None)
+    encoder(inputs)
+
+    @tf.function
+    def step():
+        with tf.GradientTape() as tape:
+            loss = tf.reduce_mean(tf.square(encoder(inputs, training=True)))
+        return tape.gradient(loss, encoder.trainable_variables)
+
+    step()
+    timing = measure_time(step, repeats=steps, warmup=1)
+
+    return {"variant": variant, "positions": positions, "step_time": timing["median"],
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=512)
+    parser.add_argument("--steps", type=int, default=5)
+    parser.add_argument("--positions", type=int, nargs="+", default=[25, 50, 100, 200, 400])
+    parser.add_argument("--block-size", type=int, default=32)
+    parser.add_argument("--variant", choices=VARIANTS, help="Measure a single variant in the current process")
+    args = parser.parse_args()
+
+    if args.variant is not None:
+        print(json.dumps(run_variant(args.variant, args.positions[0], args.batch_size, args.block_size, args.steps)))
+        return
+
+    for positions in args.positions:
+        results = {}
+        for variant in VARIANTS:
+            process = subprocess.run(
+                [sys.executable, "-m", "benchmarks.blocked_attention", "--variant", variant,
+                 "--positions", str(positions), "--batch-size", str(args.batch_size),
+                 "--block-size", str(args.block_size), "--steps", str(args.steps)],
+                capture_output=True, text=True)
+            # The full attention may run out of memory for long sequences
+            if process.returncode != 0:
+                print(f"{positions:>4} patches, {variant:>7}: failed with exit code {process.returncode}")
+                continue
+            results[variant] = json.loads(process.stdout.strip().splitlines()[-1])
+            print(f"{positions:>4} patches, {variant:>7}: step time {results[variant]['step_time'] * 1000:.1f} ms, "
+                  f"peak RSS {results[variant]['peak_rss_mb']:.0f} MB")
+
+        if len(results) == len(VARIANTS):
+            print(f"{positions:>4} patches: step time ratio "
+                  f"{results['blocked']['step_time'] / results['full']['step_time']:.2f}x, peak RSS reduction "
+                  f"{results['full']['peak_rss_mb'] - results['blocked']['peak_rss_mb']:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Scaling efficiency of data-parallel training across local CPU workers.
+
+Runs python -m vit.train.distributed with 1, 2, 4, ... workers (each pinned to its own group of CPUs and using the same
+per-worker batch size) and reports throughput and efficiency relative to linear scaling of a single worker.
+
+Usage: python -m benchmarks.distributed_scaling [--workers 1,2,4] [--steps N] [-- arguments of vit.train.distributed]
+"""
+import argparse
+import json
+import os
+import tempfile
+from pathlib import Path
+
+from vit.train.launch import launch
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated numbers of workers")
+    parser.add_argument("--steps", type=int, default=30)
+    parser.add_argument("--per-worker-batch-size", type=int, default=64)
+    parser.add_argument("worker_args", nargs=argparse.REMAINDER, help="Additional arguments of workers after --")
+    args = parser.parse_args()
+
+    worker_args = args.worker_args[1:] if args.worker_args[:1] == ["--"] else args.worker_args
+    cpus_count = len(os.sched_getaffinity(0))
+
+    throughputs = {}
+    with tempfile.TemporaryDirectory() as path:
+        for workers_count in map(int, args.workers.split(",")):
+            output_path = Path(path) / f"{workers_count}.json"
+            threads = max(cpus_count // workers_count, 1)
+            exit_code, exit_codes = launch(workers_count, worker_args + [
+                "--steps", str(args.steps), "--per-worker-batch-size", str(args.per_worker_batch_size),
+                "--threads", str(threads), "--output", str(output_path)], pin_cpus=True)
+            if exit_code:
+                raise RuntimeError(f"Training with {workers_count} workers failed with exit codes {exit_codes}")
+            throughputs[workers_count] = json.loads(output_path.read_text())["samples_per_sec"]
+
+    base_workers_count = min(throughputs)
+    base_throughput = throughputs[base_workers_count] / base_workers_count
+    print(f"{'workers':>8} {'samples/sec':>12} {'efficiency':>11}")
+    for workers_count, throughput in throughputs.items():
+        print(f"{workers_count:>8} {throughput:>12.1f} {throughput / (base_throughput * workers_count):>11.1%}")
+
+
+if __name__ == "__main__":
+    main()
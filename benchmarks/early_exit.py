@@ -0,0 +1,77 @@
+"""Accuracy-latency curve of early exit inference on IIIT5K.
+
+Evaluates a model with early exit heads for a range of confidence thresholds and reports accuracy, mean number of
+encoder layers that were run per sample and latency per batch. If no model or dataset is passed, an untrained model and
+a fake on-disk IIIT5K dataset are used, which is only useful to check latency.
+
+Usage: python -m benchmarks.early_exit [--model PATH] [--iiit5k PATH] [--batch-size N] [--samples N]
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+import datasets
+import vit
+from datasets import generate_iiit5k
+
+
+THRESHOLDS = (0.0, 0.5, 0.8, 0.9, 0.95, 0.99, 1.1)
+
+
+def build_untrained_model():
+    return vit.models.build_vit_str(len(datasets.CHARS) + 1, datasets.IMAGE_HEIGHT, datasets.IMAGE_CHANNELS,
+                                    image_width=datasets.IMAGE_WIDTH, exit_layers=[2, 3, 4])
+
+
+def evaluate_threshold(early_exit_model, test_ds, threshold, batch_size):
+    decoder = vit.decoding.GreedyDecoder(
+        label_folding=vit.decoding.label_folding_matrix(datasets.CHARS, datasets.IIIT5K_CHARS))
+    latencies, exit_layers = [], []
+
+    def predict(images):
+        start_time = time.perf_counter()
+        y_pred, batch_exit_layers = early_exit_model.predict(images, threshold)
+        y_pred = y_pred.numpy()
+        latencies.append(time.perf_counter() - start_time)
+        exit_layers.extend(batch_exit_layers.numpy())
+        return y_pred
+
+    predict(next(iter(test_ds.map(lambda image, labels: image).batch(batch_size))))  # Warmup
+    latencies.clear()
+    exit_layers.clear()
+    accuracy = vit.inference.evaluate_accuracy(predict, test_ds, decoder, batch_size)
+    return accuracy, float(np.mean(exit_layers)), float(np.mean(latencies)) * 1000
+
+
+def run(args, iiit5k_path):
+    model = vit.models.load_vit_str(args.model) if args.model else build_untrained_model()
+    early_exit_model = vit.inference.EarlyExitModel(model)
+
+    test_ds = datasets.load_iiit5k(iiit5k_path)[1].take(args.samples).cache()
+
+    print(f"{'threshold':>10} {'accuracy':>10} {'layers':>8} {'ms/batch':>10}")
+    for threshold in THRESHOLDS:
+        accuracy, mean_layers, latency = evaluate_threshold(early_exit_model, test_ds, threshold, args.batch_size)
+        print(f"{threshold:>10.2f} {accuracy:>10.2%} {mean_layers:>8.2f} {latency:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", help="Path to a saved model with early exit heads")
+    parser.add_argument("--iiit5k", help="Path to the IIIT5K dataset")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--samples", type=int, default=3000, help="Maximal number of test samples")
+    args = parser.parse_args()
+
+    if args.iiit5k is not None:
+        run(args, args.iiit5k)
+    else:
+        with tempfile.TemporaryDirectory() as path:
+            generate_iiit5k(path, min(args.samples, 512))
+            run(args, path)
+
+
+if __name__ == "__main__":
+    main()
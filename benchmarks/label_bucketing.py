@@ -0,0 +1,82 @@
+"""Compares plain padded batching with batching by label length on synthetic data.
+
+Usage: python -m benchmarks.label_bucketing [--samples N] [--batch-size N]
+"""
+import argparse
+import time
+
+import numpy as np
+import tensorflow as tf
+
+import datasets
+import vit
+
+
+LABELS_PADDING_CONST = -1
+CLASSES_COUNT = len(datasets.CHARS) + 1
+FRAMES_COUNT = 25
+
+# Approximate distribution of word lengths in MJSynth
+WORD_LENGTHS = np.arange(1, 24)
+WORD_LENGTH_WEIGHTS = np.exp(-0.5 * ((WORD_LENGTHS - 7.5) / 2.5) ** 2)
+WORD_LENGTH_WEIGHTS /= WORD_LENGTH_WEIGHTS.sum()
+
+BUCKET_BOUNDARIES = [5, 7, 9, 11, 14]
+
+
+def build_synthetic_dataset(samples_count, seed=42):
+    rng = np.random.default_rng(seed)
+    lengths = rng.choice(WORD_LENGTHS, size=samples_count, p=WORD_LENGTH_WEIGHTS)
+    labels = tf.RaggedTensor.from_row_lengths(
+        rng.integers(0, CLASSES_COUNT - 1, size=lengths.sum()).astype(np.int32), lengths)
+    image = tf.zeros([datasets.IMAGE_HEIGHT, datasets.IMAGE_WIDTH, datasets.IMAGE_CHANNELS])
+    return tf.data.Dataset.from_tensor_slices(labels).map(lambda sample_labels: (image, sample_labels))
+
+
+def measure_throughput(dataset, samples_count):
+    ctc_loss = vit.losses.CTCLoss(true_labels_padding_value=LABELS_PADDING_CONST)
+    ctc_accuracy = vit.metrics.CTCAccuracy(true_labels_padding_value=LABELS_PADDING_CONST)
+
+    @tf.function(input_signature=[tf.TensorSpec([None, None], tf.int32)])
+    def step(labels):
+        y_pred = tf.nn.softmax(tf.random.normal([tf.shape(labels)[0], FRAMES_COUNT, CLASSES_COUNT]))
+        ctc_accuracy.update_state(labels, y_pred)
+        return ctc_loss(labels, y_pred)
+
+    dataset = dataset.cache()
+    for _, labels in dataset:  # Warmup pass that fills the cache and traces the step
+        step(labels)
+
+    start = time.perf_counter()
+    for _, labels in dataset:
+        step(labels)
+    return samples_count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--samples", type=int, default=50000)
+    parser.add_argument("--batch-size", type=int, default=512)
+    args = parser.parse_args()
+
+    samples_ds = build_synthetic_dataset(args.samples)
+    padded_ds = samples_ds.padded_batch(
+        args.batch_size,
+        padded_shapes=([datasets.IMAGE_HEIGHT, datasets.IMAGE_WIDTH, datasets.IMAGE_CHANNELS], [None]),
+        padding_values=(None, LABELS_PADDING_CONST))
+    bucketed_ds = datasets.bucket_by_label_length(samples_ds, BUCKET_BOUNDARIES, args.batch_size,
+                                                  labels_padding_value=LABELS_PADDING_CONST,
+                                                  shuffle_buffer_size=10000, seed=42)
+
+    results = {}
+    for name, dataset in (("padded_batch", padded_ds), ("bucket_by_label_length", bucketed_ds)):
+        results[name] = (datasets.labels_padding_ratio(dataset, LABELS_PADDING_CONST),
+                         measure_throughput(dataset, args.samples))
+        print(f"{name:>24}: padding ratio {results[name][0]:.3f}, {results[name][1]:.0f} samples/sec")
+
+    gain = results["bucket_by_label_length"][1] / results["padded_batch"][1]
+    print(f"Throughput gain of CTC loss and accuracy: {gain:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
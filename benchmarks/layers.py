@@ -0,0 +1,70 @@
+"""Forward and backward pass timings of vit layers on synthetic inputs."""
+import itertools
+
+import tensorflow as tf
+
+import datasets
+import vit
+from benchmarks._utils import measure_time
+from benchmarks._results import timing_result
+
+
+PATCH_WIDTH = 4
+
+# Benchmarked (batch size, sequence length, model dim) combinations
+GRID = {"batch_size": (32, 128), "sequence_length": (25, 50), "model_dim": (256, 512)}
+QUICK_GRID = {"batch_size": (8,), "sequence_length": (25,), "model_dim": (64,)}
+
+
+def build_layer(name, model_dim):
+    if name == "HorizontalPatching":
+        return vit.layers.HorizontalPatching(PATCH_WIDTH, datasets.IMAGE_HEIGHT, datasets.IMAGE_CHANNELS)
+    if name == "PositionalEncoding":
+        return vit.layers.PositionalEncoding()
+    if name == "MultiHeadAttention":
+        return vit.layers.MultiHeadAttention(8, model_dim // 8)
+    if name == "TransformerEncoder":
+        return vit.layers.TransformerEncoder(2, model_dim, 8, 4 * model_dim)
+    raise ValueError(f"Unknown layer {name}")
+
+
+def build_inputs(name, batch_size, sequence_length, model_dim):
+    if name == "HorizontalPatching":
+        # Patching doesn't depend on the model dim, images are as wide as needed for the sequence length
+        shape = [batch_size, datasets.IMAGE_HEIGHT, sequence_length * PATCH_WIDTH, datasets.IMAGE_CHANNELS]
+    else:
+        shape = [batch_size, sequence_length, model_dim]
+    return tf.random.uniform(shape, -1, 1)
+
+
+def benchmark_layer(name, batch_size, sequence_length, model_dim, repeats):
+    layer = build_layer(name, model_dim)
+    inputs = build_inputs(name, batch_size, sequence_length, model_dim)
+
+    @tf.function
+    def forward():
+        return layer(inputs, training=True)
+
+    @tf.function
+    def backward():
+        with tf.GradientTape() as tape:
+            tape.watch(inputs)
+            loss = tf.reduce_sum(layer(inputs, training=True))
+        return tape.gradient(loss, [inputs] + layer.trainable_weights)
+
+    params = {"batch_size": batch_size, "sequence_length": sequence_length, "model_dim": model_dim}
+    return [timing_result(f"layers/{name}/forward", params, measure_time(forward, repeats)),
+            timing_result(f"layers/{name}/backward", params, measure_time(backward, repeats))]
+
+
+def run(quick=False, repeats=10):
+    """Runs the benchmark and returns a list of results."""
+    grid = QUICK_GRID if quick else GRID
+    results = []
+    for name in ("HorizontalPatching", "PositionalEncoding", "MultiHeadAttention", "TransformerEncoder"):
+        for batch_size, sequence_length, model_dim in itertools.product(*grid.values()):
+            # Patching is the same for all model dims
+            if name == "HorizontalPatching" and model_dim != grid["model_dim"][0]:
+                continue
+            results.extend(benchmark_layer(name, batch_size, sequence_length, model_dim, repeats))
+    return results
@@ -0,0 +1,66 @@
+"""Throughput of tiled recognition of long text lines.
+
+Compares Recognizer, which squashes every line to the model input size, with LineRecognizer, which cuts lines into
+overlapping windows and runs windows of all lines in common batches. Reports lines and windows per second for a range
+of line widths. If no model is passed, an untrained model is used, which is only useful to check throughput.
+
+Usage: python -m benchmarks.line_tiling [--model PATH] [--lines N] [--overlap 40] [--repeats N]
+"""
+import argparse
+import time
+
+import numpy as np
+import tensorflow as tf
+
+import datasets
+import vit
+
+
+LINE_WIDTHS = (100, 200, 400, 800, 1600)
+
+
+def build_untrained_model():
+    return vit.models.build_vit_str(len(datasets.CHARS) + 1, datasets.IMAGE_HEIGHT, datasets.IMAGE_CHANNELS,
+                                    image_width=datasets.IMAGE_WIDTH)
+
+
+def generate_lines(count, width, seed=42):
+    rng = np.random.default_rng(seed)
+    return [tf.io.encode_png(rng.integers(0, 255, size=[datasets.IMAGE_HEIGHT, width, 1], dtype=np.uint8)).numpy()
+            for _ in range(count)]
+
+
+def measure(recognizer, images, repeats):
+    recognizer.recognize(images)  # Warmup
+    durations = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        recognizer.recognize(images)
+        durations.append(time.perf_counter() - start_time)
+    return float(np.median(durations))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", help="Path to a saved model")
+    parser.add_argument("--lines", type=int, default=64, help="Number of lines that are recognized at once")
+    parser.add_argument("--overlap", type=int, default=40)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    model = tf.keras.models.load_model(args.model, compile=False) if args.model else build_untrained_model()
+    recognizer = vit.inference.Recognizer(model)
+    line_recognizer = vit.inference.LineRecognizer(model, overlap=args.overlap)
+
+    print(f"{'width':>6} {'windows':>8} {'squashed lines/s':>17} {'tiled lines/s':>14} {'tiled windows/s':>16}")
+    for width in LINE_WIDTHS:
+        images = generate_lines(args.lines, width)
+        windows_count = sum(len(line_recognizer.tile(line_recognizer.preprocess(image))[1]) for image in images)
+        squashed_duration = measure(recognizer, images, args.repeats)
+        tiled_duration = measure(line_recognizer, images, args.repeats)
+        print(f"{width:>6} {windows_count:>8} {args.lines / squashed_duration:>17.1f} "
+              f"{args.lines / tiled_duration:>14.1f} {windows_count / tiled_duration:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
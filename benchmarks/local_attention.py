@@ -0,0 +1,108 @@
+"""Compares the full attention with the local one (MultiHeadAttention(attention_window=...)), with and without global
+tokens.
+
+Throughput of training steps and of inference of the TransformerEncoder configuration used for MJSynth training is
+measured for increasing numbers of patches (e.g. of wide images or of narrower patches). If MJSynth and IIIT5K paths are
+passed, small ViT-STR models of every variant are also trained on MJSynth with vit.train.trainer and their accuracy on
+IIIT5K is reported.
+
+Usage: python -m benchmarks.local_attention [--batch-size N] [--steps N] [--positions 25 50 100 200 400 800]
+    [--window 8] [--global-tokens 2] [--mjsynth PATH --iiit5k PATH [--train-steps N] [--output-dir DIR]]
+"""
+import argparse
+from pathlib import Path
+
+import tensorflow as tf
+
+import datasets
+import vit
+from benchmarks._utils import measure_time
+from vit.decoding import GreedyDecoder, label_folding_matrix
+from vit.train.trainer import merge_config, train
+
+
+NUM_LAYERS = 5
+MODEL_DIM = 512
+NUM_HEADS = 8
+MLP_DIM = 2048
+
+
+def variants(window, global_tokens):
+    """Returns a dict of variant names and their arguments of TransformerEncoder."""
+    return {"full": {},
+            "local": {"mha_attention_window": window},
+            "local_global": {"mha_attention_window": window, "global_tokens": global_tokens}}
+
+
+def measure_throughput(encoder_args, positions, batch_size, steps):
+    """Measures a training step and inference of the encoder and returns their median time in seconds."""
+    inputs = tf.random.normal([batch_size, positions, MODEL_DIM])
+    encoder = vit.layers.TransformerEncoder(NUM_LAYERS, MODEL_DIM, NUM_HEADS, MLP_DIM, **encoder_args)
+    encoder(inputs)
+
+    @tf.function
+    def train_step():
+        with tf.GradientTape() as tape:
+            loss = tf.reduce_mean(tf.square(encoder(inputs, training=True)))
+        return tape.gradient(loss, encoder.trainable_variables)
+
+    @tf.function
+    def predict():
+        return encoder(inputs, training=False)
+
+    return (measure_time(train_step, repeats=steps, warmup=1)["median"],
+            measure_time(predict, repeats=steps, warmup=1)["median"])
+
+
+def evaluate_variants(args):
+    """Trains a small model of every variant on MJSynth and returns accuracy on IIIT5K."""
+    test_ds = datasets.load_iiit5k(args.iiit5k)[1]
+    # IIIT5K labels are case-insensitive
+    decoder = GreedyDecoder(label_folding=label_folding_matrix(datasets.CHARS, datasets.IIIT5K_CHARS))
+    batch_size = 256
+    accuracy = {}
+    for name, encoder_args in variants(args.window, args.global_tokens).items():
+        model_config = {"num_layers": 2, "model_dim": 256, "num_heads": 4, "mlp_dim": 1024,
+                        "attention_window": encoder_args.get("mha_attention_window"),
+                        "global_tokens": encoder_args.get("global_tokens", 0)}
+        config = merge_config({
+            "data": {"mjsynth": args.mjsynth, "train_size": args.train_steps * batch_size, "batch_size": batch_size},
+            "model": model_config,
+            "training": {"epochs": 1, "log_every": 1000},
+            "output_dir": (Path(args.output_dir) / name).as_posix()
+        })
+        model = train(config)
+        predict = tf.function(lambda images, model=model: model(images, training=False), reduce_retracing=True)
+        accuracy[name] = vit.inference.evaluate_accuracy(predict, test_ds, decoder)
+        print(f"{name:>12}: IIIT5K accuracy {accuracy[name]:.2%}")
+    return accuracy
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--steps", type=int, default=5)
+    parser.add_argument("--positions", type=int, nargs="+", default=[25, 50, 100, 200, 400, 800])
+    parser.add_argument("--window", type=int, default=8, help="Maximal distance between attending patches")
+    parser.add_argument("--global-tokens", type=int, default=2)
+    parser.add_argument("--mjsynth", help="Path to MJSynth for the accuracy comparison")
+    parser.add_argument("--iiit5k", help="Path to IIIT5K for the accuracy comparison")
+    parser.add_argument("--train-steps", type=int, default=20000, help="Training steps of every variant")
+    parser.add_argument("--output-dir", default="local_attention")
+    args = parser.parse_args()
+
+    print(f"{'patches':>8} {'variant':>12} {'train ms':>9} {'infer ms':>9} {'train speedup':>14}")
+    for positions in args.positions:
+        full_train_time = None
+        for name, encoder_args in variants(args.window, args.global_tokens).items():
+            train_time, predict_time = measure_throughput(encoder_args, positions, args.batch_size, args.steps)
+            full_train_time = full_train_time or train_time
+            print(f"{positions:>8} {name:>12} {train_time * 1000:>9.1f} {predict_time * 1000:>9.1f} "
+                  f"{full_train_time / train_time:>13.2f}x")
+
+    if args.mjsynth is not None and args.iiit5k is not None:
+        evaluate_variants(args)
+
+
+if __name__ == "__main__":
+    main()
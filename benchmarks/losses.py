@@ -0,0 +1,75 @@
+"""Per-batch timings of CTCLoss and CTC metrics on synthetic predictions."""
+import itertools
+
+import numpy as np
+import tensorflow as tf
+
+import datasets
+import vit
+from benchmarks._utils import measure_time
+from benchmarks._results import timing_result
+
+
+LABELS_PADDING_CONST = -1
+CLASSES_COUNT = len(datasets.CHARS) + 1
+MAX_LABEL_LENGTH = 23
+
+# Metrics are updated on every UPDATE_EVERY-th batch in the corresponding benchmarks
+UPDATE_EVERY = 10
+
+# Benchmarked (batch size, frames count) combinations
+GRID = {"batch_size": (128, 512), "frames_count": (25, 50)}
+QUICK_GRID = {"batch_size": (32,), "frames_count": (25,)}
+
+
+def build_batch(batch_size, frames_count, seed=42):
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(1, min(MAX_LABEL_LENGTH, frames_count // 2) + 1, size=batch_size)
+    labels = np.full([batch_size, lengths.max()], LABELS_PADDING_CONST, dtype=np.int32)
+    for i, length in enumerate(lengths):
+        labels[i, :length] = rng.integers(0, CLASSES_COUNT - 1, size=length)
+    y_pred = tf.nn.softmax(tf.random.normal([batch_size, frames_count, CLASSES_COUNT], seed=seed))
+    return tf.constant(labels), y_pred
+
+
+def run(quick=False, repeats=10):
+    """Runs the benchmark and returns a list of results."""
+    grid = QUICK_GRID if quick else GRID
+    ctc_loss = vit.losses.CTCLoss(true_labels_padding_value=LABELS_PADDING_CONST)
+    ctc_accuracy = vit.metrics.CTCAccuracy(true_labels_padding_value=LABELS_PADDING_CONST)
+    sparse_ctc_accuracy = vit.metrics.CTCAccuracy(true_labels_padding_value=LABELS_PADDING_CONST,
+                                                  update_every=UPDATE_EVERY)
+    sparse_ctc_accuracy.decoding.set_skipping(True)
+    # Accuracy, character error rate and normalized edit distance that share decoding
+    decoding = vit.metrics.GreedyDecoding(true_labels_padding_value=LABELS_PADDING_CONST)
+    shared_metrics = [vit.metrics.CTCAccuracy(decoding=decoding), vit.metrics.CharacterErrorRate(decoding=decoding),
+                      vit.metrics.NormalizedEditDistance(decoding=decoding)]
+
+    results = []
+    for batch_size, frames_count in itertools.product(*grid.values()):
+        y_true, y_pred = build_batch(batch_size, frames_count)
+        params = {"batch_size": batch_size, "frames_count": frames_count}
+
+        @tf.function
+        def loss_step():
+            return ctc_loss(y_true, y_pred)
+
+        @tf.function
+        def accuracy_step():
+            ctc_accuracy.update_state(y_true, y_pred)
+
+        @tf.function
+        def sparse_accuracy_step():
+            sparse_ctc_accuracy.update_state(y_true, y_pred)
+
+        @tf.function
+        def shared_metrics_step():
+            for metric in shared_metrics:
+                metric.update_state(y_true, y_pred)
+
+        results.append(timing_result("losses/CTCLoss", params, measure_time(loss_step, repeats)))
+        results.append(timing_result("metrics/CTCAccuracy", params, measure_time(accuracy_step, repeats)))
+        results.append(timing_result("metrics/CTCAccuracy", dict(params, update_every=UPDATE_EVERY),
+                                     measure_time(sparse_accuracy_step, repeats)))
+        results.append(timing_result("metrics/shared_decoding", params, measure_time(shared_metrics_step, repeats)))
+    return results
@@ -0,0 +1,62 @@
+"""Throughput of the MJSynth and IIIT5K input pipelines on generated on-disk datasets (see
+datasets.generate_mjsynth() and datasets.generate_iiit5k())."""
+import tempfile
+from pathlib import Path
+
+import tensorflow as tf
+
+import datasets
+from benchmarks._utils import measure_time
+from benchmarks._results import throughput_result, timing_result
+from datasets import generate_iiit5k, generate_mjsynth
+
+
+BATCH_SIZE = 64
+SAMPLES_COUNT = 2048
+QUICK_SAMPLES_COUNT = 256
+
+
+def measure_throughput(dataset, samples_count, repeats):
+    dataset = dataset.padded_batch(BATCH_SIZE, padding_values=(None, -1)).prefetch(tf.data.experimental.AUTOTUNE)
+
+    def iterate():
+        for _ in dataset:
+            pass
+
+    return samples_count / measure_time(iterate, repeats, warmup=1)["median"]
+
+
+def run(quick=False, repeats=3):
+    """Runs the benchmark and returns a list of results.
+
+    :param quick: Whether to use a smaller dataset
+    :param repeats: Number of measured passes over each dataset
+    """
+    samples_count = QUICK_SAMPLES_COUNT if quick else SAMPLES_COUNT
+    params = {"samples": samples_count, "batch_size": BATCH_SIZE}
+
+    with tempfile.TemporaryDirectory() as path:
+        path = Path(path)
+        generate_mjsynth(path / "mjsynth", samples_count)
+        generate_iiit5k(path / "iiit5k", samples_count)
+        datasets.compile_mjsynth(path / "mjsynth", path / "mjsynth_cache", num_shards=4)
+
+        mjsynth_train_ds = datasets.load_mjsynth(path / "mjsynth")[0]
+        mjsynth_cached_train_ds = datasets.load_mjsynth(path / "mjsynth", path / "mjsynth_cache")[0]
+        iiit5k_train_ds = datasets.load_iiit5k(path / "iiit5k")[0]
+        iiit5k_cached_train_ds = datasets.load_iiit5k(path / "iiit5k", image_cache_path=path / "iiit5k_images")[0]
+        iiit5k_index_times = measure_time(lambda: datasets.load_iiit5k(path / "iiit5k", index_path=False), repeats)
+        iiit5k_cached_index_times = measure_time(lambda: datasets.load_iiit5k(path / "iiit5k"), repeats)
+
+        return [
+            throughput_result("pipelines/load_mjsynth", params,
+                              measure_throughput(mjsynth_train_ds, samples_count, repeats)),
+            throughput_result("pipelines/load_mjsynth_cached", params,
+                              measure_throughput(mjsynth_cached_train_ds, samples_count, repeats)),
+            throughput_result("pipelines/load_iiit5k", params,
+                              measure_throughput(iiit5k_train_ds, samples_count, repeats)),
+            throughput_result("pipelines/load_iiit5k_cached_images", params,
+                              measure_throughput(iiit5k_cached_train_ds, samples_count, repeats)),
+            timing_result("pipelines/load_iiit5k_call", dict(params, index="built"), iiit5k_index_times),
+            timing_result("pipelines/load_iiit5k_call", dict(params, index="cached"), iiit5k_cached_index_times)
+        ]
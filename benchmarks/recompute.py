@@ -0,0 +1,80 @@
+"""Compares training of the TransformerEncoder with stored activations and with activations recomputed during the
+backward pass (TransformerEncoder(recompute=True)) in the configuration used for MJSynth training (5 layers, 512 dims,
+8 heads, 2048 MLP units, 0.1 dropout).
+
+Each setting and batch size is measured in a separate process, so that peak memory usage is reported independently.
+
+Usage: python -m benchmarks.recompute [--batch-sizes 128 256 512] [--steps N]
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+
+import tensorflow as tf
+
+import vit
+from benchmarks._utils import measure_time
+
+
+NUM_LAYERS = 5
+MODEL_DIM = 512
+NUM_HEADS = 8
+MLP_DIM = 2048
+DROPOUT = 0.1
+POSITIONS = 25
+
+VARIANTS = ("stored", "recompute")
+
+
+def run_variant(variant, batch_size, steps):
+    """Measures a training step (forward and backward passes) of the encoder and returns results as a dict."""
+    inputs = tf.random.normal([batch_size, POSITIONS, MODEL_DIM])
+    encoder = vit.layers.TransformerEncoder(NUM_LAYERS, MODEL_DIM, NUM_HEADS, MLP_DIM, dropout=DROPOUT,
+                                            recompute=variant == "recompute")
+    encoder(inputs)
+
+    @tf.function
+    def step():
+        with tf.GradientTape() as tape:
+            loss = tf.reduce_mean(tf.square(encoder(inputs, training=True)))
+        return tape.gradient(loss, encoder.trainable_variables)
+
+    step()
+    timing = measure_time(step, repeats=steps, warmup=1)
+
+    return {"variant": variant, "batch_size": batch_size, "step_time": timing["median"],
+            "samples_per_sec": batch_size / timing["median"],
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[128, 256, 512])
+    parser.add_argument("--steps", type=int, default=5)
+    parser.add_argument("--variant", choices=VARIANTS, help="Measure a single variant in the current process")
+    args = parser.parse_args()
+
+    if args.variant is not None:
+        print(json.dumps(run_variant(args.variant, args.batch_sizes[0], args.steps)))
+        return
+
+    for batch_size in args.batch_sizes:
+        results = {}
+        for variant in VARIANTS:
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.recompute", "--variant", variant,
+                 "--batch-sizes", str(batch_size), "--steps", str(args.steps)],
+                check=True, capture_output=True, text=True).stdout
+            results[variant] = json.loads(output.strip().splitlines()[-1])
+            print(f"batch {batch_size:>4}, {variant:>9}: {results[variant]['samples_per_sec']:.1f} samples/sec, "
+                  f"peak RSS {results[variant]['peak_rss_mb']:.0f} MB")
+
+        print(f"batch {batch_size:>4}: throughput ratio "
+              f"{results['recompute']['samples_per_sec'] / results['stored']['samples_per_sec']:.2f}x, peak RSS "
+              f"reduction {results['stored']['peak_rss_mb'] - results['recompute']['peak_rss_mb']:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Load generator for the recognition server (python -m vit.inference.serve).
+
+Sends single-image requests over a number of concurrent keep-alive connections and reports throughput, client-side
+latency percentiles and metrics reported by the server.
+
+Usage: python -m benchmarks.serving [--port 8080 | --unix-socket PATH] [--concurrency N] [--requests N]
+"""
+import argparse
+import asyncio
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+
+
+def load_images(images_dir, count):
+    if images_dir is not None:
+        paths = sorted(path for path in Path(images_dir).iterdir() if path.suffix.lower() in (".png", ".jpg", ".jpeg"))
+        return [path.read_bytes() for path in paths[:count]]
+
+    import tensorflow as tf
+    rng = np.random.default_rng(42)
+    return [tf.io.encode_png(rng.integers(0, 255, size=[32, int(width), 1], dtype=np.uint8)).numpy()
+            for width in rng.integers(50, 200, size=count)]
+
+
+async def open_connection(args):
+    if args.unix_socket is not None:
+        return await asyncio.open_unix_connection(args.unix_socket)
+    return await asyncio.open_connection(args.host, args.port)
+
+
+async def send_request(reader, writer, method, path, body=b""):
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n\r\n".encode("latin-1")
+                 + body)
+    await writer.drain()
+
+    status = int((await reader.readline()).split(b" ")[1])
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode("latin-1").strip()
+        if not line:
+            break
+        name, value = line.split(":", 1)
+        headers[name.strip().lower()] = value.strip()
+    response = json.loads(await reader.readexactly(int(headers["content-length"])))
+    return status, response
+
+
+async def run_client(args, images, requests_count, latencies):
+    reader, writer = await open_connection(args)
+    try:
+        for i in range(requests_count):
+            start_time = time.perf_counter()
+            status, _ = await send_request(reader, writer, "POST", "/recognize", images[i % len(images)])
+            if status != 200:
+                raise RuntimeError(f"Request failed with status {status}")
+            latencies.append(time.perf_counter() - start_time)
+    finally:
+        writer.close()
+
+
+async def run(args):
+    images = load_images(args.images_dir, args.distinct_images)
+    latencies = []
+    requests_per_client = [args.requests // args.concurrency + int(i < args.requests % args.concurrency)
+                           for i in range(args.concurrency)]
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(run_client(args, images, requests_count, latencies)
+                           for requests_count in requests_per_client))
+    elapsed = time.perf_counter() - start_time
+
+    reader, writer = await open_connection(args)
+    _, server_metrics = await send_request(reader, writer, "GET", "/metrics")
+    writer.close()
+
+    latencies = np.array(latencies) * 1000
+    print(f"Requests: {len(latencies)}, throughput: {len(latencies) / elapsed:.1f} requests/sec")
+    print(f"Client latency: p50 {np.percentile(latencies, 50):.1f} ms, p99 {np.percentile(latencies, 99):.1f} ms")
+    print(f"Server metrics: {json.dumps(server_metrics)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--unix-socket")
+    parser.add_argument("--concurrency", type=int, default=32, help="Number of concurrent connections")
+    parser.add_argument("--requests", type=int, default=2000, help="Total number of requests")
+    parser.add_argument("--images-dir", help="A directory with PNG or JPEG crops (synthetic images are used if None)")
+    parser.add_argument("--distinct-images", type=int, default=256, help="Number of distinct images to send")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,6 @@
 """Tool for loading datasets."""
 from ._config import *
-from ._mjsynth import load_mjsynth
-from ._iiit5k import load_iiit5k, IIIT5K_CHARS
\ No newline at end of file
+from ._mjsynth import load_mjsynth, compile_mjsynth
+from ._batching import bucket_by_label_length, bucket_by_image_width, labels_padding_ratio
+from ._iiit5k import load_iiit5k, IIIT5K_CHARS
+from ._fake import generate_mjsynth, generate_iiit5k
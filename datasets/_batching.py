@@ -0,0 +1,131 @@
+"""Tools for batching datasets."""
+import tensorflow as tf
+
+import datasets
+
+
+def bucket_by_label_length(dataset, bucket_boundaries, bucket_batch_sizes, labels_padding_value=-1,
+                           shuffle_buffer_size=None, seed=None, drop_remainder=False, pad_to_bucket_boundary=False,
+                           batch_shuffle_buffer_size=256):
+    """Batches (image, labels) samples so that each batch contains labels of similar length, which reduces the amount
+    of padding compared to dataset.padded_batch().
+
+    :param dataset: A tf.data.Dataset of (image, labels) pairs
+    :param bucket_boundaries: Upper length boundaries of buckets (e.g. [5, 8, 12] produces buckets for lengths < 5,
+        [5, 8), [8, 12) and >= 12)
+    :param bucket_batch_sizes: Batch size per bucket (its length should be len(bucket_boundaries) + 1) or a single
+        batch size for all buckets
+    :param labels_padding_value: A value that is used to pad labels
+    :param shuffle_buffer_size: Size of a buffer that is used to shuffle samples before bucketing (if None, samples are
+        not shuffled), produced batches are also shuffled to mix batches from different buckets
+    :param batch_shuffle_buffer_size: Size of a buffer of batches that is used to shuffle produced batches, which should
+        be large enough that consecutive batches come from different buckets
+    :param seed: Random seed for shuffling
+    :param drop_remainder: Whether the last incomplete batch of each bucket should be dropped
+    :param pad_to_bucket_boundary: Whether labels should be padded to the maximal length of their bucket (boundary - 1)
+        instead of the longest labels in a batch, so that batches have only len(bucket_boundaries) distinct shapes and
+        compiled training steps aren't retraced (labels should be shorter than the last boundary)
+    :return: A batched dataset
+    """
+    if isinstance(bucket_batch_sizes, int):
+        bucket_batch_sizes = [bucket_batch_sizes] * (len(bucket_boundaries) + 1)
+    if len(bucket_batch_sizes) != len(bucket_boundaries) + 1:
+        raise ValueError("The number of batch sizes should be equal to the number of bucket boundaries plus one")
+
+    if shuffle_buffer_size is not None:
+        dataset = dataset.shuffle(shuffle_buffer_size, seed=seed)
+
+    image_spec, labels_spec = dataset.element_spec
+    dataset = dataset.apply(tf.data.experimental.bucket_by_sequence_length(
+        lambda image, labels: tf.shape(labels)[0],
+        bucket_boundaries,
+        bucket_batch_sizes,
+        padded_shapes=([datasets.IMAGE_HEIGHT, datasets.IMAGE_WIDTH, datasets.IMAGE_CHANNELS], [None]),
+        padding_values=(tf.constant(0, image_spec.dtype), tf.constant(labels_padding_value, labels_spec.dtype)),
+        drop_remainder=drop_remainder,
+        pad_to_bucket_boundary=pad_to_bucket_boundary))
+
+    if shuffle_buffer_size is not None:
+        dataset = dataset.shuffle(batch_shuffle_buffer_size, seed=seed)
+
+    return dataset
+
+
+def bucket_by_image_width(dataset, bucket_boundaries, bucket_batch_sizes, patch_width, labels_padding_value=-1,
+                          shuffle_buffer_size=None, seed=None, drop_remainder=False, batch_shuffle_buffer_size=256):
+    """Batches (image, labels) samples with images of different widths (e.g. resized with preserved aspect ratio), so
+    that each batch contains images of similar width. Images are padded with IMAGE_PADDING_VALUE to the boundary of
+    their bucket, which is a multiple of the patch width, so that models with masking (see HorizontalPatching) spend
+    compute in proportion to actual image widths.
+
+    :param dataset: A tf.data.Dataset of (image, labels) pairs
+    :param bucket_boundaries: Inclusive upper width boundaries of buckets, that should be multiples of patch_width
+        (e.g. [48, 96, 160] produces buckets for widths <= 48, (48, 96], (96, 160] and (160, MAX_IMAGE_WIDTH])
+    :param bucket_batch_sizes: Batch size per bucket (its length should be len(bucket_boundaries) + 1) or a single
+        batch size for all buckets
+    :param patch_width: Width of patches of a model
+    :param labels_padding_value: A value that is used to pad labels
+    :param shuffle_buffer_size: Size of a buffer that is used to shuffle samples before bucketing (if None, samples are
+        not shuffled), produced batches are also shuffled to mix batches from different buckets
+    :param batch_shuffle_buffer_size: Size of a buffer of batches that is used to shuffle produced batches, which should
+        be large enough that consecutive batches come from different buckets
+    :param seed: Random seed for shuffling
+    :param drop_remainder: Whether the last incomplete batch of each bucket should be dropped
+    :return: A batched dataset
+    """
+    if isinstance(bucket_batch_sizes, int):
+        bucket_batch_sizes = [bucket_batch_sizes] * (len(bucket_boundaries) + 1)
+    if len(bucket_batch_sizes) != len(bucket_boundaries) + 1:
+        raise ValueError("The number of batch sizes should be equal to the number of bucket boundaries plus one")
+
+    padded_widths = list(bucket_boundaries) + [datasets.MAX_IMAGE_WIDTH]
+    if any(width % patch_width for width in padded_widths):
+        raise ValueError("Bucket boundaries and MAX_IMAGE_WIDTH should be multiples of the patch width")
+
+    if shuffle_buffer_size is not None:
+        dataset = dataset.shuffle(shuffle_buffer_size, seed=seed)
+
+    image_spec, labels_spec = dataset.element_spec
+    dataset = dataset.apply(tf.data.experimental.bucket_by_sequence_length(
+        lambda image, labels: tf.shape(image)[1],
+        [boundary + 1 for boundary in bucket_boundaries],
+        bucket_batch_sizes,
+        padded_shapes=([datasets.IMAGE_HEIGHT, None, datasets.IMAGE_CHANNELS], [None]),
+        padding_values=(tf.constant(datasets.IMAGE_PADDING_VALUE, image_spec.dtype),
+                        tf.constant(labels_padding_value, labels_spec.dtype)),
+        drop_remainder=drop_remainder))
+
+    padded_widths_tensor = tf.constant(padded_widths, tf.int32)
+
+    def pad_to_bucket_boundary(images, labels):
+        width = tf.shape(images)[2]
+        padded_width = padded_widths_tensor[tf.searchsorted(padded_widths_tensor, [width])[0]]
+        images = tf.pad(images, [[0, 0], [0, 0], [0, padded_width - width], [0, 0]],
+                        constant_values=datasets.IMAGE_PADDING_VALUE)
+        return images, labels
+
+    dataset = dataset.map(pad_to_bucket_boundary, num_parallel_calls=tf.data.experimental.AUTOTUNE,
+                          name="pad_to_bucket_boundary")
+
+    if shuffle_buffer_size is not None:
+        dataset = dataset.shuffle(batch_shuffle_buffer_size, seed=seed)
+
+    return dataset
+
+
+def labels_padding_ratio(dataset, labels_padding_value=-1, max_batches=None):
+    """Calculates a fraction of label positions in a batched dataset that are occupied by padding.
+
+    :param dataset: A batched tf.data.Dataset of (images, labels) pairs
+    :param labels_padding_value: A value that was used to pad labels
+    :param max_batches: Maximal number of batches to use (if None, the whole dataset is used)
+    :return: Padding ratio in [0, 1]
+    """
+    if max_batches is not None:
+        dataset = dataset.take(max_batches)
+
+    padding_count, total_count = 0, 0
+    for _, labels in dataset:
+        padding_count += int(tf.reduce_sum(tf.cast(tf.equal(labels, labels_padding_value), tf.int64)))
+        total_count += int(tf.size(labels, out_type=tf.int64))
+    return padding_count / total_count if total_count else 0.0
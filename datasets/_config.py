@@ -13,3 +13,14 @@ IMAGE_CHANNELS = 1
 # Parameters for image rescaling
 IMAGE_SCALE = 1./127.5
 IMAGE_OFFSET = -1
+
+# Maximal width of images that are resized with preserved aspect ratio
+MAX_IMAGE_WIDTH = 256
+
+# A value of pixels that pad images with preserved aspect ratio to the same width, it lies outside of the range of
+# rescaled pixels, so that padding could be distinguished from image content
+IMAGE_PADDING_VALUE = -2.
+
+# Number of shard files that are read in parallel from a preprocessed cache, it's fixed (rather than depending on the
+# number of CPUs), so that the order of cached samples depends only on the files
+RECORDS_CYCLE_LENGTH = 16
@@ -0,0 +1,51 @@
+"""Generators of fake on-disk datasets for tests and benchmarks.
+
+Fake datasets replicate the layout of the original ones: MJSynth annotation files with JPEG images in nested
+directories, and IIIT5K train/test directories of PNG images with .mat annotations.
+"""
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+
+import datasets
+
+
+def random_word(rng, chars):
+    return "".join(rng.choice(chars, size=rng.integers(3, 12)))
+
+
+def random_image(rng):
+    """Generates an encoded-ready uint8 image of a random width, like the original crops."""
+    width = int(rng.integers(60, 200))
+    return rng.integers(0, 256, size=[datasets.IMAGE_HEIGHT, width, datasets.IMAGE_CHANNELS], dtype=np.uint8)
+
+
+def generate_mjsynth(path, samples_count, seed=42):
+    """Generates a fake MJSynth dataset with samples_count samples in each split."""
+    rng = np.random.default_rng(seed)
+    path = Path(path)
+    for split in ("train", "val", "test"):
+        lines = []
+        for i in range(samples_count):
+            image_path = Path(str(i // 1000)) / "1" / f"{i}_{random_word(rng, datasets.CHARS)}_{i}.jpg"
+            (path / image_path).parent.mkdir(parents=True, exist_ok=True)
+            tf.io.write_file((path / image_path).as_posix(), tf.io.encode_jpeg(random_image(rng)))
+            lines.append(f"./{image_path.as_posix()} {i}\n")
+        (path / f"annotation_{split}.txt").write_text("".join(lines))
+
+
+def generate_iiit5k(path, samples_count, seed=42):
+    """Generates a fake IIIT5K dataset with samples_count samples in each split (requires mat4py)."""
+    from mat4py import savemat
+
+    rng = np.random.default_rng(seed)
+    path = Path(path)
+    for split, name in (("train", "traindata"), ("test", "testdata")):
+        (path / split).mkdir(parents=True, exist_ok=True)
+        image_names, texts = [], []
+        for i in range(samples_count):
+            image_names.append(f"{split}/{i}_1.png")
+            texts.append(random_word(rng, datasets.IIIT5K_CHARS))
+            tf.io.write_file((path / image_names[-1]).as_posix(), tf.io.encode_png(random_image(rng)))
+        savemat((path / f"{name}.mat").as_posix(), {name: {"ImgName": image_names, "GroundTruth": texts}})
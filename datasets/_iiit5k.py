@@ -1,82 +1,139 @@
 """Tools for the IIIT 5K-word dataset dataset."""
+import contextlib
+
 import tensorflow as tf
-from mat4py import loadmat
+import numpy as np
 from pathlib import Path
 import string
-import os
 
 
 import datasets
+from datasets._images import resize_image
 
 
 IIIT5K_CHARS = list(string.digits + string.ascii_uppercase)
 
+# Dataset splits and names of their annotation files
+SPLITS = {"train": "traindata", "test": "testdata"}
+
+# Default name of an index file, that is written to the root directory of the dataset
+INDEX_FILENAME = "iiit5k_index.npz"
+
 
-def load_iiit5k(path):
+def load_iiit5k(path, preserve_aspect_ratio=False, index_path=None, image_cache_path=None):
     """Loads the IIIT 5K-word dataset as tf.data.Dataset objects.
 
+    Image filenames and labels of both splits are stored in an index file on the first load, so later loads neither
+    parse .mat annotations nor list image directories. The index is rebuilt when modification times of annotations or
+    image directories change.
+
     :param path: Path to the root directory of the dataset
+    :param preserve_aspect_ratio: Whether images should be resized to IMAGE_HEIGHT with preserved aspect ratio instead
+        of IMAGE_HEIGHT x IMAGE_WIDTH, such images have different widths and should be batched with
+        bucket_by_image_width()
+    :param index_path: Path to the index file (if None, INDEX_FILENAME in the dataset directory is used, if False, the
+        index is built on every load without reading or writing a file). If the index can't be written, it is built on
+        every load
+    :param image_cache_path: Path to a directory where decoded and resized images are cached by tf.data after the
+        first full pass over a dataset (None to decode images on every pass)
     :return: Train and test datasets
     """
     path = Path(path)
+    if index_path is None:
+        index_path = path / INDEX_FILENAME
+    index = load_index(path, None if index_path is False else Path(index_path))
 
     rescaling = tf.keras.layers.experimental.preprocessing.Rescaling(
         scale=datasets.IMAGE_SCALE, offset=datasets.IMAGE_OFFSET)
 
-    filename_to_text_train = load_filename_to_text_dict(path, "traindata")
-    filename_to_text_test = load_filename_to_text_dict(path, "testdata")
-
-    labels = tf.range(len(IIIT5K_CHARS), dtype=tf.int32)
-    char_to_label = tf.lookup.StaticHashTable(
-        tf.lookup.KeyValueTensorInitializer(IIIT5K_CHARS, labels), -1)
-
-    train_ds = build_dataset(path / "train", rescaling, filename_to_text_train, char_to_label)
-    test_ds = build_dataset(path / "test", rescaling, filename_to_text_test, char_to_label)
-
-    return train_ds, test_ds
-
-
-def load_filename_to_text_dict(dataset_path, name):
-    filename_to_text = loadmat((dataset_path / f"{name}.mat").as_posix())[name]
-    filename_to_text = {Path(path).name: text for path, text in zip(filename_to_text["ImgName"],
-                                                                    filename_to_text["GroundTruth"])}
-    return dict_to_hash_table(filename_to_text)
-
+    splits_ds = []
+    for split in SPLITS:
+        dataset = build_dataset(path / split, index[f"{split}_files"], index[f"{split}_labels"],
+                                index[f"{split}_lengths"], rescaling, preserve_aspect_ratio)
+        if image_cache_path is not None:
+            # Cache files are specific to the version of the dataset and to the image size mode
+            image_cache_path = Path(image_cache_path)
+            image_cache_path.mkdir(parents=True, exist_ok=True)
+            version = "_".join(str(mtime) for mtime in index["mtimes"])
+            size_mode = "aspect" if preserve_aspect_ratio else "fixed"
+            dataset = dataset.cache((image_cache_path / f"iiit5k_{split}_{size_mode}_{version}").as_posix())
+        splits_ds.append(dataset)
 
-def dict_to_hash_table(dictionary, default_value=""):
-    keys = list(dictionary.keys())
-    values = [dictionary[key] for key in keys]
-    return tf.lookup.StaticHashTable(
-        tf.lookup.KeyValueTensorInitializer(keys, values), default_value)
+    return tuple(splits_ds)
 
 
-def build_dataset(path, rescaling, filename_to_text, char_to_label):
-    files_ds = tf.data.Dataset.list_files((path / "*.png").as_posix(), shuffle=False)
-    return files_ds.map(
-        lambda image_path: process_path(image_path, rescaling, filename_to_text, char_to_label),
-        num_parallel_calls=tf.data.experimental.AUTOTUNE)
+def load_index(path, index_path):
+    """Loads the index of the dataset, builds and writes it if it doesn't exist or is outdated.
 
-
-def process_path(path, rescaling, filename_to_text, char_to_label):
-    image = load_image(path, rescaling)
-    labels = get_labels(path, filename_to_text, char_to_label)
-    return image, labels
-
-
-def load_image(path, rescaling):
+    :param path: Path to the root directory of the dataset
+    :param index_path: Path to the index file (None to build the index without reading or writing it)
+    :return: A dict with modification times ("mtimes"), and arrays of image filenames ("{split}_files"), concatenated
+        labels of all images ("{split}_labels") and numbers of labels of every image ("{split}_lengths") per split
+    """
+    mtimes = get_mtimes(path)
+    if index_path is not None and index_path.exists():
+        with np.load(index_path) as index:
+            if np.array_equal(index["mtimes"], mtimes):
+                return dict(index)
+
+    index = build_index(path)
+    index["mtimes"] = mtimes
+    if index_path is None:
+        return index
+
+    # The index is written to a temporary file first, so that an interrupted write doesn't leave a broken index
+    temp_path = index_path.with_name(index_path.name + ".tmp")
+    try:
+        with open(temp_path, "wb") as file:
+            np.savez(file, **index)
+        temp_path.replace(index_path)
+    except OSError:
+        # A partially written temporary file is removed (if it was created at all)
+        with contextlib.suppress(OSError):
+            temp_path.unlink()
+    return index
+
+
+def get_mtimes(path):
+    """Returns modification times of annotation files and image directories, which change when files are added or
+    removed."""
+    paths = [path / f"{name}.mat" for name in SPLITS.values()] + [path / split for split in SPLITS]
+    return np.array([item.stat().st_mtime_ns for item in paths], dtype=np.int64)
+
+
+def build_index(path):
+    """Parses annotations and lists images of the dataset (see load_index())."""
+    from mat4py import loadmat
+
+    char_to_label = {char: label for label, char in enumerate(IIIT5K_CHARS)}
+    index = {}
+    for split, name in SPLITS.items():
+        annotations = loadmat((path / f"{name}.mat").as_posix())[name]
+        filename_to_text = {Path(image_path).name: text
+                            for image_path, text in zip(annotations["ImgName"], annotations["GroundTruth"])}
+
+        # Images without annotations have no labels, unknown characters are labeled with -1
+        filenames = sorted(image_path.name for image_path in (path / split).glob("*.png"))
+        labels = [[char_to_label.get(char, -1) for char in str(filename_to_text.get(filename, ""))]
+                  for filename in filenames]
+
+        index[f"{split}_files"] = np.array(filenames, dtype=str)
+        index[f"{split}_labels"] = np.array([label for text_labels in labels for label in text_labels], dtype=np.int32)
+        index[f"{split}_lengths"] = np.array([len(text_labels) for text_labels in labels], dtype=np.int64)
+    return index
+
+
+def build_dataset(path, filenames, labels, lengths, rescaling, preserve_aspect_ratio=False):
+    image_paths = [(path / filename).as_posix() for filename in filenames]
+    labels = tf.RaggedTensor.from_row_lengths(labels, lengths)
+    return tf.data.Dataset.from_tensor_slices((image_paths, labels)).map(
+        lambda image_path, image_labels: (load_image(image_path, rescaling, preserve_aspect_ratio), image_labels),
+        num_parallel_calls=tf.data.experimental.AUTOTUNE, name="load_iiit5k_images")
+
+
+def load_image(path, rescaling, preserve_aspect_ratio=False):
     image_data = tf.io.read_file(path)
     image = tf.image.decode_png(image_data, channels=datasets.IMAGE_CHANNELS)
-    image = tf.image.resize(image, [datasets.IMAGE_HEIGHT, datasets.IMAGE_WIDTH])
+    image = resize_image(image, preserve_aspect_ratio)
     image = rescaling(image)
     return image
-
-
-def get_labels(path, filename_to_text, char_to_label):
-    image_name = tf.strings.split(path, os.path.sep)[-1]
-    image_text = filename_to_text.lookup(image_name)
-    labels = char_to_label.lookup(split_chars(image_text))
-    return labels
-
-
-def split_chars(tensor, encoding="UTF-8"):
-    return tf.strings.unicode_split(tensor, encoding)
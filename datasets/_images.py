@@ -0,0 +1,16 @@
+"""Tools for image preprocessing shared by datasets."""
+import tensorflow as tf
+
+import datasets
+
+
+def resize_image(image, preserve_aspect_ratio=False):
+    """Resizes a decoded image to IMAGE_HEIGHT x IMAGE_WIDTH or, if preserve_aspect_ratio is True, to IMAGE_HEIGHT and
+    a proportional width (limited by MAX_IMAGE_WIDTH)."""
+    if not preserve_aspect_ratio:
+        return tf.image.resize(image, [datasets.IMAGE_HEIGHT, datasets.IMAGE_WIDTH])
+
+    image_shape = tf.cast(tf.shape(image), tf.float32)
+    width = tf.cast(tf.round(image_shape[1] * datasets.IMAGE_HEIGHT / image_shape[0]), tf.int32)
+    width = tf.clip_by_value(width, 1, datasets.MAX_IMAGE_WIDTH)
+    return tf.image.resize(image, [datasets.IMAGE_HEIGHT, width])
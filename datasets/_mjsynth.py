@@ -3,6 +3,8 @@ import tensorflow as tf
 from pathlib import Path
 
 import datasets
+from datasets._images import resize_image
+from datasets._records import write_records, read_records
 
 
 # Damaged image files that should be skipped
@@ -27,61 +29,127 @@ BAD_IMAGES = {
 }
 
 
-def load_mjsynth(path):
+SPLITS = ("train", "val", "test")
+
+# Number of annotation lines that are parsed at once by vectorized string ops
+ANNOTATIONS_BATCH_SIZE = 1024
+
+
+def load_mjsynth(path, cache_path=None, num_shards=1, shard_index=0, offset=0, preserve_aspect_ratio=False):
     """Loads the MJSynth dataset as tf.data.Dataset objects.
 
     :param path: Path to the dataset's main directory, that contains annotation files
+    :param cache_path: Path to a directory with preprocessed shards written by compile_mjsynth() (if None, images are
+        read and decoded from the original files)
+    :param num_shards: Number of shards (e.g. workers) to split every dataset into
+    :param shard_index: Index of the shard that will be returned
+    :param offset: Number of samples at the beginning of the train dataset (after sharding) to skip, which allows to
+        resume an interrupted pass over the dataset without decoding images that were already seen
+    :param preserve_aspect_ratio: Whether images should be resized to IMAGE_HEIGHT with preserved aspect ratio instead
+        of IMAGE_HEIGHT x IMAGE_WIDTH, such images have different widths and should be batched with
+        bucket_by_image_width() (not supported for cached datasets)
     :return: Train, validation and test datasets
     """
-    path = Path(path)
-
     rescaling = tf.keras.layers.experimental.preprocessing.Rescaling(
         scale=datasets.IMAGE_SCALE, offset=datasets.IMAGE_OFFSET)
 
-    labels = tf.range(len(datasets.CHARS))
-    char_to_label = tf.lookup.StaticHashTable(
-        tf.lookup.KeyValueTensorInitializer(datasets.CHARS, labels), -1)
+    if cache_path is not None:
+        if preserve_aspect_ratio:
+            raise ValueError("Cached datasets contain images of a fixed size, so aspect ratio can't be preserved")
+        return tuple(read_records(cache_path, split, rescaling, num_shards, shard_index,
+                                  offset if split == "train" else 0)
+                     for split in SPLITS)
+
+    path = Path(path)
+    char_to_label = build_char_to_label()
+    preprocess_image = lambda image_path: load_image(image_path, rescaling, preserve_aspect_ratio)
+    return tuple(build_dataset(path / f"annotation_{split}.txt", preprocess_image, char_to_label, BAD_IMAGES[split],
+                               num_shards, shard_index, offset if split == "train" else 0)
+                 for split in SPLITS)
+
+
+def compile_mjsynth(path, cache_path, num_shards=256):
+    """Preprocesses the MJSynth dataset once and writes it into sharded TFRecord files, so that it could be loaded
+    later with load_mjsynth(path, cache_path) without decoding and resizing the original images on every epoch.
+
+    Images are stored already resized to IMAGE_HEIGHT x IMAGE_WIDTH as uint8, so cached samples may differ from the
+    ones produced by load_mjsynth() without cache by rounding of resized pixel values.
+
+    :param path: Path to the dataset's main directory, that contains annotation files
+    :param cache_path: Path to a directory where shards will be written
+    :param num_shards: Number of shards per dataset split
+    :return: A dict with number of written samples per dataset split
+    """
+    path = Path(path)
+    char_to_label = build_char_to_label()
 
-    train_ds = build_dataset(path / "annotation_train.txt", rescaling, char_to_label, BAD_IMAGES["train"])
-    val_ds = build_dataset(path / "annotation_val.txt", rescaling, char_to_label, BAD_IMAGES["val"])
-    test_ds = build_dataset(path / "annotation_test.txt", rescaling, char_to_label, BAD_IMAGES["test"])
+    samples_count = {}
+    for split in SPLITS:
+        dataset = build_dataset(path / f"annotation_{split}.txt", decode_image, char_to_label, BAD_IMAGES[split])
+        samples_count[split] = write_records(dataset, cache_path, split, num_shards)
+    return samples_count
 
-    return train_ds, val_ds, test_ds
 
+def build_char_to_label():
+    labels = tf.range(len(datasets.CHARS))
+    return tf.lookup.StaticHashTable(
+        tf.lookup.KeyValueTensorInitializer(datasets.CHARS, labels), -1)
 
-def build_dataset(annotations_filename, rescaling, char_to_label, bad_images):
-    paths_ds = tf.data.Dataset.from_generator(
-        lambda: get_image_filenames(annotations_filename, bad_images),
-        output_types=tf.string, output_shapes=[])
+
+def build_dataset(annotations_filename, preprocess_image, char_to_label, bad_images, num_shards=1, shard_index=0,
+                  offset=0):
+    paths_ds = get_image_filenames(annotations_filename, bad_images, num_shards, shard_index)
+    if offset:
+        paths_ds = paths_ds.skip(offset)
     return paths_ds.map(
-        lambda image_path: process_path(image_path, rescaling, char_to_label),
-        num_parallel_calls=tf.data.experimental.AUTOTUNE)
+        lambda image_path: process_path(image_path, preprocess_image, char_to_label),
+        num_parallel_calls=tf.data.experimental.AUTOTUNE, name="load_mjsynth_images")
 
 
-def get_image_filenames(annotations_filename, bad_images):
+def get_image_filenames(annotations_filename, bad_images, num_shards=1, shard_index=0):
+    """Reads image paths from an annotation file as a tf.data.Dataset, skipping bad images."""
     annotations_filename = Path(annotations_filename)
-    with open(annotations_filename, "r") as f:
-        for line in f:
-            image = line.split(" ")[0]
-            if image in bad_images:
-                continue
-            yield (annotations_filename.parent / image).as_posix()
+    images_dir = tf.constant(annotations_filename.parent.as_posix() + "/")
+
+    bad_images = sorted(bad_images)
+    is_bad_image = tf.lookup.StaticHashTable(
+        tf.lookup.KeyValueTensorInitializer(bad_images, tf.ones(len(bad_images), dtype=tf.int32)), 0)
+
+    def parse_lines(lines):
+        images = tf.strings.regex_replace(lines, " .*", "")
+        is_valid = tf.logical_and(tf.not_equal(images, ""), tf.equal(is_bad_image.lookup(images), 0))
+        images = tf.boolean_mask(images, is_valid)
+        return images_dir + tf.strings.regex_replace(images, "^\\./", "")
 
+    lines_ds = tf.data.TextLineDataset(annotations_filename.as_posix())
+    if num_shards > 1:
+        lines_ds = lines_ds.shard(num_shards, shard_index)
+    return lines_ds.batch(ANNOTATIONS_BATCH_SIZE).map(
+        parse_lines, num_parallel_calls=tf.data.experimental.AUTOTUNE, name="parse_mjsynth_annotations").unbatch()
 
-def process_path(path, rescaling, char_to_label):
-    image = load_image(path, rescaling)
+
+def process_path(path, preprocess_image, char_to_label):
+    image = preprocess_image(path)
     text_labels = get_text_labels(path, char_to_label)
     return image, text_labels
 
 
-def load_image(path, rescaling):
+def load_image(path, rescaling, preserve_aspect_ratio=False):
     image_data = tf.io.read_file(path)
     image = tf.image.decode_jpeg(image_data, channels=datasets.IMAGE_CHANNELS)
-    image = tf.image.resize(image, [datasets.IMAGE_HEIGHT, datasets.IMAGE_WIDTH])
+    image = resize_image(image, preserve_aspect_ratio)
     image = rescaling(image)
     return image
 
 
+def decode_image(path):
+    """Decodes and resizes an image, keeping it as uint8 for compact storage."""
+    image_data = tf.io.read_file(path)
+    image = tf.image.decode_jpeg(image_data, channels=datasets.IMAGE_CHANNELS)
+    image = tf.image.resize(image, [datasets.IMAGE_HEIGHT, datasets.IMAGE_WIDTH])
+    return tf.cast(tf.round(tf.clip_by_value(image, 0, 255)), tf.uint8)
+
+
 def get_text_labels(path, char_to_label):
     image_text = tf.strings.split(path, "_")[1]
     image_text_labels = char_to_label.lookup(split_chars(image_text))
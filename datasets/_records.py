@@ -0,0 +1,88 @@
+"""Tools for storing preprocessed datasets as sharded TFRecord files."""
+import tensorflow as tf
+from pathlib import Path
+
+import datasets
+
+
+FEATURES = {
+    "image": tf.io.FixedLenFeature([], tf.string),
+    "labels": tf.io.VarLenFeature(tf.int64)
+}
+
+
+def write_records(dataset, output_path, name, num_shards):
+    """Writes a dataset of preprocessed samples into sharded TFRecord files.
+
+    :param dataset: A tf.data.Dataset of (image, labels) pairs, where image is a uint8 tensor of shape
+        [IMAGE_HEIGHT, IMAGE_WIDTH, IMAGE_CHANNELS] and labels is a 1D integer tensor
+    :param output_path: Path to a directory where shards will be written
+    :param name: Name of the dataset split that is used as a shards filename prefix
+    :param num_shards: Number of shards to write (samples are distributed between shards in a round-robin manner)
+    :return: Number of written samples
+    """
+    output_path = Path(output_path)
+    output_path.mkdir(parents=True, exist_ok=True)
+
+    writers = [tf.io.TFRecordWriter(shard_filename(output_path, name, i, num_shards).as_posix())
+               for i in range(num_shards)]
+    samples_count = 0
+    try:
+        for image, labels in dataset.prefetch(tf.data.experimental.AUTOTUNE).as_numpy_iterator():
+            writers[samples_count % num_shards].write(serialize_sample(image, labels))
+            samples_count += 1
+    finally:
+        for writer in writers:
+            writer.close()
+    return samples_count
+
+
+def read_records(path, name, rescaling, num_shards=1, shard_index=0, offset=0):
+    """Reads samples written by write_records() as a tf.data.Dataset.
+
+    :param path: Path to a directory with shards
+    :param name: Name of the dataset split that was used when the shards were written
+    :param rescaling: A layer that is used to rescale uint8 images
+    :param num_shards: Number of parts (e.g. workers) to split files into (shouldn't exceed the number of files)
+    :param shard_index: Index of the part that will be read
+    :param offset: Number of samples to skip at the beginning of the (sharded) dataset
+    :return: A dataset of (image, labels) pairs
+    """
+    filenames = sorted(Path(path).glob(f"{name}-*-of-*.tfrecord"))
+    if not filenames:
+        raise FileNotFoundError(f"No '{name}' shards were found in {path}")
+
+    if len(filenames) < num_shards:
+        raise ValueError(f"Can't split {len(filenames)} files into {num_shards} shards")
+
+    shards_ds = tf.data.Dataset.from_tensor_slices([filename.as_posix() for filename in filenames])
+    if num_shards > 1:
+        shards_ds = shards_ds.shard(num_shards, shard_index)
+    records_ds = shards_ds.interleave(tf.data.TFRecordDataset, cycle_length=datasets.RECORDS_CYCLE_LENGTH,
+                                      num_parallel_calls=tf.data.experimental.AUTOTUNE, deterministic=True,
+                                      name="read_records")
+    if offset:
+        records_ds = records_ds.skip(offset)
+    return records_ds.map(lambda record: parse_sample(record, rescaling),
+                          num_parallel_calls=tf.data.experimental.AUTOTUNE, name="parse_records")
+
+
+def shard_filename(path, name, index, num_shards):
+    return Path(path) / f"{name}-{index:05d}-of-{num_shards:05d}.tfrecord"
+
+
+def serialize_sample(image, labels):
+    example = tf.train.Example(features=tf.train.Features(feature={
+        "image": tf.train.Feature(bytes_list=tf.train.BytesList(value=[image.tobytes()])),
+        "labels": tf.train.Feature(int64_list=tf.train.Int64List(value=labels))
+    }))
+    return example.SerializeToString()
+
+
+def parse_sample(record, rescaling):
+    sample = tf.io.parse_single_example(record, FEATURES)
+    image = tf.io.decode_raw(sample["image"], tf.uint8)
+    image = tf.reshape(image, [datasets.IMAGE_HEIGHT, datasets.IMAGE_WIDTH, datasets.IMAGE_CHANNELS])
+    image = rescaling(tf.cast(image, tf.float32))
+    labels = tf.cast(tf.sparse.to_dense(sample["labels"]), tf.int32)
+    return image, labels
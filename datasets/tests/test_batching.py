@@ -0,0 +1,95 @@
+"""Tests for batching of datasets."""
+import numpy as np
+import tensorflow as tf
+
+import pytest
+
+import datasets
+from datasets import bucket_by_image_width, bucket_by_label_length
+
+
+PADDING_VALUE = -1
+
+
+def build_dataset(label_lengths, image_widths=None):
+    """Builds a dataset of (image, labels) pairs, where labels of every sample are filled with its index."""
+    if image_widths is None:
+        image_widths = [datasets.IMAGE_WIDTH] * len(label_lengths)
+
+    def generate():
+        for i, (length, width) in enumerate(zip(label_lengths, image_widths)):
+            yield np.full([datasets.IMAGE_HEIGHT, width, datasets.IMAGE_CHANNELS], i, np.float32), np.full(length, i)
+
+    return tf.data.Dataset.from_generator(generate, output_signature=(
+        tf.TensorSpec([datasets.IMAGE_HEIGHT, None, datasets.IMAGE_CHANNELS], tf.float32),
+        tf.TensorSpec([None], tf.int32)))
+
+
+def batch_lengths(labels):
+    return (labels != PADDING_VALUE).sum(axis=1)
+
+
+def test_bucket_by_label_length__batches_contain_labels_of_one_bucket():
+    rng = np.random.default_rng(0)
+    label_lengths = rng.integers(1, 15, size=100)
+    dataset = build_dataset(label_lengths).map(lambda image, labels: (tf.ensure_shape(
+        image, [datasets.IMAGE_HEIGHT, datasets.IMAGE_WIDTH, datasets.IMAGE_CHANNELS]), labels))
+
+    batches = list(bucket_by_label_length(dataset, [5, 10], 8, PADDING_VALUE).as_numpy_iterator())
+
+    sample_indices = []
+    for images, labels in batches:
+        lengths = batch_lengths(labels)
+        assert len(set(np.digitize(lengths, [5, 10]))) == 1
+        assert labels.shape[1] == lengths.max()
+        sample_indices += list(images[:, 0, 0, 0].astype(int))
+    assert sorted(sample_indices) == list(range(100))
+
+
+def test_bucket_by_label_length__labels_are_padded_to_bucket_boundary():
+    dataset = build_dataset([1, 2, 6, 7, 12]).map(lambda image, labels: (tf.ensure_shape(
+        image, [datasets.IMAGE_HEIGHT, datasets.IMAGE_WIDTH, datasets.IMAGE_CHANNELS]), labels))
+
+    batches = bucket_by_label_length(dataset, [5, 10, 15], 8, PADDING_VALUE, pad_to_bucket_boundary=True)
+
+    assert sorted(labels.shape[1] for _, labels in batches.as_numpy_iterator()) == [4, 9, 14]
+
+
+def test_bucket_by_label_length__batches_of_different_buckets_are_mixed():
+    # Samples are ordered by buckets, so without shuffling of batches all short labels would come first
+    label_lengths = [2] * 40 + [8] * 40
+    dataset = build_dataset(label_lengths).map(lambda image, labels: (tf.ensure_shape(
+        image, [datasets.IMAGE_HEIGHT, datasets.IMAGE_WIDTH, datasets.IMAGE_CHANNELS]), labels))
+
+    batches = bucket_by_label_length(dataset, [5], 2, PADDING_VALUE, shuffle_buffer_size=1, seed=42)
+    first_batches_lengths = [labels.shape[1] for _, labels in batches.take(10).as_numpy_iterator()]
+
+    assert set(first_batches_lengths) == {2, 8}
+
+
+@pytest.mark.parametrize("batch_sizes", ([8, 8], [8]))
+def test_bucket_by_label_length__wrong_number_of_batch_sizes_raises(batch_sizes):
+    with pytest.raises(ValueError):
+        bucket_by_label_length(build_dataset([1]), [5, 10], batch_sizes)
+
+
+def test_bucket_by_image_width__images_are_padded_to_bucket_boundary():
+    image_widths = [20, 48, 50, 96, 120, 200]
+    dataset = build_dataset([3] * len(image_widths), image_widths)
+
+    batches = list(bucket_by_image_width(dataset, [48, 96], 8, patch_width=4).as_numpy_iterator())
+
+    padded_widths = {}
+    for images, labels in batches:
+        for image in images:
+            index = int(image[0, 0, 0])
+            padded_widths[index] = image.shape[1]
+            assert (image[:, :image_widths[index]] == index).all()
+            assert (image[:, image_widths[index]:] == datasets.IMAGE_PADDING_VALUE).all()
+    assert [padded_widths[i] for i in range(len(image_widths))] == [48, 48, 96, 96, datasets.MAX_IMAGE_WIDTH,
+                                                                    datasets.MAX_IMAGE_WIDTH]
+
+
+def test_bucket_by_image_width__boundaries_should_be_multiples_of_patch_width():
+    with pytest.raises(ValueError):
+        bucket_by_image_width(build_dataset([1]), [50], 8, patch_width=4)
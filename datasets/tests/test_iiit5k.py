@@ -0,0 +1,166 @@
+"""Tests for loading of the IIIT 5K-word dataset."""
+import os
+import stat
+from pathlib import Path
+
+import numpy as np
+import pytest
+import tensorflow as tf
+from mat4py import loadmat
+
+import datasets
+from datasets import _iiit5k, generate_iiit5k, load_iiit5k, IIIT5K_CHARS
+
+
+SAMPLES_COUNT = 8
+
+
+@pytest.fixture
+def dataset_path(tmp_path):
+    path = tmp_path / "iiit5k"
+    generate_iiit5k(path, SAMPLES_COUNT)
+    return path
+
+
+@pytest.fixture
+def build_index_calls(monkeypatch):
+    """Counts calls of build_index()."""
+    calls = []
+
+    def build_index(path):
+        calls.append(path)
+        return original_build_index(path)
+
+    original_build_index = _iiit5k.build_index
+    monkeypatch.setattr(_iiit5k, "build_index", build_index)
+    return calls
+
+
+def load_reference(path, split, name):
+    """Loads a split the way the loader did before the index was added: images are listed from the directory and
+    labels are looked up in the annotations by filename."""
+    annotations = loadmat((path / f"{name}.mat").as_posix())[name]
+    filename_to_text = {Path(image_path).name: text
+                        for image_path, text in zip(annotations["ImgName"], annotations["GroundTruth"])}
+    rescaling = tf.keras.layers.experimental.preprocessing.Rescaling(
+        scale=datasets.IMAGE_SCALE, offset=datasets.IMAGE_OFFSET)
+
+    samples = []
+    for image_path in tf.io.matching_files((path / split / "*.png").as_posix()).numpy():
+        image = tf.image.decode_png(tf.io.read_file(image_path), channels=datasets.IMAGE_CHANNELS)
+        image = rescaling(tf.image.resize(image, [datasets.IMAGE_HEIGHT, datasets.IMAGE_WIDTH]))
+        text = str(filename_to_text.get(Path(image_path.decode()).name, ""))
+        labels = [IIIT5K_CHARS.index(char) if char in IIIT5K_CHARS else -1 for char in text]
+        samples.append((image.numpy(), np.array(labels, dtype=np.int32)))
+    return samples
+
+
+def to_numpy(dataset):
+    return [(image.numpy(), labels.numpy()) for image, labels in dataset]
+
+
+def assert_samples_equal(samples, expected_samples):
+    assert len(samples) == len(expected_samples)
+    for (image, labels), (expected_image, expected_labels) in zip(samples, expected_samples):
+        np.testing.assert_allclose(image, expected_image, atol=1e-6)
+        np.testing.assert_array_equal(labels, expected_labels)
+
+
+def add_image(path, split, filename):
+    image = np.zeros([datasets.IMAGE_HEIGHT, 50, datasets.IMAGE_CHANNELS], dtype=np.uint8)
+    tf.io.write_file((path / split / filename).as_posix(), tf.io.encode_png(image))
+
+
+def test_load_iiit5k__outputs_match_loading_without_index(dataset_path):
+    # An image without annotation has no labels
+    add_image(dataset_path, "test", "unannotated.png")
+
+    train_ds, test_ds = load_iiit5k(dataset_path)
+
+    assert_samples_equal(to_numpy(train_ds), load_reference(dataset_path, "train", "traindata"))
+    assert_samples_equal(to_numpy(test_ds), load_reference(dataset_path, "test", "testdata"))
+    assert len(to_numpy(test_ds)) == SAMPLES_COUNT + 1
+
+
+def test_load_iiit5k__index_is_reused(dataset_path, build_index_calls):
+    load_iiit5k(dataset_path)
+    train_ds, _ = load_iiit5k(dataset_path)
+
+    assert (dataset_path / _iiit5k.INDEX_FILENAME).exists()
+    assert len(build_index_calls) == 1
+    assert len(to_numpy(train_ds)) == SAMPLES_COUNT
+
+
+def test_load_iiit5k__index_is_rebuilt_when_image_is_added(dataset_path, build_index_calls):
+    load_iiit5k(dataset_path)
+    add_image(dataset_path, "train", "added.png")
+
+    train_ds, _ = load_iiit5k(dataset_path)
+
+    assert len(build_index_calls) == 2
+    assert len(to_numpy(train_ds)) == SAMPLES_COUNT + 1
+
+
+def test_load_iiit5k__index_is_rebuilt_when_annotations_are_touched(dataset_path, build_index_calls):
+    load_iiit5k(dataset_path)
+    annotations_path = dataset_path / "traindata.mat"
+    mtime = annotations_path.stat().st_mtime_ns + 10 ** 9
+    os.utime(annotations_path, ns=(mtime, mtime))
+
+    load_iiit5k(dataset_path)
+
+    assert len(build_index_calls) == 2
+
+
+@pytest.mark.parametrize("parent_type", ("read_only_directory", "file"))
+def test_load_iiit5k__read_only_index_path_still_loads(dataset_path, tmp_path, parent_type):
+    parent_path = tmp_path / "parent"
+    if parent_type == "file":
+        # The index can't be written to a file's child even by a superuser, who ignores directory permissions
+        parent_path.write_text("")
+    else:
+        parent_path.mkdir()
+        parent_path.chmod(stat.S_IRUSR | stat.S_IXUSR)
+    index_path = parent_path / "index.npz"
+
+    train_ds, test_ds = load_iiit5k(dataset_path, index_path=index_path)
+
+    assert_samples_equal(to_numpy(train_ds), load_reference(dataset_path, "train", "traindata"))
+    assert_samples_equal(to_numpy(test_ds), load_reference(dataset_path, "test", "testdata"))
+    assert not (dataset_path / _iiit5k.INDEX_FILENAME).exists()
+
+
+def test_load_iiit5k__index_file_is_skipped(dataset_path, build_index_calls):
+    load_iiit5k(dataset_path, index_path=False)
+    train_ds, _ = load_iiit5k(dataset_path, index_path=False)
+
+    assert len(build_index_calls) == 2
+    assert not (dataset_path / _iiit5k.INDEX_FILENAME).exists()
+    assert len(to_numpy(train_ds)) == SAMPLES_COUNT
+
+
+def test_load_iiit5k__failed_index_write_leaves_no_temporary_file(dataset_path, monkeypatch):
+    def savez(file, **arrays):
+        file.write(b"partial")
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(_iiit5k.np, "savez", savez)
+
+    train_ds, _ = load_iiit5k(dataset_path)
+
+    assert not (dataset_path / _iiit5k.INDEX_FILENAME).exists()
+    assert not any(dataset_path.glob("*.tmp"))
+    assert len(to_numpy(train_ds)) == SAMPLES_COUNT
+
+
+@pytest.mark.parametrize("preserve_aspect_ratio", (False, True))
+def test_load_iiit5k__cached_images_match_uncached(dataset_path, tmp_path, preserve_aspect_ratio):
+    cache_path = tmp_path / "image_cache"
+    expected_train_ds, expected_test_ds = load_iiit5k(dataset_path, preserve_aspect_ratio)
+    train_ds, test_ds = load_iiit5k(dataset_path, preserve_aspect_ratio, image_cache_path=cache_path)
+
+    # The first pass writes the cache and the second one reads it
+    for _ in range(2):
+        assert_samples_equal(to_numpy(train_ds), to_numpy(expected_train_ds))
+        assert_samples_equal(to_numpy(test_ds), to_numpy(expected_test_ds))
+    assert any(cache_path.iterdir())
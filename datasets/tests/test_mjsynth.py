@@ -0,0 +1,132 @@
+"""Tests for loading and caching of the MJSynth dataset."""
+from pathlib import Path
+
+import numpy as np
+import pytest
+import tensorflow as tf
+
+import datasets
+from datasets import _mjsynth, compile_mjsynth, generate_mjsynth, load_mjsynth
+
+
+SAMPLES_COUNT = 10
+NUM_SHARDS = 4
+
+
+@pytest.fixture(scope="module")
+def dataset_path(tmp_path_factory):
+    # Labels are parsed from the part of an image path after the first underscore, so the path shouldn't contain
+    # underscores before image filenames (which tmp_path named after a test function would)
+    path = tmp_path_factory.mktemp("mjsynth")
+    generate_mjsynth(path, SAMPLES_COUNT)
+    return path
+
+
+@pytest.fixture(scope="module")
+def cache_path(dataset_path, tmp_path_factory):
+    path = tmp_path_factory.mktemp("cache")
+    compile_mjsynth(dataset_path, path, num_shards=NUM_SHARDS)
+    return path
+
+
+def to_numpy(dataset):
+    return [(image.numpy(), labels.numpy()) for image, labels in dataset]
+
+
+def test_compile_mjsynth__samples_are_distributed_between_shards_round_robin(dataset_path, tmp_path):
+    samples_count = compile_mjsynth(dataset_path, tmp_path, num_shards=NUM_SHARDS)
+
+    assert samples_count == {"train": SAMPLES_COUNT, "val": SAMPLES_COUNT, "test": SAMPLES_COUNT}
+    shard_sizes = [sum(1 for _ in tf.data.TFRecordDataset(path.as_posix()))
+                   for path in sorted(tmp_path.glob("train-*.tfrecord"))]
+    assert shard_sizes == [3, 3, 2, 2]
+
+
+def test_load_mjsynth__cached_samples_match_uncached(dataset_path, cache_path):
+    for cached_ds, ds in zip(load_mjsynth(dataset_path, cache_path), load_mjsynth(dataset_path)):
+        cached_samples, samples = to_numpy(cached_ds), to_numpy(ds)
+
+        # Interleaved reading of shards restores the order in which samples were distributed between them
+        assert len(cached_samples) == len(samples) == SAMPLES_COUNT
+        for (cached_image, cached_labels), (image, labels) in zip(cached_samples, samples):
+            # Cached images differ by rounding of resized pixels to uint8
+            np.testing.assert_allclose(cached_image, image, atol=0.5 * datasets.IMAGE_SCALE + 1e-6)
+            np.testing.assert_array_equal(cached_labels, labels)
+
+
+@pytest.mark.parametrize("num_shards", (2, NUM_SHARDS))
+def test_load_mjsynth__cached_shards_cover_dataset_once(dataset_path, cache_path, num_shards):
+    expected_labels = sorted(tuple(labels) for _, labels in to_numpy(load_mjsynth(dataset_path, cache_path)[0]))
+
+    labels = []
+    for shard_index in range(num_shards):
+        train_ds = load_mjsynth(dataset_path, cache_path, num_shards=num_shards, shard_index=shard_index)[0]
+        labels += [tuple(sample_labels) for _, sample_labels in to_numpy(train_ds)]
+
+    assert sorted(labels) == expected_labels
+
+
+def test_load_mjsynth__more_shards_than_files_raise_error(dataset_path, cache_path):
+    with pytest.raises(ValueError):
+        load_mjsynth(dataset_path, cache_path, num_shards=NUM_SHARDS + 1)
+
+
+def test_load_mjsynth__offset_skips_cached_train_samples(dataset_path, cache_path):
+    train_ds, val_ds, _ = load_mjsynth(dataset_path, cache_path)
+    offset_train_ds, offset_val_ds, _ = load_mjsynth(dataset_path, cache_path, offset=3)
+
+    assert [labels.tolist() for _, labels in to_numpy(offset_train_ds)] == \
+        [labels.tolist() for _, labels in to_numpy(train_ds)][3:]
+    assert len(to_numpy(offset_val_ds)) == len(to_numpy(val_ds))
+
+
+def test_load_mjsynth__missing_cache_raises_error(dataset_path, tmp_path):
+    with pytest.raises(FileNotFoundError):
+        load_mjsynth(dataset_path, tmp_path)
+
+
+def read_reference_filenames(annotations_path, bad_images):
+    """Reads image paths the way the loader did before annotations were parsed with tf.data ops (with blank lines
+    skipped, which the previous reader turned into paths of the annotations directory)."""
+    for line in annotations_path.read_text().splitlines():
+        image = line.split(" ")[0]
+        if image and image not in bad_images:
+            yield (annotations_path.parent / image).as_posix()
+
+
+@pytest.fixture
+def annotations_path(tmp_path_factory):
+    bad_image = sorted(_mjsynth.BAD_IMAGES["train"])[0]
+    path = tmp_path_factory.mktemp("annotations") / "annotation_train.txt"
+    path.write_text("./1/2/10_hello_10.jpg 5\n"
+                    f"{bad_image} 3\n"
+                    "\n"
+                    "./1/3/11_World_11.jpg 7\n"
+                    "./2/1/12_Z0_12.jpg 1")
+    return path
+
+
+def test_get_image_filenames__match_reference_reader(annotations_path):
+    bad_images = _mjsynth.BAD_IMAGES["train"]
+    char_to_label = _mjsynth.build_char_to_label()
+
+    filenames = [filename.decode() for filename in
+                 _mjsynth.get_image_filenames(annotations_path, bad_images).as_numpy_iterator()]
+    expected_filenames = list(read_reference_filenames(annotations_path, bad_images))
+
+    assert filenames == expected_filenames
+    assert [Path(filename).name for filename in filenames] == ["10_hello_10.jpg", "11_World_11.jpg", "12_Z0_12.jpg"]
+    labels = [_mjsynth.get_text_labels(filename, char_to_label).numpy().tolist() for filename in filenames]
+    assert labels == [[datasets.CHARS.index(char) for char in text] for text in ("hello", "World", "Z0")]
+
+
+def test_get_image_filenames__shards_cover_annotations_once(annotations_path):
+    bad_images = _mjsynth.BAD_IMAGES["train"]
+    filenames = list(_mjsynth.get_image_filenames(annotations_path, bad_images).as_numpy_iterator())
+
+    sharded_filenames = []
+    for shard_index in range(3):
+        sharded_filenames += list(_mjsynth.get_image_filenames(
+            annotations_path, bad_images, num_shards=3, shard_index=shard_index).as_numpy_iterator())
+
+    assert sorted(sharded_filenames) == sorted(filenames)
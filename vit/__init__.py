@@ -1,5 +1,10 @@
 """Vision Transformer (ViT) for scene text recognition implementation."""
+from vit import profiling
 from vit import layers
 from vit import losses
 from vit import metrics
 from vit import schedules
+from vit import callbacks
+from vit import models
+from vit import decoding
+from vit import inference
@@ -0,0 +1,5 @@
+"""Callbacks."""
+from ._tracing_counter import TracingCounter
+from ._throughput import Throughput
+from ._step_profiler import StepProfiler
+from ._skip_metric_batches import SkipMetricBatches
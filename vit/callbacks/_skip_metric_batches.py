@@ -0,0 +1,36 @@
+"""A callback that makes metrics skip batches in training only."""
+import tensorflow as tf
+
+
+class SkipMetricBatches(tf.keras.callbacks.Callback):
+    """Enables skipping of batches by metrics with update_every > 1 (see vit.metrics.GreedyDecoding) in training and
+    disables it in evaluation (including validation in fit()), so that validation metrics are calculated on all
+    batches.
+
+    :param metrics: Metrics with a decoding attribute (e.g. vit.metrics.CTCAccuracy) that are passed to
+        model.compile().
+    """
+
+    def __init__(self, metrics):
+        super().__init__()
+        # Metrics may share the same decoding
+        self.decodings = list({id(metric.decoding): metric.decoding for metric in metrics}.values())
+        self._is_training = False
+
+    def set_skipping(self, enabled):
+        for decoding in self.decodings:
+            decoding.set_skipping(enabled)
+
+    def on_train_begin(self, logs=None):
+        self._is_training = True
+        self.set_skipping(True)
+
+    def on_train_end(self, logs=None):
+        self._is_training = False
+        self.set_skipping(False)
+
+    def on_test_begin(self, logs=None):
+        self.set_skipping(False)
+
+    def on_test_end(self, logs=None):
+        self.set_skipping(self._is_training)
@@ -0,0 +1,104 @@
+"""A callback that splits training steps into input waiting and computation."""
+import json
+import resource
+import time
+
+import tensorflow as tf
+
+
+class StepProfiler(tf.keras.callbacks.Callback):
+    """Records how long every training step waits for the input pipeline and how long it computes, images per second
+    and peak memory of the host process, to tell whether training is bound by the input pipeline.
+
+    To separate waiting for a batch from computation, the callback replaces the train function of the model for the
+    time of fit() with one that gets a batch eagerly and then runs model.train_step() as a compiled function. It
+    supports the default distribution strategy and steps_per_execution=1 only.
+
+    Step records are written as JSON lines and as TensorBoard scalars. Means of every epoch (excluding the first steps
+    of training, which include tracing and compilation) are added to logs as "input_wait_fraction", "images_per_sec"
+    and "peak_host_memory_mb", and are available in the history attribute.
+
+    :param log_dir: A directory for TensorBoard summaries (None to not write them), writing them requires the
+        tensorboard package.
+    :param json_path: Path to a file where step records are appended as JSON lines (None to not write them).
+    :param warmup_steps: Number of steps at the beginning of training that aren't included in epoch means.
+    """
+
+    def __init__(self, log_dir=None, json_path=None, warmup_steps=5):
+        super().__init__()
+        self.log_dir = log_dir
+        self.json_path = json_path
+        self.warmup_steps = warmup_steps
+        self.history = []
+
+        self._steps_count = 0
+        self._epoch_records = []
+        self._original_train_function = None
+        self._writer = None
+        self._json_file = None
+
+    def on_train_begin(self, logs=None):
+        if tf.distribute.has_strategy() or self.model._steps_per_execution.numpy() != 1:
+            raise ValueError("StepProfiler supports only the default distribution strategy and steps_per_execution=1")
+
+        train_step = self.model.train_step
+        if not self.model.run_eagerly:
+            train_step = tf.function(train_step, jit_compile=self.model.jit_compile, reduce_retracing=True)
+
+        def train_function(iterator):
+            start_time = time.perf_counter()
+            data = next(iterator)
+            input_time = time.perf_counter()
+            # Logs are converted to numpy, which waits until the step is completed
+            step_logs = {name: value.numpy() for name, value in train_step(data).items()}
+            end_time = time.perf_counter()
+            self._record_step(input_time - start_time, end_time - input_time, tf.nest.flatten(data)[0].shape[0])
+            return step_logs
+
+        self._original_train_function = self.model.train_function
+        self.model.train_function = train_function
+        if self.log_dir is not None:
+            self._writer = tf.summary.create_file_writer(str(self.log_dir))
+        if self.json_path is not None:
+            self._json_file = open(self.json_path, "a")
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._epoch_records = []
+
+    def on_epoch_end(self, epoch, logs=None):
+        records = self._epoch_records
+        if not records:
+            return
+        input_wait = sum(record["input_wait_s"] for record in records)
+        duration = input_wait + sum(record["compute_s"] for record in records)
+        summary = {"input_wait_fraction": input_wait / duration,
+                   "images_per_sec": sum(record["images"] for record in records) / duration,
+                   "peak_host_memory_mb": max(record["peak_host_memory_mb"] for record in records)}
+        self.history.append(summary)
+        if logs is not None:
+            logs.update(summary)
+
+    def on_train_end(self, logs=None):
+        self.model.train_function = self._original_train_function
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._json_file is not None:
+            self._json_file.close()
+            self._json_file = None
+
+    def _record_step(self, input_wait, compute, images_count):
+        self._steps_count += 1
+        record = {"step": self._steps_count, "input_wait_s": input_wait, "compute_s": compute, "images": images_count,
+                  "images_per_sec": images_count / (input_wait + compute),
+                  # ru_maxrss is measured in kilobytes on Linux
+                  "peak_host_memory_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+        if self._steps_count > self.warmup_steps:
+            self._epoch_records.append(record)
+
+        if self._json_file is not None:
+            self._json_file.write(json.dumps(record) + "\n")
+        if self._writer is not None:
+            with self._writer.as_default(step=self._steps_count):
+                for name in ("input_wait_s", "compute_s", "images_per_sec", "peak_host_memory_mb"):
+                    tf.summary.scalar(f"step_profiler/{name}", record[name])
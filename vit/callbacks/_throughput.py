@@ -0,0 +1,44 @@
+"""A callback that measures training throughput."""
+import time
+
+import tensorflow as tf
+
+
+class Throughput(tf.keras.callbacks.Callback):
+    """Measures the number of training samples processed per second, excluding the first steps of training, which
+    include tracing and compilation.
+
+    Throughput of every epoch is added to logs as "samples_per_sec" and is available in the history attribute.
+
+    :param batch_size: Number of samples in a (global) batch.
+    :param warmup_steps: Number of steps at the beginning of training that aren't measured.
+    """
+
+    def __init__(self, batch_size, warmup_steps=5):
+        super().__init__()
+        self.batch_size = batch_size
+        self.warmup_steps = warmup_steps
+        self.history = []
+
+        self._steps_count = 0
+        self._measured_steps_count = 0
+        self._start_time = None
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._measured_steps_count = 0
+        self._start_time = time.perf_counter() if self._steps_count >= self.warmup_steps else None
+
+    def on_train_batch_end(self, batch, logs=None):
+        self._steps_count += 1
+        if self._start_time is not None:
+            self._measured_steps_count += 1
+        elif self._steps_count == self.warmup_steps:
+            self._start_time = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        if self._start_time is None or not self._measured_steps_count:
+            return
+        samples_per_sec = self._measured_steps_count * self.batch_size / (time.perf_counter() - self._start_time)
+        self.history.append(samples_per_sec)
+        if logs is not None:
+            logs["samples_per_sec"] = samples_per_sec
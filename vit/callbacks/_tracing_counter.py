@@ -0,0 +1,41 @@
+"""A callback that counts tracing of compiled model functions."""
+import tensorflow as tf
+
+
+class TracingCounter(tf.keras.callbacks.Callback):
+    """Counts how many times the train, test and predict functions of a model were traced, which is useful to check
+    that a fit() with jit_compile=True doesn't recompile on every change of input shapes (e.g. label lengths).
+
+    Counts are added to logs at the end of every epoch as "train_traces" and "test_traces", and are available in the
+    counts attribute.
+
+    :param warn_after: Number of traces of a function after which a warning is logged (None to disable warnings).
+    """
+
+    FUNCTIONS = ("train", "test", "predict")
+
+    def __init__(self, warn_after=None):
+        super().__init__()
+        self.warn_after = warn_after
+        self.counts = dict.fromkeys(self.FUNCTIONS, 0)
+
+    def update_counts(self):
+        """Reads the current tracing counts of the model functions."""
+        for name in self.FUNCTIONS:
+            function = getattr(self.model, f"{name}_function", None)
+            # Functions are plain Python functions when the model is run eagerly
+            if hasattr(function, "experimental_get_tracing_count"):
+                self.counts[name] = function.experimental_get_tracing_count()
+
+            if self.warn_after is not None and self.counts[name] > self.warn_after:
+                tf.get_logger().warning(f"The {name} function was traced {self.counts[name]} times, check that input "
+                                        f"shapes are fixed")
+        return self.counts
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.update_counts()
+        if logs is not None:
+            logs.update(train_traces=self.counts["train"], test_traces=self.counts["test"])
+
+    def on_train_end(self, logs=None):
+        self.update_counts()
@@ -0,0 +1,30 @@
+"""Tests for the SkipMetricBatches callback."""
+import tensorflow as tf
+
+from numpy.testing import assert_allclose
+
+import vit
+
+from vit.callbacks import SkipMetricBatches
+
+
+def test_fit__batches_are_skipped_in_training_only():
+    classes_count = 10
+    y_true = tf.constant([[4, 2], [4, 2], [4, 2]])
+    # Only the first sample is predicted correctly
+    y_pred = tf.one_hot([[4, classes_count, 2], [4, classes_count, 3], [4, classes_count, 3]], classes_count + 1,
+                        on_value=0.9, off_value=0.01)
+    # An identity model, which isn't changed by training with a zero learning rate
+    model = tf.keras.Sequential([tf.keras.Input([3, classes_count + 1]),
+                                 tf.keras.layers.Dense(classes_count + 1, use_bias=False,
+                                                       kernel_initializer="identity")])
+    metrics = [vit.metrics.CTCAccuracy(update_every=2)]
+    model.compile(optimizer=tf.keras.optimizers.SGD(0.0), loss=vit.losses.CTCLoss(), metrics=metrics)
+
+    history = model.fit(y_pred, y_true, batch_size=1, epochs=2, shuffle=False, validation_data=(y_pred, y_true),
+                        callbacks=[SkipMetricBatches(metrics)], verbose=0)
+
+    # The 1st and the 3rd batches are decoded in training
+    assert_allclose(history.history["accuracy"], [1 / 2] * 2, rtol=1E-6)
+    assert_allclose(history.history["val_accuracy"], [1 / 3] * 2, rtol=1E-6)
+    assert not metrics[0].decoding.skipping
@@ -0,0 +1,44 @@
+"""Tests for the StepProfiler callback."""
+import json
+
+import numpy as np
+import tensorflow as tf
+
+import vit
+from vit.callbacks import StepProfiler
+
+
+def fit(callbacks, epochs=2):
+    tf.keras.utils.set_random_seed(0)
+    rng = np.random.default_rng(0)
+    images = rng.uniform(-1, 1, size=[24, 8, 32, 1]).astype(np.float32)
+    labels = rng.integers(0, 5, size=[24, 4]).astype(np.int32)
+    dataset = tf.data.Dataset.from_tensor_slices((images, labels)).batch(8)
+
+    model = vit.models.build_vit_str(6, 8, 1, image_width=32, num_layers=1, model_dim=16, num_heads=2, mlp_dim=32,
+                                     dropout=0.0)
+    model.compile(optimizer="adam", loss=vit.losses.CTCLoss(), metrics=[vit.metrics.CTCAccuracy()])
+    history = model.fit(dataset, epochs=epochs, callbacks=callbacks, verbose=0)
+    return model, history
+
+
+def test_fit__steps_are_recorded_without_changing_training(tmp_path):
+    json_path = tmp_path / "steps.jsonl"
+    step_profiler = StepProfiler(json_path=json_path, warmup_steps=1)
+
+    model, history = fit([step_profiler])
+    reference_model, reference_history = fit([])
+
+    for weights, reference_weights in zip(model.get_weights(), reference_model.get_weights()):
+        np.testing.assert_allclose(weights, reference_weights, rtol=1e-4, atol=1e-4)
+    np.testing.assert_allclose(history.history["loss"], reference_history.history["loss"], rtol=1e-4)
+
+    records = [json.loads(line) for line in json_path.read_text().splitlines()]
+    assert [record["step"] for record in records] == list(range(1, 7))
+    assert all(record["images"] == 8 and record["input_wait_s"] >= 0 and record["compute_s"] > 0
+               for record in records)
+    assert len(step_profiler.history) == 2
+    assert 0 <= history.history["input_wait_fraction"][-1] <= 1
+    assert history.history["images_per_sec"][-1] > 0
+    # The original train function is restored after training
+    assert model.train_function is step_profiler._original_train_function
@@ -0,0 +1,33 @@
+"""Tests for the TracingCounter callback."""
+import numpy as np
+import tensorflow as tf
+
+import vit
+
+from vit.callbacks import TracingCounter
+
+
+def test_fit__jit_compiled_step_is_traced_once_for_bucketed_labels():
+    classes_count = 6
+    rng = np.random.default_rng(0)
+    images = rng.uniform(-1, 1, size=[32, 8, 32, 1]).astype(np.float32)
+    labels = [rng.integers(0, classes_count - 1, size=length) for length in rng.integers(1, 4, size=32)]
+    dataset = tf.data.Dataset.from_generator(
+        lambda: zip(images, labels),
+        output_signature=(tf.TensorSpec([8, 32, 1]), tf.TensorSpec([None], tf.int32)))
+
+    padding_value = -1
+    dataset = dataset.padded_batch(8, padded_shapes=([8, 32, 1], [4]), padding_values=(0.0, padding_value),
+                                   drop_remainder=True)
+
+    model = vit.models.build_vit_str(classes_count, 8, 1, image_width=32, num_layers=1, model_dim=16, num_heads=2,
+                                     mlp_dim=32)
+    model.compile(optimizer="adam", loss=vit.losses.CTCLoss(true_labels_padding_value=padding_value, jit_compile=True),
+                  metrics=[vit.metrics.CTCAccuracy(true_labels_padding_value=padding_value)], jit_compile=True)
+    tracing_counter = TracingCounter()
+
+    history = model.fit(dataset, epochs=2, validation_data=dataset, callbacks=[tracing_counter], verbose=0)
+
+    assert np.isfinite(history.history["loss"]).all()
+    assert tracing_counter.counts["train"] == 1
+    assert history.history["test_traces"][-1] == 1
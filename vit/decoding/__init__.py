@@ -0,0 +1,3 @@
+"""CTC decoders."""
+from ._decoders import Decoder, GreedyDecoder, BeamSearchDecoder, LexiconDecoder
+from ._labels import label_folding_matrix, text_to_labels, labels_to_text
@@ -0,0 +1,203 @@
+"""Batched CTC decoders."""
+import abc
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from vit.decoding._labels import text_to_labels
+from vit.profiling import trace
+
+
+class Decoder(abc.ABC):
+    """Base class of CTC decoders, that converts per-frame label probabilities into label sequences and records
+    decoding latency of every batch.
+
+    The last label of predictions is treated as the CTC blank one. Frames where all probabilities are zeros (see
+    vit.layers.ApplyMask) are treated as padding.
+
+    :param label_folding: A matrix from label_folding_matrix() that is applied to predictions before decoding (None
+        if labels shouldn't be folded).
+    """
+
+    # A small value that is added to probabilities before taking their logarithm (the same as in Keras ctc_decode())
+    EPSILON = 1E-7
+
+    def __init__(self, label_folding=None):
+        self.label_folding = None if label_folding is None else tf.constant(label_folding, tf.float32)
+        self.latencies = []
+        self._decode = tf.function(self.decode, reduce_retracing=True)
+
+    def __call__(self, y_pred, *args):
+        """Decodes a batch of predictions and records decoding latency.
+
+        :param y_pred: A [batch, frames, classes] tensor of probabilities.
+        :return: A [batch, None] int32 tf.RaggedTensor of decoded labels.
+        """
+        start_time = time.perf_counter()
+        labels = self._decode(tf.convert_to_tensor(y_pred), *args)
+        self.latencies.append(time.perf_counter() - start_time)
+        return labels
+
+    @abc.abstractmethod
+    def decode(self, y_pred, *args):
+        """Decodes a batch of predictions (can be used inside tf.function, doesn't record latency)."""
+
+    def fold(self, y_pred):
+        """Casts predictions to float32 and applies label folding."""
+        y_pred = tf.cast(y_pred, tf.float32)
+        if self.label_folding is not None:
+            y_pred = tf.tensordot(y_pred, self.label_folding, axes=1)
+        return y_pred
+
+    def get_length(self, y_pred):
+        """Returns a [batch] int32 tensor of numbers of frames that are not padding."""
+        return tf.reduce_sum(tf.cast(tf.reduce_sum(y_pred, axis=-1) > 0, tf.int32), axis=1)
+
+    def latency_summary(self):
+        """Returns a dict with the number of decoded batches and mean, median and 99th percentile of decoding latency
+        in milliseconds."""
+        latencies = np.array(self.latencies) * 1000
+        if not len(latencies):
+            return {"batches": 0}
+        return {"batches": len(latencies), "mean_ms": float(latencies.mean()),
+                "p50_ms": float(np.percentile(latencies, 50)), "p99_ms": float(np.percentile(latencies, 99))}
+
+
+class GreedyDecoder(Decoder):
+    """Decodes predictions by taking the most probable label of each frame and collapsing repeated and blank labels.
+
+    :param label_folding: A matrix from label_folding_matrix() that is applied to predictions before decoding.
+    """
+
+    def decode(self, y_pred):
+        labels, length = decode_greedily(self.fold(y_pred))
+        return tf.RaggedTensor.from_tensor(labels, lengths=length)
+
+
+class BeamSearchDecoder(Decoder):
+    """Decodes predictions with CTC beam search.
+
+    :param beam_width: Number of beams.
+    :param label_folding: A matrix from label_folding_matrix() that is applied to predictions before decoding.
+    """
+
+    def __init__(self, beam_width=10, label_folding=None):
+        super().__init__(label_folding)
+        self.beam_width = beam_width
+
+    def decode(self, y_pred):
+        y_pred = self.fold(y_pred)
+
+        log_probs = tf.math.log(tf.transpose(y_pred, [1, 0, 2]) + self.EPSILON)
+        decoded, _ = tf.nn.ctc_beam_search_decoder(log_probs, self.get_length(y_pred), beam_width=self.beam_width,
+                                                   top_paths=1)
+
+        return tf.RaggedTensor.from_sparse(tf.cast(decoded[0], tf.int32))
+
+
+class LexiconDecoder(Decoder):
+    """Decodes predictions by choosing the most probable word of a lexicon (e.g. 50 or 1k words lexicons of IIIT5K)
+    according to the CTC likelihood, which is calculated for all words of all samples in a batch at once.
+
+    :param chars: Characters that correspond to labels (after folding).
+    :param lexicon: A list of words shared by all samples (if None, lexicons should be passed per batch).
+    :param words_per_step: Maximal number of words per sample, for which likelihood is calculated at once (limits
+        memory usage for large lexicons).
+    :param label_folding: A matrix from label_folding_matrix() that is applied to predictions before decoding.
+    """
+
+    def __init__(self, chars, lexicon=None, words_per_step=64, label_folding=None):
+        super().__init__(label_folding)
+        self.chars = list(chars)
+        self.lexicon = None if lexicon is None else text_to_labels(lexicon, self.chars)
+        self.words_per_step = words_per_step
+
+    def __call__(self, y_pred, lexicons=None):
+        """Decodes a batch of predictions.
+
+        :param y_pred: A [batch, frames, classes] tensor of probabilities.
+        :param lexicons: A list of lexicons (lists of words) for each sample of the batch (if None, the lexicon that
+            was passed to the constructor is used).
+        :return: A [batch, None] int32 tf.RaggedTensor of labels of chosen words.
+        """
+        if lexicons is None:
+            if self.lexicon is None:
+                raise ValueError("Lexicons should be passed if the decoder doesn't have a shared lexicon")
+            lexicons = np.broadcast_to(self.lexicon, (len(y_pred),) + self.lexicon.shape)
+        else:
+            lexicons = encode_lexicons(lexicons, self.chars)
+        return super().__call__(y_pred, tf.constant(lexicons))
+
+    def decode(self, y_pred, lexicons):
+        """Decodes a batch of predictions.
+
+        :param y_pred: A [batch, frames, classes] tensor of probabilities.
+        :param lexicons: A [batch, words, max_length] tensor of labels of words padded with -1 (words of zero length are
+            never chosen).
+        :return: A [batch, None] int32 tf.RaggedTensor of labels of chosen words.
+        """
+        y_pred = self.fold(y_pred)
+        log_probs = tf.math.log(y_pred + self.EPSILON)
+        batch_size = tf.shape(log_probs)[0]
+        lexicons_shape = tf.shape(lexicons)
+
+        # Words are split into steps of words_per_step words (padded with empty words), likelihood of all words of a
+        # step is calculated for all samples at once
+        steps_count = (lexicons_shape[1] + self.words_per_step - 1) // self.words_per_step
+        steps = tf.pad(lexicons, [[0, 0], [0, steps_count * self.words_per_step - lexicons_shape[1]], [0, 0]],
+                       constant_values=-1)
+        steps = tf.reshape(steps, [batch_size, steps_count, self.words_per_step, lexicons_shape[2]])
+        steps = tf.transpose(steps, [1, 0, 2, 3])
+        repeated_log_probs = tf.repeat(log_probs, self.words_per_step, axis=0)
+        repeated_length = tf.repeat(self.get_length(y_pred), self.words_per_step, axis=0)
+
+        def calculate_step_losses(words):
+            words = tf.reshape(words, [batch_size * self.words_per_step, -1])
+            words_length = tf.reduce_sum(tf.cast(words >= 0, tf.int32), axis=1)
+            losses = tf.nn.ctc_loss(tf.maximum(words, 0), repeated_log_probs, label_length=words_length,
+                                    logit_length=repeated_length,
+                                    logits_time_major=False, blank_index=-1)
+            losses = tf.where(words_length > 0, losses, np.inf)
+            return tf.reshape(losses, [batch_size, self.words_per_step])
+
+        losses = tf.map_fn(calculate_step_losses, steps, fn_output_signature=tf.float32)
+        losses = tf.reshape(tf.transpose(losses, [1, 0, 2]), [batch_size, -1])[:, :lexicons_shape[1]]
+
+        best_words = tf.argmin(losses, axis=1, output_type=tf.int32)
+        labels = tf.gather(lexicons, best_words, batch_dims=1)
+        return tf.RaggedTensor.from_tensor(labels, padding=-1)
+
+
+def encode_lexicons(lexicons, chars):
+    """Converts per-sample lists of words to a [samples, max_words, max_length] array of labels padded with -1."""
+    words_count = max(map(len, lexicons))
+    max_length = max((len(word) for lexicon in lexicons for word in lexicon), default=0)
+    encoded = np.full([len(lexicons), words_count, max_length], -1, dtype=np.int32)
+    for i, lexicon in enumerate(lexicons):
+        labels = text_to_labels(lexicon, chars)
+        encoded[i, :labels.shape[0], :labels.shape[1]] = labels
+    return encoded
+
+
+def decode_greedily(y_pred):
+    """Decodes predictions by taking the most probable label of each frame and collapsing repeated and blank labels.
+
+    :param y_pred: A [batch, frames, classes] tensor of probabilities, the last label is the CTC blank one.
+    :return: A [batch, frames] int32 tensor of decoded labels padded with -1 and a [batch] tensor of their lengths.
+    """
+    with trace("ctc_decoding"):
+        labels = tf.argmax(y_pred, axis=-1, output_type=tf.int32)
+        blank_label = tf.shape(y_pred)[-1] - 1
+
+        # A label is emitted if it isn't blank and differs from the label of the previous frame
+        previous_labels = tf.pad(labels[:, :-1], [[0, 0], [1, 0]], constant_values=-1)
+        is_emitted = tf.logical_and(tf.not_equal(labels, blank_label), tf.not_equal(labels, previous_labels))
+        is_emitted = tf.logical_and(is_emitted, tf.reduce_sum(y_pred, axis=-1) > 0)
+
+        # Emitted labels are moved to the start of a sequence by a stable sort, which keeps their order
+        order = tf.argsort(tf.cast(tf.logical_not(is_emitted), tf.int32), axis=1, stable=True)
+        length = tf.reduce_sum(tf.cast(is_emitted, tf.int32), axis=1)
+        decoded = tf.where(tf.range(tf.shape(labels)[1]) < length[:, tf.newaxis],
+                           tf.gather(labels, order, batch_dims=1), -1)
+        return decoded, length
@@ -0,0 +1,49 @@
+"""Conversion between labels and text."""
+import numpy as np
+import tensorflow as tf
+
+
+def label_folding_matrix(source_chars, target_chars, case_insensitive=True):
+    """Builds a matrix that maps probabilities of source labels onto target labels, e.g. to fold lowercase and
+    uppercase letters of datasets.CHARS onto datasets.IIIT5K_CHARS. The last (CTC blank) label is mapped onto the last
+    target label, source labels without a corresponding target label are mapped onto the blank one.
+
+    :param source_chars: Characters of source labels (excluding the blank label).
+    :param target_chars: Characters of target labels (excluding the blank label).
+    :param case_insensitive: Whether characters are compared ignoring their case.
+    :return: A [len(source_chars) + 1, len(target_chars) + 1] float32 array.
+    """
+    normalize = (lambda char: char.upper()) if case_insensitive else (lambda char: char)
+    target_labels = {normalize(char): label for label, char in enumerate(target_chars)}
+    blank_label = len(target_chars)
+
+    matrix = np.zeros([len(source_chars) + 1, len(target_chars) + 1], dtype=np.float32)
+    for label, char in enumerate(source_chars):
+        matrix[label, target_labels.get(normalize(char), blank_label)] = 1
+    matrix[-1, blank_label] = 1
+    return matrix
+
+
+def text_to_labels(texts, chars, padding_value=-1):
+    """Converts strings to a padded [len(texts), max_length] int32 array of labels.
+
+    :param texts: A list of strings.
+    :param chars: Characters that correspond to labels.
+    :param padding_value: A value that is used to pad labels.
+    :return: A padded array of labels.
+    """
+    char_to_label = {char: label for label, char in enumerate(chars)}
+    labels = np.full([len(texts), max(map(len, texts), default=0)], padding_value, dtype=np.int32)
+    for i, text in enumerate(texts):
+        labels[i, :len(text)] = [char_to_label[char] for char in text]
+    return labels
+
+
+def labels_to_text(labels, chars):
+    """Converts labels to strings.
+
+    :param labels: A [batch, None] tf.RaggedTensor of labels.
+    :param chars: Characters that correspond to labels.
+    :return: A [batch] tensor of UTF-8 strings.
+    """
+    return tf.strings.reduce_join(tf.gather(tf.constant(list(chars)), labels), axis=-1)
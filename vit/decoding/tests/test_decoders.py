@@ -0,0 +1,79 @@
+"""Tests for CTC decoders."""
+import numpy as np
+import pytest
+import tensorflow as tf
+
+from numpy.testing import assert_array_equal
+
+from vit.decoding import Decoder, GreedyDecoder, BeamSearchDecoder, LexiconDecoder, label_folding_matrix, labels_to_text
+
+
+CHARS = list("abc")
+BLANK = len(CHARS)
+
+
+def smoothed_one_hot(labels, classes_count=BLANK + 1, confidence=0.9):
+    other = (1 - confidence) / (classes_count - 1)
+    return tf.one_hot(labels, classes_count, on_value=confidence, off_value=other)
+
+
+def test_greedy_decoder__output_values_are_correct():
+    y_pred = smoothed_one_hot([[BLANK, 0, 0, BLANK, 0, 1, BLANK, 2, 2],
+                               [BLANK] * 9])
+    decoder = GreedyDecoder()
+
+    labels = decoder(y_pred)
+
+    assert labels.to_list() == [[0, 0, 1, 2], []]
+    assert decoder.latency_summary()["batches"] == 1
+
+
+def test_beam_search_decoder__finds_more_probable_sequence_than_greedy():
+    # The most probable path is "blank, blank" but "a" is more probable as a sum over its paths
+    y_pred = tf.constant([[[0.4, 0.0, 0.0, 0.6],
+                           [0.4, 0.0, 0.0, 0.6]]])
+
+    greedy_labels = GreedyDecoder()(y_pred)
+    beam_search_labels = BeamSearchDecoder(beam_width=4)(y_pred)
+
+    assert greedy_labels.to_list() == [[]]
+    assert beam_search_labels.to_list() == [[0]]
+
+
+def test_lexicon_decoder__shared_and_per_sample_lexicons():
+    y_pred = smoothed_one_hot([[BLANK, 0, 0, BLANK, 0, 1, BLANK, 2, 2],
+                               [1, 1, BLANK, 1, BLANK, BLANK, BLANK, BLANK, BLANK]])
+    decoder = LexiconDecoder(CHARS, lexicon=["cab", "aabc", "bb", "abc"], words_per_step=3)
+
+    shared_labels = decoder(y_pred)
+    per_sample_labels = decoder(y_pred, lexicons=[["abc", "aab"], ["c", "b", "ba"]])
+
+    assert labels_to_text(shared_labels, CHARS).numpy().tolist() == [b"aabc", b"bb"]
+    assert labels_to_text(per_sample_labels, CHARS).numpy().tolist() == [b"abc", b"b"]
+
+
+def test_label_folding_matrix__case_insensitive_folding():
+    y_pred = smoothed_one_hot([[0, BLANK, 1, 2]], classes_count=4)
+    folding = label_folding_matrix(list("aAb"), list("AB"))
+
+    labels = GreedyDecoder(label_folding=folding)(y_pred)
+
+    assert_array_equal(folding.sum(axis=1), np.ones(4))
+    assert labels.to_list() == [[0, 0, 1]]
+
+
+def test_decoders__zero_frames_are_treated_as_padding():
+    y_pred = smoothed_one_hot([[0, BLANK, 1, 1]])
+    padded_y_pred = tf.pad(y_pred, [[0, 0], [0, 3], [0, 0]])
+
+    assert GreedyDecoder()(padded_y_pred).to_list() == [[0, 1]]
+    assert BeamSearchDecoder()(padded_y_pred).to_list() == [[0, 1]]
+    assert LexiconDecoder(CHARS, lexicon=["ab", "aa", "abc"])(padded_y_pred).to_list() == [[0, 1]]
+
+
+def test_decoder__subclasses_without_decode_cant_be_created():
+    class IncompleteDecoder(Decoder):
+        pass
+
+    with pytest.raises(TypeError):
+        IncompleteDecoder()
@@ -0,0 +1,8 @@
+"""Tools for running trained models."""
+from ._recognizer import Recognizer
+from ._line_recognizer import LineRecognizer
+from ._cache import RecognitionCache, CachingRecognizer, perceptual_hash, KEY_TYPES
+from ._server import RecognitionServer
+from ._tflite import convert_to_tflite, TFLiteModel, QUANTIZATION_MODES
+from ._early_exit import EarlyExitModel
+from ._evaluation import evaluate_accuracy
@@ -0,0 +1,216 @@
+"""A cache of recognized texts for repeated images."""
+import collections
+import hashlib
+import sqlite3
+import sys
+import threading
+
+import numpy as np
+import tensorflow as tf
+
+
+KEY_TYPES = ("bytes", "perceptual")
+
+
+class RecognitionCache:
+    """A content-addressed LRU cache of recognized texts, that can be persisted to an SQLite file.
+
+    Entries are evicted from memory when either the number of entries exceeds max_entries or their estimated size
+    exceeds max_memory_bytes. If path is passed, entries are also written to the file and entries that aren't in
+    memory are looked up there, so they survive eviction and restarts. The file doesn't depend on the model, so a
+    separate path should be used for every model version.
+
+    The cache is thread-safe. Counters of hits ("hits" include "disk_hits"), misses and evictions are returned by
+    stats().
+
+    :param max_entries: Maximal number of entries in memory (None for no limit).
+    :param max_memory_bytes: Maximal estimated size of entries in memory in bytes (None for no limit).
+    :param path: Path of an SQLite file where entries are persisted (None to keep them only in memory).
+    """
+
+    def __init__(self, max_entries=100000, max_memory_bytes=None, path=None):
+        self.max_entries = max_entries
+        self.max_memory_bytes = max_memory_bytes
+        self.path = path
+
+        self.hits_count = 0
+        self.disk_hits_count = 0
+        self.misses_count = 0
+        self.evictions_count = 0
+        self.memory_bytes = 0
+
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._connection = None
+        if path is not None:
+            self._connection = sqlite3.connect(str(path), check_same_thread=False)
+            self._connection.execute("CREATE TABLE IF NOT EXISTS recognitions (key TEXT PRIMARY KEY, text TEXT)")
+            self._connection.commit()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_many(self, keys):
+        """Looks up texts of a batch of keys.
+
+        :param keys: A list of keys.
+        :return: A list of texts, with None for keys that aren't cached.
+        """
+        with self._lock:
+            texts = [self._get_from_memory(key) for key in keys]
+            missing_keys = list({key for key, text in zip(keys, texts) if text is None})
+            disk_texts = self._get_from_disk(missing_keys)
+            for key, text in disk_texts.items():
+                self._put_to_memory(key, text)
+
+            for i, key in enumerate(keys):
+                if texts[i] is not None:
+                    self.hits_count += 1
+                elif key in disk_texts:
+                    texts[i] = disk_texts[key]
+                    self.hits_count += 1
+                    self.disk_hits_count += 1
+                else:
+                    self.misses_count += 1
+            return texts
+
+    def put_many(self, keys, texts):
+        """Adds texts of a batch of keys to the cache.
+
+        :param keys: A list of keys.
+        :param texts: A list of texts that correspond to keys.
+        """
+        with self._lock:
+            for key, text in zip(keys, texts):
+                self._put_to_memory(key, text)
+            if self._connection is not None:
+                self._connection.executemany("INSERT OR REPLACE INTO recognitions VALUES (?, ?)", zip(keys, texts))
+                self._connection.commit()
+
+    def clear(self):
+        """Removes all entries from memory and from the file."""
+        with self._lock:
+            self._entries.clear()
+            self.memory_bytes = 0
+            if self._connection is not None:
+                self._connection.execute("DELETE FROM recognitions")
+                self._connection.commit()
+
+    def close(self):
+        """Closes the file (entries in memory are still available)."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def stats(self):
+        """Returns counters of the cache as a JSON-serializable dict."""
+        with self._lock:
+            lookups_count = self.hits_count + self.misses_count
+            return {
+                "entries": len(self._entries),
+                "memory_bytes": self.memory_bytes,
+                "hits": self.hits_count,
+                "disk_hits": self.disk_hits_count,
+                "misses": self.misses_count,
+                "evictions": self.evictions_count,
+                "hit_rate": self.hits_count / lookups_count if lookups_count else None
+            }
+
+    def _get_from_memory(self, key):
+        text = self._entries.get(key)
+        if text is not None:
+            self._entries.move_to_end(key)
+        return text
+
+    def _get_from_disk(self, keys):
+        if self._connection is None or not keys:
+            return {}
+        texts = {}
+        # SQLite limits the number of query parameters
+        for i in range(0, len(keys), 500):
+            batch = keys[i:i + 500]
+            rows = self._connection.execute(
+                f"SELECT key, text FROM recognitions WHERE key IN ({', '.join('?' * len(batch))})", batch)
+            texts.update(rows)
+        return texts
+
+    def _put_to_memory(self, key, text):
+        if key in self._entries:
+            self.memory_bytes -= entry_size(key, self._entries.pop(key))
+        self._entries[key] = text
+        self.memory_bytes += entry_size(key, text)
+        while self._entries and ((self.max_entries is not None and len(self._entries) > self.max_entries) or
+                                 (self.max_memory_bytes is not None and self.memory_bytes > self.max_memory_bytes)):
+            evicted_key, evicted_text = self._entries.popitem(last=False)
+            self.memory_bytes -= entry_size(evicted_key, evicted_text)
+            self.evictions_count += 1
+
+
+class CachingRecognizer:
+    """Wraps a recognizer with a RecognitionCache, so only images that aren't cached (and only one copy of repeated
+    images of a batch) are passed to the recognizer.
+
+    Images are keyed by a SHA-256 hash of their encoded bytes, or by a perceptual hash of the preprocessed image, which
+    also matches re-encoded and slightly different copies of an image (at the risk of returning text of a similar image
+    with a different text).
+
+    :param recognizer: An object with a recognize(images) method that maps a list of encoded images to a list of
+        strings (e.g. vit.inference.Recognizer), and a preprocess(image_data) method if key_type is "perceptual".
+    :param cache: A RecognitionCache (if None, a cache with default arguments is created).
+    :param key_type: "bytes" or "perceptual".
+    :param hash_size: Height and width of the downscaled image whose pixels are the bits of a perceptual hash.
+    """
+
+    def __init__(self, recognizer, cache=None, key_type="bytes", hash_size=(8, 24)):
+        if key_type not in KEY_TYPES:
+            raise ValueError(f"Unknown key type {key_type}, expected one of {KEY_TYPES}")
+        self.recognizer = recognizer
+        self.cache = RecognitionCache() if cache is None else cache
+        self.key_type = key_type
+        self.hash_size = hash_size
+
+    def recognize(self, images):
+        """Recognizes text on images, looking up cached texts first.
+
+        :param images: A list of encoded images.
+        :return: A list of recognized strings.
+        """
+        keys = [self.key(image_data) for image_data in images]
+        texts = self.cache.get_many(keys)
+
+        missing = {}
+        for key, image_data, text in zip(keys, images, texts):
+            if text is None and key not in missing:
+                missing[key] = image_data
+        if missing:
+            recognized = dict(zip(missing, self.recognizer.recognize(list(missing.values()))))
+            self.cache.put_many(list(recognized), list(recognized.values()))
+            texts = [recognized[key] if text is None else text for key, text in zip(keys, texts)]
+        return texts
+
+    def key(self, image_data):
+        """Returns the cache key of an encoded image."""
+        if self.key_type == "bytes":
+            return "sha256:" + hashlib.sha256(image_data).hexdigest()
+        return "phash:" + perceptual_hash(self.recognizer.preprocess(image_data), self.hash_size)
+
+
+def perceptual_hash(image, hash_size=(8, 24)):
+    """Computes an average hash of an image: the image is converted to grayscale and downscaled to hash_size, and every
+    bit of the hash tells whether a pixel is brighter than the mean.
+
+    :param image: A [height, width, channels] image.
+    :param hash_size: Height and width of the downscaled image.
+    :return: The hash as a hexadecimal string.
+    """
+    image = tf.cast(image, tf.float32)
+    if image.shape[-1] == 3:
+        image = tf.image.rgb_to_grayscale(image)
+    pixels = tf.image.resize(image, hash_size, method="area").numpy().ravel()
+    return np.packbits(pixels > pixels.mean()).tobytes().hex()
+
+
+def entry_size(key, text):
+    """Estimates memory used by a cache entry in bytes."""
+    return sys.getsizeof(key) + sys.getsizeof(text)
@@ -0,0 +1,88 @@
+"""Early exit inference for models with intermediate CTC heads."""
+import tensorflow as tf
+
+import vit
+
+
+class EarlyExitModel:
+    """Runs a model with early exit heads (see vit.models.build_vit_str(exit_layers=...)) and stops processing of
+    samples as soon as an exit head is confident about them.
+
+    Confidence of a prediction is the smallest margin between probabilities of the two most probable labels over all
+    frames, so that a sample exits only if every frame is decoded confidently. Samples that exit are removed from the
+    batch, so the remaining encoder layers process fewer samples.
+
+    The object can be used in place of a model, e.g. Recognizer(EarlyExitModel(model)).
+
+    :param model: A model built by build_vit_str() with exit_layers (or loaded by load_vit_str()).
+    :param threshold: Minimal confidence in [0, 1] that is required to exit (values above 1 disable early exits).
+    """
+
+    def __init__(self, model, threshold=0.9):
+        self.model = model
+        self.threshold = threshold
+
+        self.encoder = next((layer for layer in model.layers if isinstance(layer, vit.layers.TransformerEncoder)), None)
+        if self.encoder is None:
+            raise ValueError("The model doesn't have a TransformerEncoder layer (saved models should be loaded with "
+                             "vit.models.load_vit_str())")
+        if self.encoder.exit_layers is None:
+            raise ValueError("The model doesn't have early exit heads")
+        if any(isinstance(layer, vit.layers.ApplyMask) for layer in model.layers):
+            raise ValueError("Early exits aren't supported for models with masking")
+        self.embedding_layers = [layer for layer in model.layers[:model.layers.index(self.encoder)]
+                                 if not isinstance(layer, tf.keras.layers.InputLayer)]
+        self.heads = [model.get_layer(name) for name in model.output_names]
+
+        self._predict = tf.function(self._predict_impl, input_signature=[
+            tf.TensorSpec(model.input_shape, tf.float32), tf.TensorSpec([], tf.float32)])
+
+    def __call__(self, images, training=None):
+        """Predicts per-patch probabilities of labels, the same as a model with a single output."""
+        return self.predict(images)[0]
+
+    def predict(self, images, threshold=None):
+        """Predicts per-patch probabilities of labels with early exits.
+
+        :param images: A batch of images.
+        :param threshold: Confidence threshold (if None, the threshold passed to the constructor is used).
+        :return: A [batch, patches, classes] tensor of probabilities and a [batch] int32 tensor of numbers of encoder
+            layers that were run for each sample.
+        """
+        threshold = self.threshold if threshold is None else threshold
+        return self._predict(tf.cast(images, tf.float32), tf.constant(threshold, tf.float32))
+
+    def _predict_impl(self, images, threshold):
+        x = images
+        for layer in self.embedding_layers:
+            x = layer(x, training=False)
+
+        batch_size = tf.shape(x)[0]
+        sample_indices = tf.range(batch_size)
+        y_pred = tf.zeros([batch_size, tf.shape(x)[1], self.heads[-1].units], tf.float32)
+        exit_layers = tf.fill([batch_size], len(self.encoder.encoder_layers))
+
+        x, _ = self.encoder.add_global_tokens(x)
+        heads = iter(self.heads)
+        for i, layer in enumerate(self.encoder.encoder_layers, start=1):
+            x = layer(x, training=False)
+            if i not in self.encoder.exit_layers:
+                continue
+
+            probs = next(heads)(self.encoder.remove_global_tokens(x))
+            top_probs = tf.math.top_k(probs, k=2).values
+            confidence = tf.reduce_min(top_probs[:, :, 0] - top_probs[:, :, 1], axis=1)
+            is_finished = confidence >= threshold
+
+            finished_indices = tf.boolean_mask(sample_indices, is_finished)[:, tf.newaxis]
+            y_pred = tf.tensor_scatter_nd_update(y_pred, finished_indices, tf.boolean_mask(probs, is_finished))
+            exit_layers = tf.tensor_scatter_nd_update(exit_layers, finished_indices,
+                                                      tf.fill([tf.shape(finished_indices)[0]], i))
+
+            # Finished samples are dropped from the batch for the remaining layers
+            x = tf.boolean_mask(x, tf.logical_not(is_finished))
+            sample_indices = tf.boolean_mask(sample_indices, tf.logical_not(is_finished))
+
+        probs = next(heads)(self.encoder.remove_global_tokens(x))
+        y_pred = tf.tensor_scatter_nd_update(y_pred, sample_indices[:, tf.newaxis], probs)
+        return y_pred, exit_layers
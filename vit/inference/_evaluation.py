@@ -0,0 +1,28 @@
+"""Evaluation of recognition accuracy."""
+import tensorflow as tf
+
+from vit.decoding import GreedyDecoder
+
+
+def evaluate_accuracy(predict, dataset, decoder=None, batch_size=64, max_samples=None):
+    """Calculates how often decoded predictions fully match true labels.
+
+    :param predict: A function that maps a batch of images to per-patch probabilities of labels (e.g. a model).
+    :param dataset: A tf.data.Dataset of (image, labels) pairs.
+    :param decoder: A decoder from vit.decoding (if None, GreedyDecoder is used), e.g. with label folding onto labels
+        of the dataset.
+    :param batch_size: Batch size.
+    :param max_samples: Maximal number of samples to evaluate (None to use the whole dataset).
+    :return: Accuracy in [0, 1].
+    """
+    if max_samples is not None:
+        dataset = dataset.take(max_samples)
+    decoder = GreedyDecoder() if decoder is None else decoder
+
+    correct_count, total_count = 0, 0
+    for images, labels in dataset.padded_batch(batch_size, padding_values=(None, -1)):
+        predicted_labels = decoder(predict(images)).to_list()
+        true_labels = tf.RaggedTensor.from_tensor(labels, padding=-1).to_list()
+        correct_count += sum(predicted == true for predicted, true in zip(predicted_labels, true_labels))
+        total_count += len(true_labels)
+    return correct_count / total_count
@@ -0,0 +1,133 @@
+"""Recognition of text lines that are longer than the model input."""
+import numpy as np
+import tensorflow as tf
+
+import datasets
+from vit.inference._recognizer import Recognizer
+
+
+class LineRecognizer(Recognizer):
+    """Recognizes text on images of arbitrarily long text lines with a model that takes fixed-size images.
+
+    Instead of squashing a line to the model input width, it is resized to the model input height with preserved aspect
+    ratio and cut into overlapping windows of the model input width. Windows of all lines are passed to the model in
+    common batches, then per-frame probabilities of each line are stitched from its windows and decoded at once. Every
+    frame of a line is taken from the window whose center is the nearest to it, so that frames near window borders,
+    which are predicted with less context, are replaced by frames of the overlapping window.
+
+    Windows start at multiples of the patch width, so their frames are aligned to frames of the whole line. Lines that
+    are not wider than a window are resized to the model input size like in Recognizer.
+
+    :param model: A trained model or a path to a saved model, that maps images to per-patch probabilities of labels
+        (the last label is the CTC blank one).
+    :param chars: Characters that correspond to decoded labels (excluding the blank label).
+    :param decoder: A decoder from vit.decoding with a decode(y_pred) method (if None, GreedyDecoder is used).
+    :param max_batch_size: Maximal number of windows that are passed to the model at once.
+    :param overlap: Width of the overlap of consecutive windows in pixels, such that image_width - overlap is a
+        multiple of the patch width.
+    :param patch_width: Patch width of the model (if None, it is inferred from the number of frames that the model
+        outputs for an image).
+    :param image_height: Height of images expected by the model.
+    :param image_width: Width of images expected by the model (the width of windows).
+    :param image_channels: Number of channels of images expected by the model.
+    """
+
+    def __init__(self, model, chars=datasets.CHARS, decoder=None, max_batch_size=256, overlap=40, patch_width=None,
+                 image_height=datasets.IMAGE_HEIGHT, image_width=datasets.IMAGE_WIDTH,
+                 image_channels=datasets.IMAGE_CHANNELS):
+        super().__init__(model, chars=chars, decoder=decoder, max_batch_size=max_batch_size, image_height=image_height,
+                         image_width=image_width, image_channels=image_channels)
+        if patch_width is None:
+            # Models with early exit heads (see the exit_layers argument of build_vit_str()) have a list of outputs
+            outputs = getattr(self.model, "outputs", None)
+            if not outputs or outputs[-1].shape[1] is None:
+                raise ValueError("The patch width can't be inferred from the model and should be passed explicitly")
+            patch_width = image_width // outputs[-1].shape[1]
+        if (image_width - overlap) % patch_width or not 0 <= overlap < image_width:
+            raise ValueError(f"The overlap should be less than the image width {image_width} and the distance between "
+                             f"windows should be a multiple of the patch width {patch_width}")
+        self.patch_width = patch_width
+        self.overlap = overlap
+        self.frames_count = image_width // patch_width
+
+        self._tile_line = tf.function(lambda image_data: self.tile(self.preprocess(image_data)),
+                                      input_signature=[tf.TensorSpec([], tf.string)])
+        self._predict = tf.function(self._predict_impl, input_signature=[
+            tf.TensorSpec([None, image_height, image_width, image_channels], tf.float32)])
+
+    def recognize(self, images):
+        """Recognizes text on images of text lines.
+
+        :param images: A list of encoded images (PNG, JPEG, BMP or GIF bytes).
+        :return: A list of recognized strings.
+        """
+        if not images:
+            return []
+        # Lines are decoded and tiled in parallel by a compiled function
+        lines = list(tf.data.Dataset.from_tensor_slices(tf.constant(images, dtype=tf.string)).map(
+            self._tile_line, num_parallel_calls=tf.data.experimental.AUTOTUNE))
+        windows = tf.concat([line_windows for line_windows, _ in lines], axis=0)
+        y_pred = tf.concat([self._predict(windows[i:i + self.max_batch_size])
+                            for i in range(0, windows.shape[0], self.max_batch_size)], axis=0)
+
+        lines_y_pred = []
+        first_window = 0
+        for _, starts in lines:
+            lines_y_pred.append(self.stitch(y_pred[first_window:first_window + len(starts)], starts))
+            first_window += len(starts)
+
+        # Lines are decoded as a single batch, where shorter lines are padded with zero frames
+        max_frames = max(line_y_pred.shape[0] for line_y_pred in lines_y_pred)
+        y_pred = tf.stack([tf.pad(line_y_pred, [[0, max_frames - line_y_pred.shape[0]], [0, 0]])
+                           for line_y_pred in lines_y_pred])
+        return [text.decode("UTF-8") for text in self.decode(y_pred).numpy()]
+
+    def preprocess(self, image_data):
+        """Decodes an image, resizes it to the model input height with preserved aspect ratio and rescales it.
+
+        The width is rounded so that it exceeds the model input width by a multiple of the patch width, images that
+        aren't wider than the model input are resized to the model input size.
+        """
+        image = tf.io.decode_image(image_data, channels=self.image_channels, expand_animations=False)
+        shape = tf.cast(tf.shape(image), tf.float64)
+        width = shape[1] * self.image_height / shape[0]
+        # tf.round() rounds half to even like round() in Python
+        extra_patches = tf.cast(tf.maximum(tf.round((width - self.image_width) / self.patch_width), 0), tf.int32)
+        image = tf.image.resize(image, [self.image_height, self.image_width + extra_patches * self.patch_width])
+        return image * datasets.IMAGE_SCALE + datasets.IMAGE_OFFSET
+
+    def tile(self, image):
+        """Cuts a preprocessed image of a line into overlapping windows.
+
+        :param image: A [height, width, channels] tensor returned by preprocess().
+        :return: A [windows, height, image_width, channels] tensor of windows and a [windows] int32 tensor of their
+            horizontal offsets.
+        """
+        width = tf.shape(image)[1]
+        step = self.image_width - self.overlap
+        # The last window is shifted to the end of the line, so it may overlap the previous one more than others.
+        # Windows of the line without its last column are the ones that start before the last window.
+        windows = tf.signal.frame(image[:, :-1], self.image_width, step, axis=1)
+        windows = tf.concat([windows, image[:, tf.newaxis, width - self.image_width:]], axis=1)
+        starts = tf.concat([tf.range(tf.shape(windows)[1] - 1) * step, [width - self.image_width]], axis=0)
+        return tf.transpose(windows, [1, 0, 2, 3]), starts
+
+    def stitch(self, y_pred, starts):
+        """Stitches per-frame probabilities of windows of a line into probabilities of the whole line.
+
+        :param y_pred: A [windows, frames, classes] tensor of probabilities.
+        :param starts: Horizontal offsets of windows returned by tile().
+        :return: A [line_frames, classes] tensor of probabilities.
+        """
+        first_frames = np.asarray(starts) // self.patch_width
+        line_frames = np.arange(first_frames[-1] + self.frames_count)
+        # Windows are sorted by their centers and consecutive centers are closer than the window width, so the
+        # window with the nearest center always covers a frame
+        centers = first_frames + self.frames_count / 2
+        windows = np.argmin(np.abs(line_frames[:, np.newaxis] + 0.5 - centers), axis=1)
+        return tf.gather_nd(y_pred, np.stack([windows, line_frames - first_frames[windows]], axis=1))
+
+    def _predict_impl(self, images):
+        y_pred = self.model(images, training=False)
+        # The final output of models with early exit heads is the last one
+        return y_pred[-1] if isinstance(y_pred, (list, tuple)) else y_pred
@@ -0,0 +1,69 @@
+"""Batched text recognition with a trained model."""
+import tensorflow as tf
+
+import datasets
+from vit.decoding import GreedyDecoder, labels_to_text
+
+
+class Recognizer:
+    """Recognizes text on encoded images with a trained model, running image decoding and resizing, the model and CTC
+    decoding as a single compiled function.
+
+    :param model: A trained model or a path to a saved model, that maps images to per-patch probabilities of labels
+        (the last label is the CTC blank one).
+    :param chars: Characters that correspond to decoded labels (excluding the blank label).
+    :param decoder: A decoder from vit.decoding with a decode(y_pred) method (if None, GreedyDecoder is used), e.g.
+        GreedyDecoder(label_folding=...) for case-insensitive recognition.
+    :param max_batch_size: Maximal number of images that are passed to the model at once.
+    :param image_height: Height of images expected by the model.
+    :param image_width: Width of images expected by the model.
+    :param image_channels: Number of channels of images expected by the model.
+    """
+
+    def __init__(self, model, chars=datasets.CHARS, decoder=None, max_batch_size=256,
+                 image_height=datasets.IMAGE_HEIGHT, image_width=datasets.IMAGE_WIDTH,
+                 image_channels=datasets.IMAGE_CHANNELS):
+        if isinstance(model, str) or hasattr(model, "__fspath__"):
+            model = tf.keras.models.load_model(model, compile=False)
+        self.model = model
+        self.chars = list(chars)
+        self.decoder = GreedyDecoder() if decoder is None else decoder
+        self.max_batch_size = max_batch_size
+        self.image_height = image_height
+        self.image_width = image_width
+        self.image_channels = image_channels
+
+        self._recognize_batch = tf.function(
+            self._recognize_batch_impl, input_signature=[tf.TensorSpec([None], tf.string)])
+
+    def recognize(self, images):
+        """Recognizes text on images.
+
+        :param images: A list of encoded images (PNG, JPEG, BMP or GIF bytes).
+        :return: A list of recognized strings.
+        """
+        texts = []
+        for i in range(0, len(images), self.max_batch_size):
+            batch = self._recognize_batch(tf.constant(images[i:i + self.max_batch_size], dtype=tf.string))
+            texts += [text.decode("UTF-8") for text in batch.numpy()]
+        return texts
+
+    def preprocess(self, image_data):
+        """Decodes an image and converts it to the model input format, in the same way as dataset loaders do."""
+        image = tf.io.decode_image(image_data, channels=self.image_channels, expand_animations=False)
+        image = tf.image.resize(image, [self.image_height, self.image_width])
+        return image * datasets.IMAGE_SCALE + datasets.IMAGE_OFFSET
+
+    def decode(self, y_pred):
+        """Converts per-patch label probabilities to strings.
+
+        :param y_pred: A [batch, patches, classes] tensor of probabilities.
+        :return: A [batch] tensor of UTF-8 strings.
+        """
+        return labels_to_text(self.decoder.decode(y_pred), self.chars)
+
+    def _recognize_batch_impl(self, image_data):
+        images = tf.map_fn(self.preprocess, image_data, fn_output_signature=tf.TensorSpec(
+            [self.image_height, self.image_width, self.image_channels], tf.float32))
+        y_pred = self.model(images, training=False)
+        return self.decode(y_pred)
@@ -0,0 +1,281 @@
+"""Asynchronous recognition server that groups single requests into micro-batches."""
+import asyncio
+import collections
+import concurrent.futures
+import json
+import time
+
+import numpy as np
+
+from vit.inference._cache import CachingRecognizer
+
+
+class ServerMetrics:
+    """Collects metrics of a recognition server.
+
+    :param max_latencies: Number of the most recent request latencies that are used to calculate percentiles.
+    """
+
+    def __init__(self, max_latencies=10000):
+        self.requests_count = 0
+        self.errors_count = 0
+        self.batch_sizes = collections.Counter()
+        self.latencies = collections.deque(maxlen=max_latencies)
+
+    def add_batch(self, batch_size):
+        self.batch_sizes[batch_size] += 1
+
+    def add_request(self, latency, failed=False):
+        self.requests_count += 1
+        self.errors_count += int(failed)
+        self.latencies.append(latency)
+
+    def to_dict(self, queue_depth):
+        """Returns metrics as a JSON-serializable dict (latencies are in milliseconds)."""
+        latencies = np.array(self.latencies) * 1000
+        return {
+            "queue_depth": queue_depth,
+            "requests": self.requests_count,
+            "errors": self.errors_count,
+            "batch_size_histogram": {str(size): count for size, count in sorted(self.batch_sizes.items())},
+            "latency_p50_ms": float(np.percentile(latencies, 50)) if len(latencies) else None,
+            "latency_p99_ms": float(np.percentile(latencies, 99)) if len(latencies) else None
+        }
+
+
+class RecognitionServer:
+    """Queues single recognition requests and runs them through a recognizer in micro-batches, which are formed when
+    either max_batch_size requests are queued or max_wait_time has passed since the first request of a batch.
+
+    The recognizer runs in a separate thread, so new requests are queued while a batch is processed. If it's a
+    CachingRecognizer, only cache misses of a batch reach the model and counters of the cache are added to metrics.
+
+    :param recognizer: An object with a recognize(images) method that maps a list of encoded images to a list of
+        strings (e.g. vit.inference.Recognizer).
+    :param max_batch_size: Maximal number of requests in a batch.
+    :param max_wait_time: Maximal time in seconds to wait for more requests after the first request of a batch.
+    :param max_request_bytes: Maximal size of an HTTP request body, larger requests are answered with 413 without
+        reading their bodies.
+    """
+
+    def __init__(self, recognizer, max_batch_size=64, max_wait_time=0.005, max_request_bytes=2 ** 24):
+        self.recognizer = recognizer
+        self.max_batch_size = max_batch_size
+        self.max_wait_time = max_wait_time
+        self.max_request_bytes = max_request_bytes
+        self.metrics = ServerMetrics()
+
+        self._queue = None
+        self._batching_task = None
+        self._executor = None
+
+    def start(self):
+        """Starts batching in the running event loop."""
+        if self._batching_task is None:
+            self._queue = asyncio.Queue()
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+            self._batching_task = asyncio.get_running_loop().create_task(self._batching_loop())
+
+    async def stop(self):
+        """Stops batching, requests that are still queued or are being processed are cancelled."""
+        if self._batching_task is not None:
+            self._batching_task.cancel()
+            try:
+                await self._batching_task
+            except asyncio.CancelledError:
+                pass
+            self._batching_task = None
+            while not self._queue.empty():
+                self._queue.get_nowait()[1].cancel()
+            # A batch that is being recognized isn't waited for, its requests are already cancelled
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def recognize(self, image_data):
+        """Recognizes text on a single encoded image.
+
+        :param image_data: Encoded image bytes.
+        :return: Recognized string.
+        """
+        self.start()
+        start_time = time.perf_counter()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((image_data, future))
+        try:
+            text = await future
+        except Exception:
+            self.metrics.add_request(time.perf_counter() - start_time, failed=True)
+            raise
+        self.metrics.add_request(time.perf_counter() - start_time)
+        return text
+
+    def get_metrics(self):
+        """Returns current server metrics as a dict."""
+        metrics = self.metrics.to_dict(self._queue.qsize() if self._queue is not None else 0)
+        if isinstance(self.recognizer, CachingRecognizer):
+            metrics["cache"] = self.recognizer.cache.stats()
+        return metrics
+
+    async def serve(self, host="127.0.0.1", port=8080, unix_path=None):
+        """Serves requests over HTTP until cancelled.
+
+        Endpoints are POST /recognize with an encoded image as a body, that returns {"text": ...}, and GET /metrics.
+
+        :param host: Host to listen on.
+        :param port: Port to listen on.
+        :param unix_path: Path of a Unix socket to listen on instead of host and port.
+        """
+        self.start()
+        if unix_path is not None:
+            server = await asyncio.start_unix_server(self.handle_connection, path=unix_path)
+        else:
+            server = await asyncio.start_server(self.handle_connection, host=host, port=port)
+        async with server:
+            await server.serve_forever()
+
+    async def handle_connection(self, reader, writer):
+        """Handles HTTP/1.1 requests of a single (possibly keep-alive) connection."""
+        try:
+            while True:
+                try:
+                    request = await read_http_request(reader, self.max_request_bytes)
+                except RequestTooLargeError as e:
+                    # The body isn't read, so the connection is closed too
+                    write_http_response(writer, 413, {"error": str(e)}, keep_alive=False)
+                    await writer.drain()
+                    break
+                except ValueError as e:
+                    # The rest of a malformed request can't be skipped reliably, so the connection is closed
+                    write_http_response(writer, 400, {"error": str(e)}, keep_alive=False)
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                status, response = await self._handle_request(method, path, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                write_http_response(writer, status, response, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_request(self, method, path, body):
+        if method == "POST" and path == "/recognize":
+            try:
+                return 200, {"text": await self.recognize(body)}
+            except Exception as e:
+                return 500, {"error": str(e)}
+        if method == "GET" and path == "/metrics":
+            return 200, self.get_metrics()
+        return 404, {"error": f"Unknown endpoint {method} {path}"}
+
+    async def _batching_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = []
+            try:
+                await self._process_batch(loop, batch)
+            except asyncio.CancelledError:
+                # Requests that were taken from the queue would never be answered otherwise
+                for _, future in batch:
+                    future.cancel()
+                raise
+
+    async def _process_batch(self, loop, batch):
+        """Collects requests from the queue into batch (a list, so that the caller can cancel them) and resolves their
+        futures with recognition results."""
+        batch.append(await self._queue.get())
+        deadline = loop.time() + self.max_wait_time
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        self.metrics.add_batch(len(batch))
+        images, futures = zip(*batch)
+        results = await loop.run_in_executor(self._executor, self._recognize_batch, list(images))
+        for future, result in zip(futures, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def _recognize_batch(self, images):
+        """Recognizes a batch of images, returns a list of texts or exceptions of images that failed.
+
+        If the batch fails (e.g. an image can't be decoded), images are recognized one by one, so that a single bad
+        request doesn't fail other requests of its batch.
+        """
+        try:
+            return self.recognizer.recognize(images)
+        except Exception as e:
+            if len(images) == 1:
+                return [e]
+        results = []
+        for image in images:
+            try:
+                results += self.recognizer.recognize([image])
+            except Exception as e:
+                results.append(e)
+        return results
+
+
+class RequestTooLargeError(ValueError):
+    """Raised when the body of an HTTP request exceeds the maximal size."""
+
+
+async def read_http_request(reader, max_body_bytes=None):
+    """Reads a single HTTP request, returns None if the connection was closed before it.
+
+    :param max_body_bytes: Maximal size of the request body (None for no limit).
+    :raise RequestTooLargeError: If the body is larger than max_body_bytes.
+    :raise ValueError: If the request is malformed.
+    """
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    request_line_parts = request_line.decode("latin-1").split(" ", 2)
+    if len(request_line_parts) != 3:
+        raise ValueError(f"Malformed request line {request_line!r}")
+    method, path, _ = request_line_parts
+
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode("latin-1").strip()
+        if not line:
+            break
+        if ":" not in line:
+            raise ValueError(f"Malformed header {line!r}")
+        name, value = line.split(":", 1)
+        headers[name.strip().lower()] = value.strip()
+
+    content_length = int(headers.get("content-length", 0))
+    if content_length < 0:
+        raise ValueError(f"Negative content length {content_length}")
+    if max_body_bytes is not None and content_length > max_body_bytes:
+        raise RequestTooLargeError(f"Request body of {content_length} bytes exceeds the limit of {max_body_bytes}")
+    body = await reader.readexactly(content_length)
+    return method, path, headers, body
+
+
+def write_http_response(writer, status, response, keep_alive=True):
+    body = json.dumps(response).encode("UTF-8")
+    reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large",
+              500: "Internal Server Error"}[status]
+    writer.write(f"HTTP/1.1 {status} {reason}\r\n"
+                 f"Content-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n"
+                 f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + body)
@@ -0,0 +1,91 @@
+"""Conversion of trained models to TFLite with post-training quantization."""
+import numpy as np
+import tensorflow as tf
+
+import datasets
+
+try:
+    from ai_edge_litert.interpreter import Interpreter
+except ImportError:
+    Interpreter = tf.lite.Interpreter
+
+
+# Supported quantization modes: no quantization, int8 weights with float activations and int8 weights and activations
+QUANTIZATION_MODES = ("float32", "dynamic_range", "int8")
+
+
+def convert_to_tflite(model, quantization="float32", representative_dataset=None, representative_samples=500,
+                      image_height=datasets.IMAGE_HEIGHT, image_width=datasets.IMAGE_WIDTH,
+                      image_channels=datasets.IMAGE_CHANNELS):
+    """Converts a model to TFLite with a dynamic batch dimension.
+
+    With int8 quantization all operations are converted to int8 TFLite builtins, while inputs and outputs stay
+    float32, so the converted model accepts the same preprocessed images and produces the same probabilities as the
+    original one.
+
+    :param model: A model that maps images to per-patch probabilities of labels.
+    :param quantization: One of QUANTIZATION_MODES.
+    :param representative_dataset: A tf.data.Dataset of preprocessed images or (image, labels) pairs, that is used to
+        calibrate activation ranges (required for int8 quantization), e.g. a dataset returned by load_mjsynth().
+    :param representative_samples: Number of samples of representative_dataset to use for calibration.
+    :param image_height: Height of images expected by the model.
+    :param image_width: Width of images expected by the model.
+    :param image_channels: Number of channels of images expected by the model.
+    :return: Serialized TFLite model.
+    """
+    if quantization not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown quantization mode {quantization}, expected one of {QUANTIZATION_MODES}")
+    if quantization == "int8" and representative_dataset is None:
+        raise ValueError("int8 quantization requires a representative dataset")
+
+    model_fn = tf.function(lambda images: model(images, training=False))
+    concrete_fn = model_fn.get_concrete_function(
+        tf.TensorSpec([None, image_height, image_width, image_channels], tf.float32))
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([concrete_fn], model)
+
+    if quantization != "float32":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == "int8":
+        def generate_representative_samples():
+            for sample in representative_dataset.take(representative_samples):
+                image = sample[0] if isinstance(sample, tuple) else sample
+                yield [tf.cast(image[tf.newaxis], tf.float32)]
+
+        converter.representative_dataset = generate_representative_samples
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+
+    return converter.convert()
+
+
+class TFLiteModel:
+    """Runs a TFLite model on batches of images, so that it could be used in place of the original model outside of
+    TF graphs.
+
+    :param model_content: Serialized TFLite model or a path to a .tflite file.
+    :param num_threads: Number of threads used by the interpreter (None for the default).
+    """
+
+    def __init__(self, model_content, num_threads=None):
+        if isinstance(model_content, bytes):
+            self.interpreter = Interpreter(model_content=model_content, num_threads=num_threads)
+        else:
+            self.interpreter = Interpreter(model_path=str(model_content), num_threads=num_threads)
+        self._input_index = self.interpreter.get_input_details()[0]["index"]
+        self._output_index = self.interpreter.get_output_details()[0]["index"]
+        self._batch_size = None
+
+    def __call__(self, images):
+        """Predicts per-patch probabilities of labels.
+
+        :param images: A [batch, height, width, channels] array of preprocessed images.
+        :return: A [batch, patches, classes] array of probabilities.
+        """
+        images = np.asarray(images, dtype=np.float32)
+        if images.shape[0] != self._batch_size:
+            self.interpreter.resize_tensor_input(self._input_index, images.shape)
+            self.interpreter.allocate_tensors()
+            self._batch_size = images.shape[0]
+
+        self.interpreter.set_tensor(self._input_index, images)
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self._output_index)
@@ -0,0 +1,111 @@
+"""Exports a trained model to TFLite with post-training quantization and evaluates every variant on IIIT5K.
+
+The model is either rebuilt with build_vit_str() from weights saved by model.save_weights() (including weights saved by
+previous versions of the layers, e.g. notebooks/saved_weights/mjsynth.h5), or loaded from a saved model. Saved models
+written by previous versions of the layers contain ops that have no TFLite builtins (e.g. ExtractImagePatches), so
+they can't be converted and should be exported from their weights instead.
+
+Int8 activation ranges are calibrated on images from the MJSynth train dataset. Accuracy is case-insensitive, as
+IIIT5K labels consist of digits and uppercase letters only. Latency is measured for single images.
+
+Usage: python -m vit.inference.export_tflite (--weights notebooks/saved_weights/mjsynth.h5 | --model PATH)
+    --mjsynth PATH --iiit5k PATH [--output-dir exported] [--modes float32,dynamic_range,int8]
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+
+import datasets
+import vit
+from vit.decoding import GreedyDecoder, label_folding_matrix
+from vit.inference import convert_to_tflite, evaluate_accuracy, TFLiteModel, QUANTIZATION_MODES
+
+
+def measure_latency(predict, images, warmup=5):
+    """Measures median latency of single image predictions in milliseconds."""
+    for image in images[:warmup]:
+        predict(image[np.newaxis])
+
+    latencies = []
+    for image in images:
+        start_time = time.perf_counter()
+        predict(image[np.newaxis])
+        latencies.append(time.perf_counter() - start_time)
+    return float(np.median(latencies)) * 1000
+
+
+def load_model(model_path=None, weights_path=None, **model_args):
+    """Loads a saved model or builds a model with build_vit_str() and loads its weights.
+
+    :param model_path: Path to a saved model.
+    :param weights_path: Path to an HDF5 file with weights (used if model_path is None).
+    :param model_args: Arguments of build_vit_str() besides the number of classes and the image shape, that should
+        match the architecture of the model that saved the weights.
+    :return: The model.
+    """
+    if model_path is not None:
+        return tf.keras.models.load_model(model_path, compile=False)
+    model = vit.models.build_vit_str(len(datasets.CHARS) + 1, datasets.IMAGE_HEIGHT, datasets.IMAGE_CHANNELS,
+                                     image_width=datasets.IMAGE_WIDTH, **model_args)
+    vit.models.load_legacy_weights(model, weights_path)
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    model_group = parser.add_mutually_exclusive_group(required=True)
+    model_group.add_argument("--weights", help="Path to HDF5 weights of a model with the default build_vit_str() "
+                                               "architecture")
+    model_group.add_argument("--model", help="Path to a saved model written by the current version of the layers")
+    parser.add_argument("--mjsynth", required=True, help="Path to the MJSynth dataset for int8 calibration")
+    parser.add_argument("--mjsynth-cache", help="Path to MJSynth shards written by compile_mjsynth()")
+    parser.add_argument("--iiit5k", required=True, help="Path to the IIIT5K dataset for evaluation")
+    parser.add_argument("--output-dir", default="exported")
+    parser.add_argument("--modes", default=",".join(QUANTIZATION_MODES), help="Comma-separated quantization modes")
+    parser.add_argument("--representative-samples", type=int, default=500)
+    parser.add_argument("--eval-samples", type=int, help="Maximal number of IIIT5K test samples to evaluate")
+    parser.add_argument("--latency-samples", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--threads", type=int, help="Number of TFLite interpreter threads")
+    args = parser.parse_args()
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    model = load_model(args.model, args.weights)
+    representative_ds = datasets.load_mjsynth(args.mjsynth, args.mjsynth_cache)[0].shuffle(10000, seed=42)
+    test_ds = datasets.load_iiit5k(args.iiit5k)[1]
+    latency_images = np.stack([image.numpy() for image, _ in test_ds.take(args.latency_samples)])
+
+    model_fn = tf.function(lambda images: model(images, training=False), reduce_retracing=True)
+    if args.model is not None:
+        model_size = sum(path.stat().st_size for path in Path(args.model).rglob("*") if path.is_file())
+    else:
+        model_size = Path(args.weights).stat().st_size
+    variants = {"keras": (lambda images: model_fn(images).numpy(), model_size)}
+    for mode in args.modes.split(","):
+        model_content = convert_to_tflite(model, mode, representative_ds, args.representative_samples)
+        model_path = output_dir / f"model_{mode}.tflite"
+        model_path.write_bytes(model_content)
+        variants[mode] = (TFLiteModel(model_content, args.threads), len(model_content))
+
+    # IIIT5K labels are case-insensitive
+    decoder = GreedyDecoder(label_folding=label_folding_matrix(datasets.CHARS, datasets.IIIT5K_CHARS))
+    report = {}
+    for name, (predict, size) in variants.items():
+        report[name] = {"size_mb": size / 2**20,
+                        "latency_ms": measure_latency(predict, latency_images),
+                        "accuracy": evaluate_accuracy(lambda images: predict(images.numpy()), test_ds, decoder,
+                                                      args.batch_size, args.eval_samples)}
+        print(f"{name:>14}: size {report[name]['size_mb']:.2f} MB, latency {report[name]['latency_ms']:.2f} ms, "
+              f"accuracy {report[name]['accuracy']:.2%}")
+
+    (output_dir / "report.json").write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
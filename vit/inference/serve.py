@@ -0,0 +1,52 @@
+"""Runs a micro-batching HTTP recognition server around a saved model.
+
+Usage: python -m vit.inference.serve --model notebooks/saved_model [--port 8080 | --unix-socket PATH]
+    [--max-request-bytes N] [--cache-entries N] [--cache-memory-mb N] [--cache-path cache.sqlite]
+    [--cache-key bytes|perceptual]
+
+Recognition results are cached if any of the --cache-* options is passed, the default limit of RecognitionCache is used
+if neither --cache-entries nor --cache-memory-mb is passed.
+"""
+import argparse
+import asyncio
+
+from vit.inference import CachingRecognizer, Recognizer, RecognitionCache, RecognitionServer, KEY_TYPES
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", required=True, help="Path to a saved model")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--unix-socket", help="Listen on a Unix socket instead of a TCP port")
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0,
+                        help="Maximal time to wait for more requests after the first request of a batch")
+    parser.add_argument("--max-request-bytes", type=int, default=2 ** 24,
+                        help="Maximal size of a request body, larger requests are answered with 413")
+    parser.add_argument("--cache-entries", type=int, help="Maximal number of cached recognition results")
+    parser.add_argument("--cache-memory-mb", type=float, help="Maximal memory of cached recognition results")
+    parser.add_argument("--cache-path", help="An SQLite file where cached recognition results are persisted")
+    parser.add_argument("--cache-key", choices=KEY_TYPES,
+                        help="Key cached results by a hash of image bytes (the default) or by a perceptual hash")
+    args = parser.parse_args()
+
+    recognizer = Recognizer(args.model, max_batch_size=args.max_batch_size)
+    cache_args = (args.cache_entries, args.cache_memory_mb, args.cache_path, args.cache_key)
+    if any(arg is not None for arg in cache_args):
+        if args.cache_entries is None and args.cache_memory_mb is None:
+            cache = RecognitionCache(path=args.cache_path)
+        else:
+            max_memory_bytes = int(args.cache_memory_mb * 2 ** 20) if args.cache_memory_mb is not None else None
+            cache = RecognitionCache(args.cache_entries, max_memory_bytes, args.cache_path)
+        recognizer = CachingRecognizer(recognizer, cache, key_type=args.cache_key or "bytes")
+    server = RecognitionServer(recognizer, max_batch_size=args.max_batch_size, max_wait_time=args.max_wait_ms / 1000,
+                               max_request_bytes=args.max_request_bytes)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix_socket))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
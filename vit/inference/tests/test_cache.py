@@ -0,0 +1,122 @@
+"""Tests for RecognitionCache and CachingRecognizer."""
+import asyncio
+
+import numpy as np
+import pytest
+import tensorflow as tf
+
+from vit.inference import CachingRecognizer, RecognitionCache, RecognitionServer, perceptual_hash
+
+
+class EchoRecognizer:
+    """A recognizer stub that returns decoded input bytes and records recognized images."""
+
+    def __init__(self):
+        self.recognized = []
+
+    def recognize(self, images):
+        self.recognized.append(list(images))
+        return [image.decode() for image in images]
+
+
+def test_get_many__returns_put_texts_and_counts_hits():
+    cache = RecognitionCache()
+    cache.put_many(["a", "b"], ["text a", "text b"])
+
+    texts = cache.get_many(["a", "c", "b", "a"])
+
+    assert texts == ["text a", None, "text b", "text a"]
+    assert cache.stats()["hits"] == 3 and cache.stats()["misses"] == 1
+    assert cache.stats()["hit_rate"] == 0.75
+
+
+def test_put_many__least_recently_used_entries_are_evicted():
+    cache = RecognitionCache(max_entries=2)
+    cache.put_many(["a", "b"], ["1", "2"])
+    cache.get_many(["a"])
+    cache.put_many(["c"], ["3"])
+
+    assert cache.get_many(["a", "b", "c"]) == ["1", None, "3"]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_put_many__memory_limit_is_respected():
+    cache = RecognitionCache(max_entries=None, max_memory_bytes=1000)
+    cache.put_many([str(i) for i in range(100)], ["text"] * 100)
+
+    assert 0 < len(cache) < 100
+    assert cache.memory_bytes <= 1000
+    assert cache.stats()["evictions"] == 100 - len(cache)
+
+
+def test_get_many__evicted_entries_are_read_from_disk(tmp_path):
+    cache = RecognitionCache(max_entries=1, path=tmp_path / "cache.sqlite")
+    cache.put_many(["a", "b"], ["1", "2"])
+    cache.close()
+    reopened_cache = RecognitionCache(max_entries=1, path=tmp_path / "cache.sqlite")
+
+    assert cache.get_many(["a", "b"]) == [None, "2"]
+    assert reopened_cache.get_many(["a", "b", "c"]) == ["1", "2", None]
+    assert reopened_cache.stats()["disk_hits"] == 2
+
+
+def test_recognize__only_missing_distinct_images_are_recognized():
+    recognizer = EchoRecognizer()
+    caching_recognizer = CachingRecognizer(recognizer)
+
+    first_texts = caching_recognizer.recognize([b"a", b"b", b"a"])
+    second_texts = caching_recognizer.recognize([b"b", b"c", b"a"])
+
+    assert first_texts == ["a", "b", "a"]
+    assert second_texts == ["b", "c", "a"]
+    assert recognizer.recognized == [[b"a", b"b"], [b"c"]]
+
+
+def test_recognize__perceptual_key_matches_reencoded_images():
+    class PreprocessingRecognizer(EchoRecognizer):
+        def recognize(self, images):
+            self.recognized.append(list(images))
+            return ["text"] * len(images)
+
+        def preprocess(self, image_data):
+            return tf.io.decode_image(image_data, channels=1, expand_animations=False)
+
+    image = np.zeros([32, 100, 1], dtype=np.uint8)
+    image[8:24, 10:40] = 255
+    image[8:24, 60:90] = 255
+    png_image = tf.io.encode_png(image).numpy()
+    jpeg_image = tf.io.encode_jpeg(image, quality=90).numpy()
+    recognizer = PreprocessingRecognizer()
+    caching_recognizer = CachingRecognizer(recognizer, key_type="perceptual")
+
+    caching_recognizer.recognize([png_image])
+    caching_recognizer.recognize([jpeg_image])
+
+    assert caching_recognizer.key(png_image) == caching_recognizer.key(jpeg_image)
+    assert len(recognizer.recognized) == 1
+
+
+def test_init__unknown_key_type_raises():
+    with pytest.raises(ValueError):
+        CachingRecognizer(EchoRecognizer(), key_type="unknown")
+
+
+def test_perceptual_hash__differs_for_different_images():
+    gradient = np.linspace(0, 1, 100, dtype=np.float32)
+    image = np.tile(gradient[np.newaxis, :, np.newaxis], [32, 1, 1])
+
+    assert perceptual_hash(image) == perceptual_hash(image * 0.5 + 0.1)
+    assert perceptual_hash(image) != perceptual_hash(image[:, ::-1])
+
+
+def test_get_metrics__server_reports_cache_counters():
+    server = RecognitionServer(CachingRecognizer(EchoRecognizer()), max_batch_size=4, max_wait_time=0.01)
+
+    async def run():
+        texts = await asyncio.gather(*(server.recognize(b"same") for _ in range(3)))
+        await server.stop()
+        return texts
+
+    assert asyncio.run(run()) == ["same"] * 3
+    assert server.get_metrics()["cache"]["misses"] >= 1
+    assert server.get_metrics()["cache"]["entries"] == 1
@@ -0,0 +1,74 @@
+"""Tests for the EarlyExitModel class."""
+import numpy as np
+import tensorflow as tf
+
+import pytest
+
+from numpy.testing import assert_allclose, assert_array_equal
+
+from vit.inference import EarlyExitModel
+from vit.models import build_vit_str, load_vit_str
+
+
+@pytest.fixture(scope="module")
+def model():
+    return build_vit_str(num_classes=5, image_height=32, image_channels=1, image_width=100, num_layers=3,
+                         model_dim=16, num_heads=2, mlp_dim=32, dropout=0.0, exit_layers=[1, 2])
+
+
+def confidence(probs):
+    top_probs = np.sort(probs, axis=-1)[:, :, -2:]
+    return (top_probs[:, :, 1] - top_probs[:, :, 0]).min(axis=1)
+
+
+def test_predict__samples_exit_at_the_first_confident_head(model):
+    images = tf.random.uniform([16, 32, 100, 1], -1, 1, seed=1)
+    head_outputs = [output.numpy() for output in model(images)]
+    # A threshold that some, but not all samples pass at the first exit
+    threshold = float(np.median(confidence(head_outputs[0])))
+
+    y_pred, exit_layers = EarlyExitModel(model).predict(images, threshold)
+
+    expected_exit_layers = np.full(16, 3)
+    expected_exit_layers[confidence(head_outputs[1]) >= threshold] = 2
+    expected_exit_layers[confidence(head_outputs[0]) >= threshold] = 1
+    assert_array_equal(exit_layers, expected_exit_layers)
+    for i, exit_layer in enumerate(expected_exit_layers):
+        assert_allclose(y_pred[i], head_outputs[exit_layer - 1][i], atol=1E-5)
+
+
+@pytest.mark.parametrize("threshold,output_index", ((0.0, 0), (1.1, -1)))
+def test_call__threshold_extremes(model, threshold, output_index):
+    images = tf.random.uniform([4, 32, 100, 1], -1, 1)
+
+    y_pred = EarlyExitModel(model, threshold)(images)
+
+    assert_allclose(y_pred, model(images)[output_index], atol=1E-5)
+
+
+@pytest.mark.parametrize("threshold,output_index", ((0.0, 0), (1.1, -1)))
+def test_call__global_tokens_are_added_and_removed(threshold, output_index):
+    model = build_vit_str(num_classes=5, image_height=32, image_channels=1, image_width=100, num_layers=3,
+                          model_dim=16, num_heads=2, mlp_dim=32, dropout=0.0, exit_layers=[1], attention_window=3,
+                          global_tokens=2)
+    images = tf.random.uniform([4, 32, 100, 1], -1, 1)
+
+    y_pred = EarlyExitModel(model, threshold)(images)
+
+    assert_allclose(y_pred, model(images)[output_index], atol=1E-5)
+
+
+def test_init__saved_model_is_loaded_with_vit_layers(model, tmp_path):
+    images = tf.random.uniform([4, 32, 100, 1], -1, 1)
+    model.save((tmp_path / "model").as_posix())
+
+    y_pred = EarlyExitModel(load_vit_str((tmp_path / "model").as_posix()), 1.1)(images)
+
+    assert_allclose(y_pred, model(images)[-1], atol=1E-5)
+
+
+def test_init__model_without_encoder_raises_error():
+    model = tf.keras.Sequential([tf.keras.Input([32, 100, 1]), tf.keras.layers.Dense(5)])
+
+    with pytest.raises(ValueError):
+        EarlyExitModel(model)
@@ -0,0 +1,92 @@
+"""Tests for the LineRecognizer class."""
+import numpy as np
+import pytest
+import tensorflow as tf
+
+import datasets
+from vit.inference import EarlyExitModel, LineRecognizer, Recognizer
+from vit.models import build_vit_str
+
+
+CHARS = list("abc")
+BLANK = len(CHARS)
+PATCH_WIDTH = 4
+# Patches of test images have a single color, that encodes the label of the patch
+LABEL_COLOR = 80
+
+
+class PatchColorModel:
+    """A model stub that predicts the label encoded by the color of each patch."""
+
+    outputs = [tf.TensorSpec([None, datasets.IMAGE_WIDTH // PATCH_WIDTH, len(CHARS) + 1])]
+
+    def __call__(self, images, training=None):
+        colors = (images[:, 0, ::PATCH_WIDTH, 0] - datasets.IMAGE_OFFSET) / datasets.IMAGE_SCALE
+        return tf.one_hot(tf.cast(tf.round(colors / LABEL_COLOR), tf.int32), len(CHARS) + 1)
+
+
+def encode_line(patch_labels):
+    image = np.repeat(np.array(patch_labels, dtype=np.uint8) * LABEL_COLOR, PATCH_WIDTH)
+    image = np.broadcast_to(image[np.newaxis, :, np.newaxis], [datasets.IMAGE_HEIGHT, len(image), 1])
+    return tf.io.encode_png(image).numpy()
+
+
+def greedy_decode(patch_labels):
+    text = []
+    for i, label in enumerate(patch_labels):
+        if label != BLANK and (i == 0 or label != patch_labels[i - 1]):
+            text.append(CHARS[label])
+    return "".join(text)
+
+
+@pytest.mark.parametrize("patches_count", [25, 26, 40, 64, 97, 250])
+@pytest.mark.parametrize("overlap", [0, 40, 60])
+def test_recognize__stitched_frames_match_frames_of_the_whole_line(patches_count, overlap):
+    rng = np.random.default_rng(patches_count)
+    lines = [rng.integers(0, len(CHARS) + 1, size=patches_count + i) for i in range(3)]
+    recognizer = LineRecognizer(PatchColorModel(), chars=CHARS, overlap=overlap, max_batch_size=4)
+
+    texts = recognizer.recognize([encode_line(labels) for labels in lines])
+
+    assert texts == [greedy_decode(labels) for labels in lines]
+
+
+def test_recognize__short_lines_are_recognized_like_with_recognizer():
+    model = build_vit_str(num_classes=len(CHARS) + 1, image_height=32, image_channels=1, image_width=100,
+                          patch_width=PATCH_WIDTH, num_layers=1, model_dim=16, num_heads=2, mlp_dim=32)
+    images = [tf.io.encode_png(np.random.randint(0, 255, size=[32, width, 1], dtype=np.uint8)).numpy()
+              for width in (40, 100)]
+
+    texts = LineRecognizer(model, chars=CHARS).recognize(images)
+
+    assert texts == Recognizer(model, chars=CHARS).recognize(images)
+
+
+def test_recognize__final_output_of_model_with_exit_layers_is_used():
+    model = build_vit_str(num_classes=len(CHARS) + 1, image_height=32, image_channels=1, image_width=100,
+                          patch_width=PATCH_WIDTH, num_layers=2, model_dim=16, num_heads=2, mlp_dim=32, dropout=0.0,
+                          exit_layers=[1])
+    images = [tf.io.encode_png(np.random.randint(0, 255, size=[32, width, 1], dtype=np.uint8)).numpy()
+              for width in (40, 100, 260)]
+
+    recognizer = LineRecognizer(model, chars=CHARS)
+    texts = recognizer.recognize(images)
+
+    assert recognizer.patch_width == PATCH_WIDTH
+    # Early exits are disabled by a threshold above 1, so only the final output is used
+    assert texts == LineRecognizer(EarlyExitModel(model, threshold=2.0), chars=CHARS,
+                                   patch_width=PATCH_WIDTH).recognize(images)
+
+
+def test_init__patch_width_of_model_without_outputs_should_be_passed():
+    with pytest.raises(ValueError):
+        LineRecognizer(lambda images, training=None: images, chars=CHARS)
+
+
+def test_recognize__empty_list_of_images():
+    assert LineRecognizer(PatchColorModel(), chars=CHARS).recognize([]) == []
+
+
+def test_init__overlap_should_be_aligned_to_patches():
+    with pytest.raises(ValueError):
+        LineRecognizer(PatchColorModel(), chars=CHARS, overlap=42)
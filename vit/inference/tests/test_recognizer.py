@@ -0,0 +1,46 @@
+"""Tests for the Recognizer class."""
+import numpy as np
+import tensorflow as tf
+
+from vit.inference import Recognizer
+from vit.models import build_vit_str
+
+
+CHARS = list("abc")
+BLANK = len(CHARS)
+
+
+def encode_images(count, width=100):
+    return [tf.io.encode_png(np.random.randint(0, 255, size=[32, width, 1], dtype=np.uint8)).numpy()
+            for _ in range(count)]
+
+
+class FixedOutputModel:
+    """A model stub that returns predefined labels for every image."""
+
+    def __init__(self, labels):
+        self.y_pred = tf.one_hot(labels, len(CHARS) + 1)
+
+    def __call__(self, images, training=None):
+        return tf.repeat(self.y_pred[tf.newaxis], tf.shape(images)[0], axis=0)
+
+
+def test_recognize__greedy_decoding_is_correct():
+    model = FixedOutputModel([BLANK, 0, 0, BLANK, 0, 1, BLANK, BLANK, 2, 2])
+    recognizer = Recognizer(model, chars=CHARS)
+
+    texts = recognizer.recognize(encode_images(3, width=120))
+
+    assert texts == ["aabc"] * 3
+
+
+def test_recognize__result_does_not_depend_on_batch_size():
+    model = build_vit_str(num_classes=len(CHARS) + 1, image_height=32, image_channels=1, image_width=100,
+                          num_layers=1, model_dim=16, num_heads=2, mlp_dim=32)
+    images = encode_images(7)
+
+    texts = Recognizer(model, chars=CHARS, max_batch_size=3).recognize(images)
+    single_batch_texts = Recognizer(model, chars=CHARS, max_batch_size=16).recognize(images)
+
+    assert len(texts) == len(images)
+    assert texts == single_batch_texts
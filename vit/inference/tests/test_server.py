@@ -0,0 +1,160 @@
+"""Tests for the RecognitionServer class."""
+import asyncio
+import json
+import threading
+
+import pytest
+
+from vit.inference import RecognitionServer
+
+
+class EchoRecognizer:
+    """A recognizer stub that returns decoded input bytes and records sizes of batches."""
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def recognize(self, images):
+        self.batch_sizes.append(len(images))
+        return [image.decode() for image in images]
+
+
+def test_recognize__requests_are_batched():
+    recognizer = EchoRecognizer()
+    server = RecognitionServer(recognizer, max_batch_size=4, max_wait_time=0.05)
+
+    async def run():
+        texts = await asyncio.gather(*(server.recognize(str(i).encode()) for i in range(10)))
+        await server.stop()
+        return texts
+
+    texts = asyncio.run(run())
+
+    assert texts == [str(i) for i in range(10)]
+    assert max(recognizer.batch_sizes) == 4 and sum(recognizer.batch_sizes) == 10
+    assert server.get_metrics()["requests"] == 10
+    assert sum(server.get_metrics()["batch_size_histogram"].values()) == len(recognizer.batch_sizes)
+
+
+def test_handle_connection__http_requests():
+    server = RecognitionServer(EchoRecognizer(), max_batch_size=4, max_wait_time=0.001)
+
+    async def request(reader, writer, method, path, body=b""):
+        writer.write(f"{method} {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+        await writer.drain()
+        status = int((await reader.readline()).split(b" ")[1])
+        headers = dict(line.decode().strip().lower().split(": ", 1)
+                       for line in iter_lines(await reader.readuntil(b"\r\n\r\n")))
+        return status, json.loads(await reader.readexactly(int(headers["content-length"])))
+
+    def iter_lines(data):
+        return [line for line in data.split(b"\r\n") if line]
+
+    async def run():
+        tcp_server = await asyncio.start_server(server.handle_connection, host="127.0.0.1", port=0)
+        port = tcp_server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        responses = [await request(reader, writer, "POST", "/recognize", b"hello"),
+                     await request(reader, writer, "GET", "/metrics"),
+                     await request(reader, writer, "GET", "/unknown")]
+        writer.close()
+        tcp_server.close()
+        await server.stop()
+        return responses
+
+    recognized, metrics, unknown = asyncio.run(run())
+
+    assert recognized == (200, {"text": "hello"})
+    assert metrics[0] == 200 and metrics[1]["requests"] == 1
+    assert unknown[0] == 404
+
+
+def test_recognize__failed_image_doesnt_fail_its_batch():
+    class FailingRecognizer(EchoRecognizer):
+        def recognize(self, images):
+            if b"bad" in images:
+                raise ValueError("Can't decode an image")
+            return super().recognize(images)
+
+    server = RecognitionServer(FailingRecognizer(), max_batch_size=4, max_wait_time=0.05)
+
+    async def run():
+        results = await asyncio.gather(*(server.recognize(image) for image in (b"a", b"bad", b"b")),
+                                       return_exceptions=True)
+        await server.stop()
+        return results
+
+    texts = asyncio.run(run())
+
+    assert texts[0] == "a" and texts[2] == "b"
+    assert isinstance(texts[1], ValueError)
+    assert server.get_metrics()["errors"] == 1
+
+
+@pytest.mark.parametrize("request_data", (b"garbage\r\n\r\n",
+                                          b"POST /recognize HTTP/1.1\r\nno colon\r\n\r\n",
+                                          b"POST /recognize HTTP/1.1\r\nContent-Length: many\r\n\r\n"))
+def test_handle_connection__malformed_requests(request_data):
+    server = RecognitionServer(EchoRecognizer())
+
+    async def run():
+        tcp_server = await asyncio.start_server(server.handle_connection, host="127.0.0.1", port=0)
+        port = tcp_server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(request_data)
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        tcp_server.close()
+        await server.stop()
+        return response
+
+    response = asyncio.run(run())
+
+    assert response.startswith(b"HTTP/1.1 400 Bad Request\r\n")
+    assert b"Connection: close" in response
+
+
+def test_handle_connection__too_large_requests():
+    server = RecognitionServer(EchoRecognizer(), max_request_bytes=4)
+
+    async def run():
+        tcp_server = await asyncio.start_server(server.handle_connection, host="127.0.0.1", port=0)
+        port = tcp_server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        # The body is never sent, so the server would wait for it forever if it tried to read it
+        writer.write(b"POST /recognize HTTP/1.1\r\nContent-Length: 5\r\n\r\n")
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), 5)
+        writer.close()
+        tcp_server.close()
+        await server.stop()
+        return response
+
+    response = asyncio.run(run())
+
+    assert response.startswith(b"HTTP/1.1 413 Payload Too Large\r\n")
+    assert b"Connection: close" in response
+
+
+def test_stop__requests_of_a_batch_in_progress_are_cancelled():
+    started, released = threading.Event(), threading.Event()
+
+    class BlockingRecognizer(EchoRecognizer):
+        def recognize(self, images):
+            started.set()
+            released.wait()
+            return super().recognize(images)
+
+    server = RecognitionServer(BlockingRecognizer(), max_batch_size=4, max_wait_time=0.001)
+
+    async def run():
+        request = asyncio.ensure_future(server.recognize(b"a"))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait)
+        await server.stop()
+        released.set()
+        return await asyncio.gather(request, return_exceptions=True)
+
+    results = asyncio.run(asyncio.wait_for(run(), 10))
+
+    assert isinstance(results[0], asyncio.CancelledError)
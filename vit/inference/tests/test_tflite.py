@@ -0,0 +1,53 @@
+"""Tests for TFLite conversion."""
+import numpy as np
+import tensorflow as tf
+
+import pytest
+
+import datasets
+from vit.inference import convert_to_tflite, TFLiteModel
+from vit.inference.export_tflite import load_model
+from vit.models import build_vit_str
+
+
+IMAGE_SHAPE = [32, 100, 1]
+
+
+@pytest.fixture(scope="module")
+def model():
+    return build_vit_str(num_classes=5, image_height=32, image_channels=1, image_width=100, num_layers=1,
+                         model_dim=32, num_heads=2, mlp_dim=64)
+
+
+@pytest.mark.parametrize("quantization,tolerance", (("float32", 1E-5), ("dynamic_range", 0.05), ("int8", 0.2)))
+def test_convert_to_tflite__outputs_are_close_to_the_original_model(model, quantization, tolerance):
+    images = np.random.uniform(-1, 1, size=[16] + IMAGE_SHAPE).astype(np.float32)
+    representative_ds = tf.data.Dataset.from_tensor_slices((images, tf.zeros([16, 3], tf.int32)))
+
+    tflite_model = TFLiteModel(convert_to_tflite(model, quantization, representative_ds, image_height=32,
+                                                 image_width=100, image_channels=1))
+
+    # Batch size changes between calls
+    for batch in (images[:3], images[3:]):
+        outputs = tflite_model(batch)
+        assert outputs.shape == (len(batch), 25, 5)
+        assert np.abs(outputs - model(batch).numpy()).mean() < tolerance
+
+
+def test_convert_to_tflite__int8_requires_representative_dataset(model):
+    with pytest.raises(ValueError):
+        convert_to_tflite(model, "int8")
+
+
+def test_load_model__model_rebuilt_from_weights_is_converted(tmp_path):
+    model_args = {"num_layers": 1, "model_dim": 32, "num_heads": 2, "mlp_dim": 64}
+    trained_model = build_vit_str(len(datasets.CHARS) + 1, datasets.IMAGE_HEIGHT, datasets.IMAGE_CHANNELS,
+                                  image_width=datasets.IMAGE_WIDTH, **model_args)
+    trained_model.save_weights((tmp_path / "weights.h5").as_posix())
+    images = np.random.uniform(-1, 1, size=[2, datasets.IMAGE_HEIGHT, datasets.IMAGE_WIDTH,
+                                            datasets.IMAGE_CHANNELS]).astype(np.float32)
+
+    model = load_model(weights_path=tmp_path / "weights.h5", **model_args)
+    tflite_model = TFLiteModel(convert_to_tflite(model))
+
+    assert np.abs(tflite_model(images) - trained_model(images).numpy()).max() < 1E-5
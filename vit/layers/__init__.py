@@ -3,3 +3,5 @@ from ._horizontal_patching import HorizontalPatching
 from ._positional_encoding import PositionalEncoding
 from ._multi_head_attention import MultiHeadAttention
 from ._transformer_encoder import TransformerEncoder
+from ._apply_mask import ApplyMask
+from ._seeded_dropout import SeededDropout
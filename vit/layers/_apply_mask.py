@@ -0,0 +1,28 @@
+"""Mask application layer."""
+import tensorflow as tf
+
+from vit.profiling import trace
+
+
+class ApplyMask(tf.keras.layers.Layer):
+    """Sets masked positions of its inputs to zeros and stops propagation of the mask.
+
+    Keras uses masks of model outputs as per-position sample weights of losses and metrics, which doesn't fit CTC, where
+    a loss is calculated per sequence. Instead, this layer carries the mask in values: positions of output probabilities
+    that are all zeros are treated as padding by CTCLoss, CTCAccuracy and decoders.
+
+    :param name: String name of the layer.
+    """
+
+    def __init__(self, name=None, **kwargs):
+        super().__init__(name=name, **kwargs)
+        self.supports_masking = True
+
+    def call(self, inputs, mask=None):
+        with trace("apply_mask"):
+            if mask is None:
+                return inputs
+            return inputs * tf.cast(mask, inputs.dtype)[:, :, tf.newaxis]
+
+    def compute_mask(self, inputs, mask=None):
+        return None
@@ -1,24 +1,56 @@
 """Horizontal image patching layer."""
 import tensorflow as tf
 
+from vit.profiling import trace
+
 
 class HorizontalPatching(tf.keras.layers.Layer):
     """Horizontally splits an image onto flattened patches.
 
+    Since patches span the whole image height, they are extracted with reshaping and transposition, which (unlike
+    tf.image.extract_patches()) is supported by TFLite. Columns that don't fill a whole patch are dropped.
+
     :param patch_width: Width of produced patches (before flattening).
+    :param image_height: Height of input images.
+    :param image_channels: Number of channels of input images.
+    :param padding_value: A value of pixels that were used to pad images to the same width (e.g.
+        datasets.IMAGE_PADDING_VALUE). If not None, the layer produces a mask of patches that contain any pixels that
+        are not padding, which is propagated to the following layers.
     :param name: String name of the layer.
     """
 
-    def __init__(self, patch_width, image_height, image_channels, name=None):
-        super().__init__(name=name)
+    def __init__(self, patch_width, image_height, image_channels, padding_value=None, name=None, **kwargs):
+        super().__init__(name=name, **kwargs)
         self.patch_width = patch_width
         self.image_height = image_height
         self.image_channels = image_channels
+        self.padding_value = padding_value
 
     def call(self, inputs):
-        height, width, channels = self.image_height, self.patch_width, self.image_channels
-        patches = tf.image.extract_patches(images=inputs, sizes=[1, height, width, channels],
-                                           strides=[1, 1, width, 1], rates=[1, 1, 1, 1],
-                                           padding="VALID")
-        patches = patches[:, 0, :, :]  # Slicing is used since tf.squeeze() sets shape to None
-        return patches
+        with trace("patching"):
+            height, width, channels = self.image_height, self.patch_width, self.image_channels
+            image_width = inputs.shape[2] if inputs.shape[2] is not None else tf.shape(inputs)[2]
+            patches_count = image_width // width
+
+            patches = tf.reshape(inputs[:, :, :patches_count * width],
+                                 [-1, height, patches_count, width, channels])
+            patches = tf.transpose(patches, [0, 2, 1, 3, 4])
+            return tf.reshape(patches, [-1, patches_count, height * width * channels])
+
+    def compute_mask(self, inputs, mask=None):
+        if self.padding_value is None:
+            return None
+
+        image_width = inputs.shape[2] if inputs.shape[2] is not None else tf.shape(inputs)[2]
+        patches_count = image_width // self.patch_width
+
+        is_column_valid = tf.reduce_any(tf.not_equal(inputs, self.padding_value), axis=[1, 3])
+        is_column_valid = tf.reshape(is_column_valid[:, :patches_count * self.patch_width],
+                                     [-1, patches_count, self.patch_width])
+        return tf.reduce_any(is_column_valid, axis=-1)
+
+    def get_config(self):
+        config = super().get_config()
+        config.update(patch_width=self.patch_width, image_height=self.image_height,
+                      image_channels=self.image_channels, padding_value=self.padding_value)
+        return config
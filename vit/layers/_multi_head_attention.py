@@ -1,5 +1,10 @@
+import math
+
+import numpy as np
 import tensorflow as tf
 
+from vit.profiling import trace
+
 
 # Tensorflow 2 currently has MultiHeadAttention layer only in nightly builds, so until it comes to a stable release, a
 # custom implementation is used. It replicates signature of the Tensorflow implementation, so that substitution could be
@@ -7,57 +12,314 @@ import tensorflow as tf
 class MultiHeadAttention(tf.keras.layers.Layer):
     """Implementation of multi-headed attention based on (Vaswani et al., 2017).
 
+    All projections, including the output one, are created in build(), in the order of the Dense layers of the previous
+    implementation (query, value, key and output kernels and biases), so weights saved by it can be set directly.
+
+    The optional attention_mask argument of call() is a boolean [batch, query positions, key positions] tensor (or a
+    broadcastable one, e.g. [batch, 1, key positions]), where False prevents a query position from attending to a key
+    position.
+
     :param num_heads: Number of attention heads.
     :param key_dim: Size of each attention head for query and key.
+    :param block_size: If not None, attention is calculated over blocks of block_size keys with an online softmax (see
+        blocked_attention()), which doesn't store the full attention matrix in both forward and backward passes.
+    :param attention_window: If not None, every position attends only to positions that are at most attention_window
+        positions away from it (see local_attention()), so the cost of attention grows linearly with the number of
+        positions. Only masks of keys ([batch, 1, key positions]) are supported in this mode.
+    :param global_tokens: Number of leading positions that attend to all positions and are attended to by all positions
+        in the local attention mode (e.g. learned tokens of TransformerEncoder).
     :param name: String name of the layer.
     """
 
-    def __init__(self, num_heads, key_dim, name=None):
-        super().__init__(name=name)
+    # An attention logit of masked positions, which makes their softmax weights zero
+    MASKED_LOGIT = -1E9
+
+    def __init__(self, num_heads, key_dim, block_size=None, attention_window=None, global_tokens=0, name=None,
+                 **kwargs):
+        super().__init__(name=name, **kwargs)
+        if block_size is not None and attention_window is not None:
+            raise ValueError("Blocked attention and local attention can't be used together")
         self.num_heads = num_heads
         self.key_dim = key_dim
+        self.block_size = block_size
+        self.attention_window = attention_window
+        self.global_tokens = global_tokens
+
+    def build(self, input_shape):
+        model_dim = int(input_shape[-1])
+        heads_dim = self.num_heads * self.key_dim
 
-        self.dense_query = tf.keras.layers.Dense(self.num_heads * self.key_dim)
-        self.dense_value = tf.keras.layers.Dense(self.num_heads * self.key_dim)
-        self.dense_key = tf.keras.layers.Dense(self.num_heads * self.key_dim)
+        # Initialization replicates Glorot uniform initialization of Dense layers
+        projection_initializer = tf.keras.initializers.RandomUniform(*glorot_uniform_limits(model_dim, heads_dim))
+        self.query_kernel = self.add_weight("query_kernel", shape=[model_dim, heads_dim],
+                                            initializer=projection_initializer)
+        self.query_bias = self.add_weight("query_bias", shape=[heads_dim], initializer="zeros")
+        self.value_kernel = self.add_weight("value_kernel", shape=[model_dim, heads_dim],
+                                            initializer=projection_initializer)
+        self.value_bias = self.add_weight("value_bias", shape=[heads_dim], initializer="zeros")
+        self.key_kernel = self.add_weight("key_kernel", shape=[model_dim, heads_dim],
+                                          initializer=projection_initializer)
+        self.key_bias = self.add_weight("key_bias", shape=[heads_dim], initializer="zeros")
+        self.output_kernel = self.add_weight(
+            "output_kernel", shape=[heads_dim, model_dim],
+            initializer=tf.keras.initializers.RandomUniform(*glorot_uniform_limits(heads_dim, model_dim)))
+        self.output_bias = self.add_weight("output_bias", shape=[model_dim], initializer="zeros")
 
-        self.dense_output = None
+        super().build(input_shape)
 
-    def call(self, query, value, key):
-        if self.dense_output is None:
-            self.dense_output = tf.keras.layers.Dense(key.shape[-1])
+    def call(self, query, value=None, key=None, attention_mask=None):
+        with trace("attention"):
+            if value is None:
+                value = query
+            if key is None:
+                key = value
 
-        query = self._split_heads(self.dense_query(query))
-        value = self._split_heads(self.dense_value(value))
-        key = self._split_heads(self.dense_key(key))
+            query = self._split_heads(tf.tensordot(query, self.query_kernel, axes=1) + self.query_bias)
+            value = self._split_heads(tf.tensordot(value, self.value_kernel, axes=1) + self.value_bias)
+            key = self._split_heads(tf.tensordot(key, self.key_kernel, axes=1) + self.key_bias)
 
-        output = self._scaled_dot_product_attention(query, value, key)
+            if self.block_size is not None:
+                output = blocked_attention(query, value, key, self.block_size, attention_mask)
+            elif self.attention_window is not None:
+                output = local_attention(query, value, key, self.attention_window, self.global_tokens, attention_mask)
+            else:
+                output = self._scaled_dot_product_attention(query, value, key, attention_mask)
 
-        output = self._swap_pos_head(output)
-        output = tf.reshape(output, [-1, tf.shape(output)[1], self.num_heads * self.key_dim])
-        output = self.dense_output(output)
+            output = self._swap_pos_head(output)
+            output = tf.reshape(output, [-1, positions_count(output), self.num_heads * self.key_dim])
+            output = tf.tensordot(output, self.output_kernel, axes=1) + self.output_bias
 
-        return output
+            return output
 
     def _split_heads(self, concat_heads):
         """Splits concatenated heads."""
-        concat_heads_shape = tf.shape(concat_heads)
-        concat_heads = tf.reshape(
-            concat_heads,
-            [concat_heads_shape[0], concat_heads_shape[1], self.num_heads, -1])
+        concat_heads = tf.reshape(concat_heads, [-1, positions_count(concat_heads), self.num_heads, self.key_dim])
         return self._swap_pos_head(concat_heads)
 
     def _swap_pos_head(self, x):
         """Swap position and head axes of a tensor."""
         return tf.transpose(x, [0, 2, 1, 3])
 
-    def _scaled_dot_product_attention(self, query, value, key):
+    def _scaled_dot_product_attention(self, query, value, key, attention_mask=None):
         """Calculate scaled dot product attention output."""
         attention = tf.matmul(query, key, transpose_b=True)
 
-        key_dim = tf.cast(tf.shape(key)[-1], tf.float32)
-        attention = attention / tf.math.sqrt(key_dim)
+        attention = attention / math.sqrt(self.key_dim)
+        # Softmax is always calculated in float32 to be numerically stable with mixed precision
+        attention = tf.cast(attention, tf.float32)
+        if attention_mask is not None:
+            # The mask is broadcast over heads
+            attention_mask = tf.expand_dims(tf.cast(attention_mask, tf.bool), axis=1)
+            attention = tf.where(attention_mask, attention, self.MASKED_LOGIT)
         attention = tf.nn.softmax(attention, axis=-1)
+        attention = tf.cast(attention, value.dtype)
 
         context = tf.matmul(attention, value)
         return context
+
+    def get_config(self):
+        config = super().get_config()
+        config.update(num_heads=self.num_heads, key_dim=self.key_dim, block_size=self.block_size,
+                      attention_window=self.attention_window, global_tokens=self.global_tokens)
+        return config
+
+
+def blocked_attention(query, value, key, block_size, attention_mask=None):
+    """Calculates scaled dot product attention over blocks of keys with an online softmax, that keeps a running maximum
+    and sum of exponents of attention logits for every query (Milakov & Gimelshein, 2018; Dao et al., 2022).
+
+    Only [batch, heads, query positions, block_size] attention logits are stored at once (blocks are processed
+    sequentially, as parallel iterations of the loop would store logits of several blocks). The backward pass recomputes
+    attention weights of every block from saved log-sum-exp values instead of storing them. Logits and softmax are
+    calculated in float32, as in the full attention.
+
+    :param query: A [batch, heads, query positions, key_dim] tensor.
+    :param value: A [batch, heads, key positions, value_dim] tensor.
+    :param key: A [batch, heads, key positions, key_dim] tensor.
+    :param block_size: Number of keys in a block.
+    :param attention_mask: A boolean tensor that is broadcastable to [batch, query positions, key positions], where
+        False prevents a query from attending to a key.
+    :return: A [batch, heads, query positions, value_dim] tensor.
+    """
+    scale = 1 / math.sqrt(query.shape[-1])
+    key_positions = tf.shape(key)[2]
+    blocks_count = (key_positions + block_size - 1) // block_size
+    padding = blocks_count * block_size - key_positions
+
+    # Masked and padded keys get MASKED_LOGIT added to their logits
+    if attention_mask is None:
+        attention_mask = tf.ones([1, 1, key_positions], tf.bool)
+    bias = tf.where(tf.cast(attention_mask, tf.bool), 0.0, MultiHeadAttention.MASKED_LOGIT)[:, tf.newaxis]
+    bias = tf.pad(bias, [[0, 0], [0, 0], [0, 0], [0, padding]], constant_values=MultiHeadAttention.MASKED_LOGIT)
+
+    def split_blocks(x):
+        """Splits the last position axis of a [batch, heads, positions, ...] tensor into [blocks, ...] tensors."""
+        x_shape = tf.shape(x)
+        x = tf.reshape(x, tf.concat([x_shape[:2], [blocks_count, block_size], x_shape[3:]], axis=0))
+        return tf.transpose(x, tf.concat([[2, 0, 1], tf.range(3, tf.rank(x))], axis=0))
+
+    key_blocks = split_blocks(tf.pad(key, [[0, 0], [0, 0], [0, padding], [0, 0]]))
+    value_blocks = split_blocks(tf.pad(value, [[0, 0], [0, 0], [0, padding], [0, 0]]))
+    bias_blocks = tf.transpose(tf.reshape(bias, tf.concat([tf.shape(bias)[:3], [blocks_count, block_size]], axis=0)),
+                               [3, 0, 1, 2, 4])
+
+    def block_logits(query, key_block, bias_block):
+        return tf.cast(tf.matmul(query, key_block, transpose_b=True), tf.float32) * scale + bias_block
+
+    @tf.custom_gradient
+    def attention(query, key_blocks, value_blocks):
+        query_shape = tf.shape(query)
+        stats_shape = tf.concat([query_shape[:3], [1]], axis=0)
+
+        def step(i, running_max, running_sum, output):
+            logits = block_logits(query, key_blocks[i], bias_blocks[i])
+            new_max = tf.maximum(running_max, tf.reduce_max(logits, axis=-1, keepdims=True))
+            weights = tf.exp(logits - new_max)
+            correction = tf.exp(running_max - new_max)
+
+            running_sum = running_sum * correction + tf.reduce_sum(weights, axis=-1, keepdims=True)
+            block_output = tf.matmul(tf.cast(weights, value_blocks.dtype), value_blocks[i])
+            output = output * correction + tf.cast(block_output, tf.float32)
+            return i + 1, new_max, running_sum, output
+
+        _, running_max, running_sum, output = tf.while_loop(
+            lambda i, *_: i < blocks_count, step,
+            [0, tf.fill(stats_shape, -np.inf), tf.zeros(stats_shape),
+             tf.zeros(tf.concat([query_shape[:3], tf.shape(value_blocks)[-1:]], axis=0))],
+            parallel_iterations=1)
+        output = output / running_sum
+        log_sum_exp = running_max + tf.math.log(running_sum)
+
+        def grad(output_grad):
+            output_grad = tf.cast(output_grad, tf.float32)
+            output_dot_grad = tf.reduce_sum(output_grad * output, axis=-1, keepdims=True)
+
+            def grad_step(i, query_grad, key_grads, value_grads):
+                weights = tf.exp(block_logits(query, key_blocks[i], bias_blocks[i]) - log_sum_exp)
+                value_grads = value_grads.write(i, tf.matmul(weights, output_grad, transpose_a=True))
+
+                weights_grad = tf.matmul(output_grad, tf.cast(value_blocks[i], tf.float32), transpose_b=True)
+                logits_grad = weights * (weights_grad - output_dot_grad) * scale
+                query_grad += tf.matmul(logits_grad, tf.cast(key_blocks[i], tf.float32))
+                key_grads = key_grads.write(i, tf.matmul(logits_grad, tf.cast(query, tf.float32), transpose_a=True))
+                return i + 1, query_grad, key_grads, value_grads
+
+            _, query_grad, key_grads, value_grads = tf.while_loop(
+                lambda i, *_: i < blocks_count, grad_step,
+                [0, tf.zeros(tf.shape(query)), tf.TensorArray(tf.float32, size=blocks_count),
+                 tf.TensorArray(tf.float32, size=blocks_count)],
+                parallel_iterations=1)
+            return (tf.cast(query_grad, query.dtype), tf.cast(key_grads.stack(), key_blocks.dtype),
+                    tf.cast(value_grads.stack(), value_blocks.dtype))
+
+        return tf.cast(output, value_blocks.dtype), grad
+
+    # Gradients of key and value blocks are merged back by gradients of split_blocks() and padding
+    output = attention(query, key_blocks, value_blocks)
+    output.set_shape(query.shape[:-1].concatenate(value.shape[-1:]))
+    return output
+
+
+def local_attention(query, value, key, window, global_tokens=0, attention_mask=None):
+    """Calculates scaled dot product attention, where a query attends only to keys that are at most window positions
+    away from it (Beltagy et al., 2020), except for global_tokens leading positions that attend to all positions and
+    are attended to by all of them (Zaheer et al., 2020).
+
+    Local positions are split into blocks of window positions, and every block of queries attends to keys of its own
+    and two neighbouring blocks with batched matrix multiplications, so [batch, heads, positions, 3 * window] logits
+    are calculated instead of the full [batch, heads, positions, positions] matrix. Keys of neighbouring blocks that are
+    further than window positions from a query are masked. Logits and softmax are calculated in float32, as in the full
+    attention.
+
+    :param query: A [batch, heads, positions, key_dim] tensor.
+    :param value: A [batch, heads, positions, value_dim] tensor.
+    :param key: A [batch, heads, positions, key_dim] tensor.
+    :param window: Maximal distance between a query and a key that it attends to.
+    :param global_tokens: Number of leading global positions.
+    :param attention_mask: A boolean [batch, 1, positions] tensor, where False prevents queries from attending to a key.
+    :return: A [batch, heads, positions, value_dim] tensor.
+    """
+    scale = 1 / math.sqrt(query.shape[-1])
+    positions = tf.shape(key)[2]
+    if attention_mask is None:
+        attention_mask = tf.ones([1, 1, positions], tf.bool)
+    attention_mask = tf.cast(attention_mask, tf.bool)
+    if attention_mask.shape.rank is not None and attention_mask.shape[-2] != 1:
+        raise ValueError("Local attention supports only masks of keys with the [batch, 1, key positions] shape")
+    key_bias = tf.where(attention_mask, 0.0, MultiHeadAttention.MASKED_LOGIT)[:, tf.newaxis]
+
+    def block_logits(query, key):
+        return tf.cast(tf.matmul(query, key, transpose_b=True), tf.float32) * scale
+
+    # Positions are split with tf.split() and tf.gather() rather than slicing, since gradients of strided slices of
+    # large tensors are several times slower on CPUs
+    global_query, local_query = tf.split(query, [global_tokens, -1], axis=2)
+    global_key, local_key = tf.split(key, [global_tokens, -1], axis=2)
+    global_value, local_value = tf.split(value, [global_tokens, -1], axis=2)
+    global_key_bias, local_key_bias = tf.split(key_bias, [global_tokens, -1], axis=-1)
+
+    local_positions = positions - global_tokens
+    blocks_count = (local_positions + window - 1) // window
+    padding = blocks_count * window - local_positions
+
+    def split_blocks(x, pad_before=0, pad_after=0, padding_value=0):
+        """Pads the position axis of a [batch, heads, positions, ...] tensor and splits it into blocks."""
+        x = tf.pad(x, [[0, 0], [0, 0], [pad_before, padding + pad_after]] + [[0, 0]] * (x.shape.rank - 3),
+                   constant_values=padding_value)
+        x_shape = tf.shape(x)
+        return tf.reshape(x, tf.concat([x_shape[:2], [-1, window], x_shape[3:]], axis=0))
+
+    # Indices of the previous, the same and the next block for every block of blocks padded with one block on both sides
+    neighbour_indices = tf.range(blocks_count)[:, tf.newaxis] + tf.range(3)
+
+    def neighbour_blocks(x, padding_value=0):
+        """Returns [batch, heads, blocks, 3 * window, ...] positions of the previous, the same and the next block."""
+        x = tf.gather(split_blocks(x, window, window, padding_value), neighbour_indices, axis=2)
+        x_shape = tf.shape(x)
+        return tf.reshape(x, tf.concat([x_shape[:3], [3 * window], x_shape[5:]], axis=0))
+
+    query_blocks = split_blocks(local_query)
+    key_blocks = neighbour_blocks(local_key)
+    value_blocks = neighbour_blocks(local_value)
+    # Biases of keys are split as a [batch, 1, positions] tensor and broadcast over heads and queries of blocks
+    bias_blocks = neighbour_blocks(local_key_bias[:, 0], MultiHeadAttention.MASKED_LOGIT)[:, :, :, tf.newaxis]
+
+    # Keys of neighbouring blocks are within the window if their distance to a query is at most window
+    distance = tf.range(3 * window)[tf.newaxis] - window - tf.range(window)[:, tf.newaxis]
+    band_bias = tf.where(tf.abs(distance) <= window, 0.0, MultiHeadAttention.MASKED_LOGIT)
+
+    logits = block_logits(query_blocks, key_blocks) + bias_blocks + band_bias
+    if global_tokens:
+        # Local queries also attend to global keys
+        global_logits = block_logits(query_blocks, global_key[:, :, tf.newaxis]) + global_key_bias[:, :, tf.newaxis]
+        logits = tf.concat([global_logits, logits], axis=-1)
+    weights = tf.cast(tf.nn.softmax(logits, axis=-1), value.dtype)
+
+    global_weights, weights = tf.split(weights, [global_tokens, 3 * window], axis=-1)
+    output = tf.matmul(weights, value_blocks)
+    if global_tokens:
+        output += tf.matmul(global_weights, global_value[:, :, tf.newaxis])
+    output_shape = tf.shape(output)
+    output = tf.reshape(output, tf.concat([output_shape[:2], [-1], output_shape[-1:]], axis=0))
+    output, _ = tf.split(output, [local_positions, padding], axis=2)
+
+    if global_tokens:
+        # Global queries attend to all keys
+        global_weights = tf.nn.softmax(block_logits(global_query, key) + key_bias, axis=-1)
+        global_output = tf.matmul(tf.cast(global_weights, value.dtype), value)
+        output = tf.concat([global_output, output], axis=2)
+
+    output.set_shape(query.shape[:-1].concatenate(value.shape[-1:]))
+    return output
+
+
+def positions_count(inputs):
+    """Returns the number of positions (the second dimension) of inputs, which is static if it is known, so that
+    shapes of reshaped tensors stay fully defined for XLA compilation."""
+    count = inputs.shape[1]
+    return count if count is not None else tf.shape(inputs)[1]
+
+
+def glorot_uniform_limits(fan_in, fan_out):
+    limit = math.sqrt(6 / (fan_in + fan_out))
+    return -limit, limit
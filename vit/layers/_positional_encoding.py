@@ -1,22 +1,63 @@
 """Positional encoding layer"""
+import numpy as np
 import tensorflow as tf
 
+from vit.profiling import trace
+
 
 class PositionalEncoding(tf.keras.layers.Layer):
-    """Adds positional encoding to its inputs as described in (Vaswani et al., 2017)."""
+    """Adds positional encoding to its inputs as described in (Vaswani et al., 2017).
+
+    The sinusoidal encoding table is calculated once when the layer is built and sliced for shorter inputs.
+    Alternatively, the encoding can be learned as in (Dosovitskiy et al., 2020). Masks of inputs are passed through.
+
+    :param max_positions: Maximal number of positions (if None, the number of positions in the input shape is used).
+    :param learned: Whether to use learned positional embeddings instead of the sinusoidal encoding.
+    :param name: String name of the layer.
+    """
+
+    def __init__(self, max_positions=None, learned=False, name=None, **kwargs):
+        super().__init__(name=name, **kwargs)
+        self.supports_masking = True
+        self.max_positions = max_positions
+        self.learned = learned
+
+    def build(self, input_shape):
+        max_positions = self.max_positions if self.max_positions is not None else input_shape[1]
+        if max_positions is None:
+            raise ValueError("max_positions should be specified for inputs with unknown number of positions")
+        encoding_dim = int(input_shape[-1])
+
+        if self.learned:
+            self.encoding = self.add_weight("encoding", shape=[max_positions, encoding_dim],
+                                            initializer=tf.keras.initializers.RandomNormal(stddev=0.02))
+        else:
+            # A constant rather than a weight, so that checkpoints of the layer don't change
+            self.encoding = tf.constant(sinusoidal_encoding(max_positions, encoding_dim), dtype=self.compute_dtype)
+
+        super().build(input_shape)
 
     def call(self, inputs):
-        inputs_shape = tf.shape(inputs)
-        positions_count = inputs_shape[1]
-        encoding_dim = inputs_shape[2]
+        with trace("positional_encoding"):
+            positions_count = inputs.shape[1]
+            if positions_count is None:
+                positions_count = tf.shape(inputs)[1]
+
+            positional_encoding = tf.cast(self.encoding[:positions_count], inputs.dtype)
+            return inputs + positional_encoding
+
+    def get_config(self):
+        config = super().get_config()
+        config.update(max_positions=self.max_positions, learned=self.learned)
+        return config
 
-        pos = tf.expand_dims(tf.range(positions_count), axis=1)
-        index = tf.range(encoding_dim)
-        i = tf.expand_dims(index // 2, axis=0)
 
-        x = tf.cast(pos, tf.float32) / tf.cast(10000**(2*i/encoding_dim), tf.float32)
+def sinusoidal_encoding(positions_count, encoding_dim):
+    """Calculates a [positions_count, encoding_dim] table of the sinusoidal positional encoding."""
+    pos = np.arange(positions_count, dtype=np.float32)[:, np.newaxis]
+    index = np.arange(encoding_dim)
+    i = index[np.newaxis, :] // 2
 
-        is_even = tf.less(index % 2, 1)
-        positional_encoding = tf.where(is_even, tf.sin(x), tf.cos(x))
+    x = pos / (10000**(2*i/encoding_dim)).astype(np.float32)
 
-        return inputs + positional_encoding
+    return np.where(index % 2 == 0, np.sin(x), np.cos(x))
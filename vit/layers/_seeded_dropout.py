@@ -0,0 +1,50 @@
+"""Dropout layer with a checkpointable random state."""
+import random
+
+import tensorflow as tf
+
+
+class SeededDropout(tf.keras.layers.Layer):
+    """Dropout, whose masks are generated by stateless dropout from seeds drawn from a tf.random.Generator owned by the
+    layer.
+
+    The generator is tracked by the layer, so its state is saved and restored with checkpoints of a model (it isn't a
+    weight of the layer), and training that is resumed from a checkpoint draws the same masks as an uninterrupted one.
+    A seed can also be passed to a call, e.g. so that a recomputed forward pass reproduces masks of the original one.
+
+    :param rate: Fraction of the input units to drop.
+    :param seed: Initial seed of the generator (if None, it's drawn from the Python random module, which is seeded by
+        tf.keras.utils.set_random_seed()).
+    :param name: String name of the layer.
+    """
+
+    def __init__(self, rate, seed=None, name=None, **kwargs):
+        super().__init__(name=name, **kwargs)
+        self.rate = rate
+        self.seed = seed
+        self.supports_masking = True
+
+    def build(self, input_shape):
+        seed = random.randint(0, 2 ** 31 - 1) if self.seed is None else self.seed
+        self.generator = tf.random.Generator.from_seed(seed)
+        super().build(input_shape)
+
+    def call(self, inputs, training=None, seed=None):
+        """Applies the layer.
+
+        :param seed: A [2] integer seed of stateless dropout (if None, a seed is drawn with make_seed()).
+        """
+        if not training or self.rate == 0:
+            return inputs
+        if seed is None:
+            seed = self.make_seed()
+        return tf.nn.experimental.stateless_dropout(inputs, self.rate, seed)
+
+    def make_seed(self):
+        """Draws a [2] int64 seed of stateless dropout from the generator of the layer."""
+        return self.generator.make_seeds(1)[:, 0]
+
+    def get_config(self):
+        config = super().get_config()
+        config.update(rate=self.rate, seed=self.seed)
+        return config
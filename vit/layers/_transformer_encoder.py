@@ -2,33 +2,116 @@
 import tensorflow as tf
 
 import vit
+from vit.profiling import trace
 
 
 class TransformerEncoder(tf.keras.layers.Layer):
     """Transformer encoder (stack of encoder layers)
 
+    If inputs have a mask (e.g. of patches of padded images), masked positions are not attended to.
+
     :param num_layers: Number of encoder layers.
     :param model_dim: Input and output dimensionality.
     :param mha_num_heads: Number of attention heads.
     :param mlp_inner_units: MLP inner layer dimensionality.
     :param mha_key_dim: Size of each attention head for query and key (if None, model_dim // mha_num_heads is used).
+    :param mha_block_size: If not None, attention is calculated over blocks of mha_block_size keys without storing the
+        full attention matrix (see MultiHeadAttention), which reduces memory usage for long sequences of patches.
+    :param mha_attention_window: If not None, every position attends only to positions that are at most
+        mha_attention_window positions away from it (see MultiHeadAttention), which makes the cost of attention linear
+        in the number of patches.
+    :param global_tokens: Number of learned tokens that are prepended to inputs and are removed from outputs. In the
+        local attention mode, they attend to all positions and are attended to by all positions, passing global context
+        between distant patches.
     :param dropout: Rate of dropout to apply.
+    :param exit_layers: Numbers of encoder layers after which intermediate outputs are returned for early exits (e.g.
+        [2, 4] for outputs of the 2nd and the 4th layers). If not None, the layer returns a list of intermediate outputs
+        followed by the output of the last layer.
+    :param recompute: Whether activations of encoder layers should be recomputed during the backward pass instead of
+        being stored (gradient checkpointing), which reduces memory usage of training at the cost of an additional
+        forward pass. Dropout of recomputed layers is stateless, so that recomputation reproduces its masks.
     :param name: String name of the layer.
     """
 
-    def __init__(self, num_layers, model_dim, mha_num_heads, mlp_inner_units, mha_key_dim=None, dropout=0.0, name=None):
-        super().__init__(name=name)
+    def __init__(self, num_layers, model_dim, mha_num_heads, mlp_inner_units, mha_key_dim=None, mha_block_size=None,
+                 mha_attention_window=None, global_tokens=0, dropout=0.0, exit_layers=None, recompute=False, name=None,
+                 **kwargs):
+        super().__init__(name=name, **kwargs)
+        self.num_layers = num_layers
+        self.model_dim = model_dim
+        self.mha_num_heads = mha_num_heads
+        self.mlp_inner_units = mlp_inner_units
+        self.mha_key_dim = mha_key_dim
+        self.mha_block_size = mha_block_size
+        self.mha_attention_window = mha_attention_window
+        self.global_tokens = global_tokens
+        self.dropout = dropout
+        self.exit_layers = None if exit_layers is None else sorted(exit_layers)
+        self.recompute = recompute
+        self.supports_masking = True
+
+        if self.exit_layers is not None and not all(0 < layer < num_layers for layer in self.exit_layers):
+            raise ValueError(f"Exit layers should be in range [1, {num_layers - 1}]")
 
         self.encoder_layers = [TransformerEncoderLayer(model_dim, mha_num_heads, mlp_inner_units,
-                                                       mha_key_dim=mha_key_dim, dropout=dropout,
-                                                       name=name)
+                                                       mha_key_dim=mha_key_dim, mha_block_size=mha_block_size,
+                                                       mha_attention_window=mha_attention_window,
+                                                       mha_global_tokens=global_tokens, dropout=dropout,
+                                                       name=name, dtype=self.dtype_policy)
                                for _ in range(num_layers)]
 
-    def call(self, inputs, training=None):
-        x = inputs
-        for layer in self.encoder_layers:
-            x = layer(x, training=training)
-        return x
+    def build(self, input_shape):
+        if self.global_tokens:
+            self.global_token_embeddings = self.add_weight(
+                "global_token_embeddings", shape=[self.global_tokens, self.model_dim],
+                initializer=tf.keras.initializers.RandomNormal(stddev=0.02))
+        super().build(input_shape)
+
+    def call(self, inputs, training=None, mask=None):
+        x, mask = self.add_global_tokens(inputs, mask)
+
+        exit_outputs = []
+        for i, layer in enumerate(self.encoder_layers, start=1):
+            # Layers are built by a regular call, as recomputed functions can't create variables
+            if self.recompute and training and layer.built:
+                x = recompute_layer(layer, x, mask)
+            else:
+                x = layer(x, training=training, mask=mask)
+            if self.exit_layers is not None and i in self.exit_layers:
+                exit_outputs.append(self.remove_global_tokens(x))
+        x = self.remove_global_tokens(x)
+        return x if self.exit_layers is None else exit_outputs + [x]
+
+    def add_global_tokens(self, inputs, mask=None):
+        """Prepends global tokens to inputs of the first encoder layer, e.g. when encoder layers are run one by one.
+
+        :param inputs: A [batch, positions, model_dim] tensor.
+        :param mask: A [batch, positions] mask of inputs or None.
+        :return: Inputs and the mask (or None) with global tokens prepended.
+        """
+        if not self.global_tokens:
+            return inputs, mask
+        global_tokens = tf.cast(self.global_token_embeddings, inputs.dtype)[tf.newaxis]
+        x = tf.concat([tf.repeat(global_tokens, tf.shape(inputs)[0], axis=0), inputs], axis=1)
+        if mask is not None:
+            mask = tf.pad(mask, [[0, 0], [self.global_tokens, 0]], constant_values=True)
+        return x, mask
+
+    def remove_global_tokens(self, outputs):
+        """Removes global tokens from outputs of an encoder layer."""
+        return outputs[:, self.global_tokens:]
+
+    def compute_mask(self, inputs, mask=None):
+        return mask if self.exit_layers is None else [mask] * (len(self.exit_layers) + 1)
+
+    def get_config(self):
+        config = super().get_config()
+        config.update(num_layers=self.num_layers, model_dim=self.model_dim, mha_num_heads=self.mha_num_heads,
+                      mlp_inner_units=self.mlp_inner_units, mha_key_dim=self.mha_key_dim,
+                      mha_block_size=self.mha_block_size, mha_attention_window=self.mha_attention_window,
+                      global_tokens=self.global_tokens, dropout=self.dropout, exit_layers=self.exit_layers,
+                      recompute=self.recompute)
+        return config
 
 
 class TransformerEncoderLayer(tf.keras.layers.Layer):
@@ -38,37 +121,87 @@ class TransformerEncoderLayer(tf.keras.layers.Layer):
     :param mha_num_heads: Number of attention heads.
     :param mlp_inner_units: MLP inner layer dimensionality.
     :param mha_key_dim: Size of each attention head for query and key (if None, model_dim // mha_num_heads is used).
+    :param mha_block_size: Number of keys in attention blocks (if None, the full attention matrix is calculated).
+    :param mha_attention_window: Maximal distance between attending positions (if None, all positions attend to each
+        other).
+    :param mha_global_tokens: Number of leading global positions in the local attention mode.
     :param dropout: Rate of dropout to apply.
     :param name: String name of the layer.
     """
 
-    def __init__(self, model_dim, mha_num_heads, mlp_inner_units, mha_key_dim=None, dropout=0.0, name=None):
-        super().__init__(name=name)
+    def __init__(self, model_dim, mha_num_heads, mlp_inner_units, mha_key_dim=None, mha_block_size=None,
+                 mha_attention_window=None, mha_global_tokens=0, dropout=0.0, name=None, **kwargs):
+        super().__init__(name=name, **kwargs)
 
         if mha_key_dim is None:
             mha_key_dim = model_dim // mha_num_heads
 
-        self.layer_norm1 = tf.keras.layers.LayerNormalization()
-        self.mha = vit.layers.MultiHeadAttention(mha_num_heads, mha_key_dim)
-        self.mha_dropout = tf.keras.layers.Dropout(dropout)
+        self.supports_masking = True
+
+        self.layer_norm1 = tf.keras.layers.LayerNormalization(dtype=self.dtype_policy)
+        self.mha = vit.layers.MultiHeadAttention(mha_num_heads, mha_key_dim, block_size=mha_block_size,
+                                                 attention_window=mha_attention_window,
+                                                 global_tokens=mha_global_tokens, dtype=self.dtype_policy)
+        self.mha_dropout = vit.layers.SeededDropout(dropout, dtype=self.dtype_policy)
 
-        self.layer_norm2 = tf.keras.layers.LayerNormalization()
-        self.mlp = TransformerMLP(mlp_inner_units, model_dim)
-        self.mlp_dropout = tf.keras.layers.Dropout(dropout)
+        self.layer_norm2 = tf.keras.layers.LayerNormalization(dtype=self.dtype_policy)
+        self.mlp = TransformerMLP(mlp_inner_units, model_dim, dtype=self.dtype_policy)
+        self.mlp_dropout = vit.layers.SeededDropout(dropout, dtype=self.dtype_policy)
 
-    def call(self, inputs, training=None):
+    def call(self, inputs, training=None, mask=None, dropout_seed=None):
+        """Applies the layer.
+
+        :param dropout_seed: A [2] integer seed, from which seeds of both dropout layers are derived (if None, dropout
+            layers draw seeds from their generators), the same seed produces the same dropout masks.
+        """
         inputs_norm = self.layer_norm1(inputs, training=training)
-        attention = self.mha(inputs_norm, inputs_norm, inputs_norm)
-        attention = self.mha_dropout(attention, training=training)
+        attention_mask = None if mask is None else mask[:, tf.newaxis, :]
+        attention = self.mha(inputs_norm, attention_mask=attention_mask)
+        attention = self.mha_dropout(attention, training=training, seed=derive_seed(dropout_seed, 0))
         attention_residual = attention + inputs
 
         attention_norm = self.layer_norm2(attention_residual, training=training)
         mlp = self.mlp(attention_norm)
-        mlp = self.mlp_dropout(mlp, training=training)
+        mlp = self.mlp_dropout(mlp, training=training, seed=derive_seed(dropout_seed, 1))
         mlp_residual = mlp + attention_residual
 
         return mlp_residual
 
+    def make_dropout_seed(self):
+        """Draws a [2] int64 seed for call() from the generator of the attention dropout layer (see SeededDropout), so
+        that seeds follow its checkpointed state."""
+        return self.mha_dropout.make_seed()
+
+
+def derive_seed(seed, index):
+    """Derives a seed of the index-th dropout layer from a seed passed to TransformerEncoderLayer.call() (or returns
+    None if it's None)."""
+    if seed is None:
+        return None
+    return seed + tf.constant([0, index], seed.dtype)
+
+
+def recompute_layer(layer, inputs, mask=None):
+    """Applies an encoder layer in the training mode, so that its activations are recomputed during the backward pass
+    instead of being stored.
+
+    A random seed of stateless dropout is drawn outside of the recomputed function (see
+    TransformerEncoderLayer.make_dropout_seed()), so that the recomputed forward pass uses the same dropout masks as the
+    original one.
+
+    :param layer: A built TransformerEncoderLayer.
+    :param inputs: Inputs of the layer.
+    :param mask: A mask of inputs.
+    :return: Outputs of the layer.
+    """
+    dropout_seed = layer.make_dropout_seed()
+
+    @tf.recompute_grad
+    def apply_layer(x):
+        return layer(x, training=True, mask=mask, dropout_seed=dropout_seed)
+
+    return apply_layer(inputs)
+
 
 class TransformerMLP(tf.keras.layers.Layer):
     """MLP (multilayer perceptron) - a fully connected feed-forward network located after multi-headed self-attention in
@@ -79,12 +212,13 @@ class TransformerMLP(tf.keras.layers.Layer):
     :param name: String name of the layer.
     """
 
-    def __init__(self, inner_dim, output_dim, name=None):
-        super().__init__(name=name)
-        self.dense1 = tf.keras.layers.Dense(inner_dim, activation="relu")
-        self.dense2 = tf.keras.layers.Dense(output_dim)
+    def __init__(self, inner_dim, output_dim, name=None, **kwargs):
+        super().__init__(name=name, **kwargs)
+        self.dense1 = tf.keras.layers.Dense(inner_dim, activation="relu", dtype=self.dtype_policy)
+        self.dense2 = tf.keras.layers.Dense(output_dim, dtype=self.dtype_policy)
 
     def call(self, inputs):
-        x = self.dense1(inputs)
-        x = self.dense2(x)
-        return x
+        with trace("mlp"):
+            x = self.dense1(inputs)
+            x = self.dense2(x)
+            return x
@@ -28,3 +28,17 @@ def test_call__output_values_are_correct():
     for i in range(outputs.shape[1]):
         expected_patch = np.reshape(inputs[:, :, i * patch_width:(i + 1) * patch_width, :], (samples, -1))
         assert_array_equal(outputs[:, i], expected_patch)
+
+
+def test_compute_mask__patches_of_padding_are_masked():
+    patch_width, padding_value = 4, -2
+    inputs = np.random.uniform(-1, 1, size=[2, 32, 20, 1]).astype(np.float32)
+    inputs[0, :, 10:] = padding_value
+    inputs[1, :, 17:] = padding_value
+    horizontal_patching = HorizontalPatching(patch_width, 32, 1, padding_value=padding_value)
+
+    mask = horizontal_patching.compute_mask(inputs)
+
+    # A patch is valid if it has at least one column of image content
+    assert_array_equal(mask, [[True, True, True, False, False],
+                              [True, True, True, True, True]])
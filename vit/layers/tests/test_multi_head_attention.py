@@ -0,0 +1,142 @@
+"""Tests for the MultiHeadAttention layer."""
+import numpy as np
+import pytest
+import tensorflow as tf
+
+from numpy.testing import assert_allclose
+
+from vit.layers import MultiHeadAttention
+
+
+def legacy_attention(inputs, weights, num_heads):
+    """A NumPy reference of the implementation with separate query, value, key and output projections."""
+    query_kernel, query_bias, value_kernel, value_bias, key_kernel, key_bias, output_kernel, output_bias = weights
+
+    def split_heads(x):
+        return x.reshape(x.shape[0], x.shape[1], num_heads, -1).transpose([0, 2, 1, 3])
+
+    query = split_heads(inputs @ query_kernel + query_bias)
+    value = split_heads(inputs @ value_kernel + value_bias)
+    key = split_heads(inputs @ key_kernel + key_bias)
+
+    attention = query @ key.transpose([0, 1, 3, 2]) / np.sqrt(key.shape[-1])
+    attention = np.exp(attention - attention.max(axis=-1, keepdims=True))
+    attention /= attention.sum(axis=-1, keepdims=True)
+
+    context = (attention @ value).transpose([0, 2, 1, 3])
+    context = context.reshape(context.shape[0], context.shape[1], -1)
+    return context @ output_kernel + output_bias
+
+
+def test_call__output_shape_is_correct():
+    samples, positions, model_dim = 4, 25, 32
+    inputs = np.random.uniform(size=[samples, positions, model_dim]).astype(np.float32)
+    mha = MultiHeadAttention(num_heads=4, key_dim=16)
+
+    outputs = mha(inputs)
+
+    assert outputs.shape == (samples, positions, model_dim)
+
+
+def test_call__value_and_key_default_to_query():
+    inputs = tf.random.uniform([4, 25, 32])
+    mha = MultiHeadAttention(num_heads=4, key_dim=8)
+
+    self_attention = mha(inputs)
+    cross_attention = mha(inputs, tf.identity(inputs), tf.identity(inputs))
+
+    assert_allclose(self_attention, cross_attention, rtol=1E-5, atol=1E-5)
+
+
+def test_call__mixed_precision_output_is_close_to_float32():
+    inputs = tf.random.uniform([4, 25, 32])
+    mha = MultiHeadAttention(num_heads=4, key_dim=8)
+    mixed_mha = MultiHeadAttention(num_heads=4, key_dim=8, dtype="mixed_float16")
+    mha(inputs)
+    mixed_mha(inputs)
+    mixed_mha.set_weights(mha.get_weights())
+
+    outputs = mha(inputs)
+    mixed_outputs = mixed_mha(inputs)
+
+    assert mixed_outputs.dtype == tf.float16
+    assert_allclose(tf.cast(mixed_outputs, tf.float32), outputs, rtol=1E-2, atol=1E-2)
+
+
+def test_set_weights__legacy_weights_produce_legacy_output():
+    num_heads, key_dim, model_dim = 4, 8, 32
+    inputs = np.random.uniform(size=[4, 25, model_dim]).astype(np.float32)
+    heads_dim = num_heads * key_dim
+    legacy_weights = [np.random.normal(size=shape).astype(np.float32) * 0.1
+                      for shape in [(model_dim, heads_dim), (heads_dim,)] * 3 + [(heads_dim, model_dim), (model_dim,)]]
+    mha = MultiHeadAttention(num_heads, key_dim)
+    mha.build(inputs.shape)
+
+    mha.set_weights(legacy_weights)
+    outputs = mha(inputs)
+
+    assert_allclose(outputs, legacy_attention(inputs, legacy_weights, num_heads), rtol=1E-4, atol=1E-5)
+
+
+def test_call__masked_keys_do_not_affect_outputs():
+    samples, valid_positions, padded_positions, model_dim = 4, 6, 10, 16
+    inputs = np.random.uniform(-1, 1, size=[samples, padded_positions, model_dim]).astype(np.float32)
+    mask = np.arange(padded_positions) < valid_positions
+    mha = MultiHeadAttention(num_heads=4, key_dim=4)
+
+    outputs = mha(inputs, attention_mask=np.broadcast_to(mask, [samples, 1, padded_positions]))
+    valid_outputs = mha(inputs[:, :valid_positions])
+
+    assert_allclose(outputs[:, :valid_positions], valid_outputs, atol=1E-5)
+
+
+@pytest.mark.parametrize("positions, block_size", [(25, 8), (24, 8), (5, 16)])
+def test_call__blocked_attention_matches_full_attention(positions, block_size):
+    samples, model_dim = 3, 16
+    inputs = tf.constant(np.random.uniform(-1, 1, size=[samples, positions, model_dim]).astype(np.float32))
+    mask = np.arange(positions) < np.array([[positions], [positions - 2], [1]])
+    full_mha = MultiHeadAttention(num_heads=4, key_dim=4)
+    blocked_mha = MultiHeadAttention(num_heads=4, key_dim=4, block_size=block_size)
+    full_mha(inputs)
+    blocked_mha(inputs)
+    blocked_mha.set_weights(full_mha.get_weights())
+
+    gradients = []
+    for mha in (full_mha, blocked_mha):
+        with tf.GradientTape() as tape:
+            tape.watch(inputs)
+            outputs = mha(inputs, attention_mask=mask[:, np.newaxis, :])
+            loss = tf.reduce_sum(outputs**2)
+        gradients.append([outputs] + tape.gradient(loss, [inputs] + mha.trainable_weights))
+
+    for full, blocked in zip(*gradients):
+        assert_allclose(blocked, full, rtol=1E-4, atol=1E-4)
+
+
+@pytest.mark.parametrize("positions, window, global_tokens", [(25, 4, 0), (25, 4, 2), (24, 3, 1), (5, 8, 1)])
+def test_call__local_attention_matches_full_attention_with_band_mask(positions, window, global_tokens):
+    samples, model_dim = 3, 16
+    inputs = tf.constant(np.random.uniform(-1, 1, size=[samples, positions, model_dim]).astype(np.float32))
+    mask = np.arange(positions) < np.array([[positions], [positions - 2], [global_tokens + 1]])
+    full_mha = MultiHeadAttention(num_heads=4, key_dim=4)
+    local_mha = MultiHeadAttention(num_heads=4, key_dim=4, attention_window=window, global_tokens=global_tokens)
+    full_mha(inputs)
+    local_mha(inputs)
+    local_mha.set_weights(full_mha.get_weights())
+
+    # Global positions attend to all positions and are attended to by all of them
+    indices = np.arange(positions)
+    band = np.abs(indices[:, np.newaxis] - indices) <= window
+    band |= (indices[:, np.newaxis] < global_tokens) | (indices < global_tokens)
+    full_mask = band & mask[:, np.newaxis, :]
+
+    gradients = []
+    for mha, attention_mask in ((full_mha, full_mask), (local_mha, mask[:, np.newaxis, :])):
+        with tf.GradientTape() as tape:
+            tape.watch(inputs)
+            outputs = tf.boolean_mask(mha(inputs, attention_mask=attention_mask), mask)
+            loss = tf.reduce_sum(outputs**2)
+        gradients.append([outputs] + tape.gradient(loss, [inputs] + mha.trainable_weights))
+
+    for full, local in zip(*gradients):
+        assert_allclose(local, full, rtol=1E-4, atol=1E-4)
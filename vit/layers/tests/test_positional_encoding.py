@@ -0,0 +1,58 @@
+"""Tests for the PositionalEncoding layer."""
+import numpy as np
+import tensorflow as tf
+
+from numpy.testing import assert_allclose
+
+from vit.layers import PositionalEncoding
+
+
+def reference_encoding(positions_count, encoding_dim):
+    pos = np.arange(positions_count)[:, np.newaxis]
+    i = np.arange(encoding_dim)[np.newaxis, :]
+    angles = pos / np.power(10000, 2 * (i // 2) / encoding_dim)
+    return np.where(i % 2 == 0, np.sin(angles), np.cos(angles))
+
+
+def test_call__output_values_are_correct():
+    samples, positions, encoding_dim = 4, 25, 32
+    inputs = np.random.uniform(size=[samples, positions, encoding_dim]).astype(np.float32)
+    positional_encoding = PositionalEncoding()
+
+    outputs = positional_encoding(inputs)
+
+    assert_allclose(outputs - inputs, np.broadcast_to(reference_encoding(positions, encoding_dim), inputs.shape),
+                    rtol=1E-5, atol=1E-5)
+
+
+def test_call__shorter_inputs_use_table_prefix():
+    encoding_dim = 16
+    positional_encoding = PositionalEncoding(max_positions=50)
+
+    outputs = positional_encoding(tf.zeros([2, 10, encoding_dim]))
+
+    assert_allclose(outputs[0], reference_encoding(10, encoding_dim), rtol=1E-5, atol=1E-5)
+
+
+def test_build__learned_encoding_is_trainable():
+    positional_encoding = PositionalEncoding(learned=True)
+
+    positional_encoding(tf.zeros([2, 25, 16]))
+
+    assert [weight.shape for weight in positional_encoding.trainable_weights] == [(25, 16)]
+
+
+def test_build__sinusoidal_encoding_has_no_weights():
+    positional_encoding = PositionalEncoding()
+
+    positional_encoding(tf.zeros([2, 25, 16]))
+
+    assert not positional_encoding.weights
+
+
+def test_get_config__layer_is_restored():
+    positional_encoding = PositionalEncoding(max_positions=40, learned=True)
+
+    restored = PositionalEncoding.from_config(positional_encoding.get_config())
+
+    assert restored.max_positions == 40 and restored.learned
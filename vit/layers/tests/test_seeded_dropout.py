@@ -0,0 +1,39 @@
+"""Tests for the SeededDropout layer."""
+import numpy as np
+import tensorflow as tf
+
+from numpy.testing import assert_array_equal
+
+from vit.layers import SeededDropout
+
+
+def test_call__restored_checkpoint_reproduces_masks(tmp_path):
+    inputs = tf.ones([4, 25, 16])
+    layer = SeededDropout(0.5)
+    layer(inputs)
+    checkpoint = tf.train.Checkpoint(layer=layer)
+    checkpoint_path = checkpoint.save(tmp_path / "checkpoint")
+
+    outputs = layer(inputs, training=True)
+    checkpoint.restore(checkpoint_path)
+
+    assert_array_equal(layer(inputs, training=True), outputs)
+    assert not np.array_equal(layer(inputs, training=True), outputs)
+
+
+def test_call__same_seed_produces_same_masks():
+    inputs = tf.ones([4, 25, 16])
+    layer = SeededDropout(0.5)
+
+    outputs = layer(inputs, training=True, seed=tf.constant([1, 2]))
+
+    assert_array_equal(layer(inputs, training=True, seed=tf.constant([1, 2])), outputs)
+    assert 0 < np.count_nonzero(outputs) < outputs.shape.num_elements()
+    assert_array_equal(layer(inputs), inputs)
+
+
+def test_build__generator_is_not_a_weight():
+    layer = SeededDropout(0.5)
+    layer(tf.ones([4, 16]))
+
+    assert layer.weights == []
@@ -0,0 +1,49 @@
+"""Tests for the TransformerEncoder layer."""
+import numpy as np
+import tensorflow as tf
+
+from numpy.testing import assert_allclose
+
+from vit.layers import TransformerEncoder
+from vit.layers._transformer_encoder import TransformerEncoderLayer
+
+
+def loss_and_gradients(apply_layer, layer, inputs):
+    with tf.GradientTape() as tape:
+        loss = tf.reduce_sum(apply_layer(inputs)**2)
+    return [loss] + tape.gradient(loss, layer.trainable_weights)
+
+
+def test_call__recomputed_gradients_match_stored_activations():
+    inputs = tf.random.uniform([4, 25, 16], -1, 1)
+    mask = tf.sequence_mask([25, 20, 10, 1], 25)
+    encoder = TransformerEncoder(num_layers=2, model_dim=16, mha_num_heads=2, mlp_inner_units=32)
+    recomputed_encoder = TransformerEncoder(num_layers=2, model_dim=16, mha_num_heads=2, mlp_inner_units=32,
+                                            recompute=True)
+    encoder(inputs)
+    recomputed_encoder(inputs)
+    recomputed_encoder.set_weights(encoder.get_weights())
+
+    gradients = loss_and_gradients(lambda x: encoder(x, training=True, mask=mask), encoder, inputs)
+    recomputed_gradients = tf.function(loss_and_gradients)(
+        lambda x: recomputed_encoder(x, training=True, mask=mask), recomputed_encoder, inputs)
+
+    for recomputed, stored in zip(recomputed_gradients, gradients):
+        assert_allclose(recomputed, stored, rtol=1E-4, atol=1E-4)
+
+
+def test_call__dropout_seed_makes_recomputation_reproduce_dropout_masks():
+    inputs = tf.random.uniform([4, 25, 16], -1, 1)
+    dropout_seed = tf.constant([1, 2])
+    layer = TransformerEncoderLayer(model_dim=16, mha_num_heads=2, mlp_inner_units=32, dropout=0.5)
+    layer(inputs)
+
+    def apply_layer(x):
+        return layer(x, training=True, dropout_seed=dropout_seed)
+
+    gradients = loss_and_gradients(apply_layer, layer, inputs)
+    recomputed_gradients = loss_and_gradients(tf.recompute_grad(apply_layer), layer, inputs)
+
+    assert not np.allclose(apply_layer(inputs), layer(inputs))
+    for recomputed, stored in zip(recomputed_gradients, gradients):
+        assert_allclose(recomputed, stored, rtol=1E-5, atol=1E-6)
@@ -1,2 +1,3 @@
 """Loss functions."""
 from ._ctc_loss import CTCLoss
+from ._distillation_loss import DistillationLoss
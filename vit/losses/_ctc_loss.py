@@ -1,38 +1,59 @@
 """CTC loss."""
 import tensorflow as tf
 
+from vit.profiling import trace
+
 
 class CTCLoss(tf.keras.losses.Loss):
     """Calculates CTC loss.
 
+    By default, labels are converted to a sparse tensor and the native CTC kernel is used. With jit_compile=True, the
+    loss is calculated from dense labels without sparse conversions, so it can be compiled with XLA when shapes of
+    predictions and labels are fixed (the dense implementation is several times slower without XLA).
+
+    Frames of predictions where all probabilities are zeros (see vit.layers.ApplyMask) are treated as padding, so
+    lengths of predictions are calculated per sample.
+
     :param true_labels_padding_value: A padding value that was used for true labels (None if there is no padding, only
         padding at the end of a sequence is supported).
+    :param jit_compile: Whether the loss is compiled with XLA (e.g. model.compile(jit_compile=True)).
     :param reduction: Reduction argument for the base tf.keras.losses.Loss class.
     :param name: Optional name for the op.
     """
 
-    def __init__(self, true_labels_padding_value=None, reduction=tf.losses.Reduction.AUTO, name=None):
+    # A small value that is added to probabilities before taking their logarithm (the same as in ctc_batch_cost())
+    EPSILON = 1E-7
+
+    def __init__(self, true_labels_padding_value=None, jit_compile=False, reduction=tf.losses.Reduction.AUTO,
+                 name=None):
         super().__init__(reduction=reduction, name=name)
         self.true_labels_padding_value = true_labels_padding_value
+        self.jit_compile = jit_compile
 
     def call(self, y_true, y_pred):
-        y_true_length = self._get_length(y_true, self.true_labels_padding_value)
-        y_true_length = tf.expand_dims(y_true_length, axis=1)
+        with trace("ctc_loss"):
+            # CTC is always calculated in float32 to be numerically stable with mixed precision
+            y_pred = tf.cast(y_pred, tf.float32)
+            y_true = tf.cast(y_true, tf.int32)
 
-        y_pred_shape = tf.shape(y_pred)
-        y_pred_length = tf.fill((y_pred_shape[0], 1), y_pred_shape[1])
+            y_true_length = self._get_length(y_true, self.true_labels_padding_value)
+            y_pred_length = self._get_length(tf.reduce_sum(y_pred, axis=-1), padding_vale=0.0)
 
-        loss = tf.keras.backend.ctc_batch_cost(y_true, y_pred, y_pred_length, y_true_length)
-        return tf.squeeze(loss)
+            # Padding is replaced with a valid label, since it may be out of the range of classes
+            if self.true_labels_padding_value is not None:
+                y_true = tf.where(tf.not_equal(y_true, self.true_labels_padding_value), y_true, 0)
 
-    def _get_length(self, sequences, padding_vale=None):
-        sequences_shape = tf.shape(sequences)
-        sequences_count = sequences_shape[0]
-        max_sequence_length = sequences_shape[1]
+            if not self.jit_compile:
+                loss = tf.keras.backend.ctc_batch_cost(y_true, y_pred, y_pred_length[:, tf.newaxis],
+                                                       y_true_length[:, tf.newaxis])
+                return tf.squeeze(loss, axis=1)
+            return tf.nn.ctc_loss(y_true, tf.math.log(y_pred + self.EPSILON), y_true_length, y_pred_length,
+                                  logits_time_major=False, blank_index=-1)
 
+    def _get_length(self, sequences, padding_vale=None):
         if padding_vale is None:
-            return tf.fill((sequences_count,), max_sequence_length)
+            not_padding = tf.ones_like(sequences, dtype=tf.int32)
         else:
             not_padding = tf.not_equal(sequences, padding_vale)
             not_padding = tf.cast(not_padding, tf.int32)
-            return tf.reduce_sum(not_padding, axis=1)
+        return tf.reduce_sum(not_padding, axis=1)
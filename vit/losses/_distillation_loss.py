@@ -0,0 +1,52 @@
+"""Knowledge distillation loss."""
+import tensorflow as tf
+
+from vit.losses._ctc_loss import CTCLoss
+
+
+class DistillationLoss(CTCLoss):
+    """Combines CTC loss of true labels with Kullback-Leibler divergence between per-frame label distributions of a
+    teacher and a student model (Hinton et al., 2015): (1 - kl_weight) * CTC + kl_weight * temperature^2 * KL.
+
+    Since Keras passes a single y_true tensor to a loss, y_true is a [batch, frames, classes + 1] tensor of teacher
+    log-probabilities followed by true labels padded to the number of frames (see pack_targets()). KL divergence is
+    summed over frames like CTC loss, padding frames of predictions (see vit.layers.ApplyMask) are ignored.
+
+    :param true_labels_padding_value: A padding value that is used for true labels.
+    :param kl_weight: Weight of the KL divergence term in [0, 1].
+    :param temperature: Temperature that is applied to distributions of both models before calculating KL divergence.
+    :param reduction: Reduction argument for the base tf.keras.losses.Loss class.
+    :param name: Optional name for the op.
+    """
+
+    def __init__(self, true_labels_padding_value=-1, kl_weight=0.5, temperature=1.0,
+                 reduction=tf.losses.Reduction.AUTO, name=None):
+        super().__init__(true_labels_padding_value=true_labels_padding_value, reduction=reduction, name=name)
+        self.kl_weight = kl_weight
+        self.temperature = temperature
+
+    def call(self, y_true, y_pred):
+        ctc_loss = super().call(y_true[..., -1], y_pred)
+
+        # Distributions are softened by dividing log-probabilities by the temperature
+        y_pred = tf.cast(y_pred, tf.float32)
+        teacher_log_probs = tf.nn.log_softmax(tf.cast(y_true[..., :-1], tf.float32) / self.temperature)
+        student_log_probs = tf.nn.log_softmax(tf.math.log(y_pred + self.EPSILON) / self.temperature)
+        kl_divergence = tf.reduce_sum(tf.exp(teacher_log_probs) * (teacher_log_probs - student_log_probs), axis=-1)
+        kl_divergence = tf.reduce_sum(tf.where(tf.reduce_sum(y_pred, axis=-1) > 0, kl_divergence, 0.0), axis=1)
+
+        return (1 - self.kl_weight) * ctc_loss + self.kl_weight * self.temperature**2 * kl_divergence
+
+    def pack_targets(self, labels, teacher_log_probs):
+        """Packs a batch of true labels and teacher log-probabilities into a y_true tensor of the loss.
+
+        :param labels: A [batch, max_length] tensor of true labels padded with true_labels_padding_value, where
+            max_length doesn't exceed the number of frames.
+        :param teacher_log_probs: A [batch, frames, classes] tensor of log-probabilities of the teacher.
+        :return: A [batch, frames, classes + 1] float32 tensor.
+        """
+        frames_count = tf.shape(teacher_log_probs)[1]
+        labels = tf.pad(labels, [[0, 0], [0, frames_count - tf.shape(labels)[1]]],
+                        constant_values=self.true_labels_padding_value)
+        return tf.concat([tf.cast(teacher_log_probs, tf.float32), tf.cast(labels, tf.float32)[..., tf.newaxis]],
+                         axis=-1)
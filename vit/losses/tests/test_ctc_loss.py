@@ -35,3 +35,42 @@ def test_call__output_values_are_correct():
 
     # A sanity check that a bad prediction produces a much higher loss than the good one
     assert bad_loss / good_loss > 1E6
+
+
+def test_call__mixed_precision_predictions():
+    classes_count = 10
+    y_true = [[4, 2]]
+    y_pred = tf.nn.softmax(tf.random.normal([1, 5, classes_count + 1]))
+    ctc_loss = CTCLoss()
+
+    loss = ctc_loss(y_true, y_pred)
+    float16_loss = ctc_loss(y_true, tf.cast(y_pred, tf.float16))
+
+    assert float16_loss.dtype == tf.float32
+    assert abs(float16_loss - loss) / loss < 1E-2
+
+
+def test_call__zero_frames_are_treated_as_padding():
+    classes_count = 10
+    y_true = [[4, 2], [1, 1]]
+    y_pred = tf.nn.softmax(tf.random.normal([2, 5, classes_count + 1]))
+    padded_y_pred = tf.pad(y_pred, [[0, 0], [0, 3], [0, 0]])
+    ctc_loss = CTCLoss(reduction="none")
+
+    loss = ctc_loss(y_true, y_pred)
+    padded_loss = ctc_loss(y_true, padded_y_pred)
+
+    assert tf.reduce_max(tf.abs(padded_loss - loss)) < 1E-5
+
+
+def test_call__dense_and_sparse_implementations_match():
+    classes_count = 10
+    padding_value = -1
+    y_true = [[4, 2, padding_value], [1, 1, 3]]
+    y_pred = tf.pad(tf.nn.softmax(tf.random.normal([2, 6, classes_count + 1])), [[0, 0], [0, 2], [0, 0]])
+
+    loss = CTCLoss(true_labels_padding_value=padding_value, reduction="none")(y_true, y_pred)
+    dense_loss = CTCLoss(true_labels_padding_value=padding_value, jit_compile=True, reduction="none")(y_true, y_pred)
+
+    assert loss.shape == dense_loss.shape == [2]
+    assert tf.reduce_max(tf.abs(loss - dense_loss)) < 1E-4
@@ -0,0 +1,47 @@
+"""Tests for the DistillationLoss."""
+import numpy as np
+import tensorflow as tf
+
+from numpy.testing import assert_allclose
+
+from vit.losses import CTCLoss, DistillationLoss
+
+
+CLASSES_COUNT = 10
+Y_TRUE = tf.constant([[4, 2, -1], [1, 1, 3]])
+
+
+def test_call__without_kl_term_equals_ctc_loss():
+    y_pred = tf.nn.softmax(tf.random.normal([2, 8, CLASSES_COUNT + 1]))
+    teacher_log_probs = tf.nn.log_softmax(tf.random.normal([2, 8, CLASSES_COUNT + 1]))
+    distillation_loss = DistillationLoss(kl_weight=0.0, reduction="none")
+
+    loss = distillation_loss(distillation_loss.pack_targets(Y_TRUE, teacher_log_probs), y_pred)
+
+    assert_allclose(loss, CTCLoss(true_labels_padding_value=-1, reduction="none")(Y_TRUE, y_pred), rtol=1E-5)
+
+
+def test_call__kl_term_is_zero_for_the_same_distributions():
+    logits = tf.random.normal([2, 8, CLASSES_COUNT + 1])
+    distillation_loss = DistillationLoss(kl_weight=0.5, temperature=2.0, reduction="none")
+    ctc_loss = CTCLoss(true_labels_padding_value=-1, reduction="none")
+
+    same_loss = distillation_loss(distillation_loss.pack_targets(Y_TRUE, tf.nn.log_softmax(logits)),
+                                  tf.nn.softmax(logits))
+    different_loss = distillation_loss(distillation_loss.pack_targets(Y_TRUE, tf.nn.log_softmax(-logits)),
+                                       tf.nn.softmax(logits))
+
+    assert_allclose(same_loss, 0.5 * ctc_loss(Y_TRUE, tf.nn.softmax(logits)), rtol=1E-4)
+    assert np.all(different_loss > same_loss)
+
+
+def test_call__zero_frames_are_treated_as_padding():
+    y_pred = tf.nn.softmax(tf.random.normal([2, 8, CLASSES_COUNT + 1]))
+    teacher_log_probs = tf.nn.log_softmax(tf.random.normal([2, 10, CLASSES_COUNT + 1]))
+    distillation_loss = DistillationLoss(reduction="none")
+
+    loss = distillation_loss(distillation_loss.pack_targets(Y_TRUE, teacher_log_probs[:, :8]), y_pred)
+    padded_loss = distillation_loss(distillation_loss.pack_targets(Y_TRUE, teacher_log_probs),
+                                    tf.pad(y_pred, [[0, 0], [0, 2], [0, 0]]))
+
+    assert_allclose(padded_loss, loss, rtol=1E-5)
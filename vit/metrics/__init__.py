@@ -1,2 +1,4 @@
 """Metrics."""
+from ._greedy_decoding import GreedyDecoding
 from ._ctc_accuracy import CTCAccuracy
+from ._edit_distance import CharacterErrorRate, NormalizedEditDistance
@@ -1,53 +1,56 @@
 """CTC accuracy."""
 import tensorflow as tf
 
+from vit.metrics._greedy_decoding import GreedyDecoding
+
 
 class CTCAccuracy(tf.keras.metrics.Mean):
     """Calculates how often a predicted text fully matches the corresponding true text.
 
+    Predictions are decoded greedily with dense operations only (see GreedyDecoding), so the metric can be compiled
+    with XLA (jit_compile=True) and doesn't depend on the length of true labels in Python. Frames of predictions where
+    all probabilities are zeros (see vit.layers.ApplyMask) are treated as padding.
+
     :param true_labels_padding_value:  A padding value that was used for true labels (None if there is no padding, only
         padding at the end of a sequence is supported).
     :param name: A string name of the metric instance.
+    :param update_every: The metric is updated only on every update_every-th batch while skipping of batches is enabled
+        (see GreedyDecoding), which reduces its cost in training.
+    :param decoding: A GreedyDecoding instance shared with other metrics (e.g. CharacterErrorRate), so that predictions
+        are decoded once for all of them (if not None, true_labels_padding_value and update_every are ignored).
     """
 
-    # An unknown character token returned by ctc_decode(), which also serves as a padding constant
-    DECODE_PADDING_VALUE = -1
-
-    def __init__(self, true_labels_padding_value=None, name="accuracy"):
+    def __init__(self, true_labels_padding_value=None, name="accuracy", update_every=1, decoding=None):
         super().__init__(name=name)
-        self.true_labels_padding_value = true_labels_padding_value
+        if decoding is None:
+            decoding = GreedyDecoding(true_labels_padding_value, update_every)
+        self.decoding = decoding
 
     def update_state(self, y_true, y_pred, sample_weight=None):
-        y_pred_shape = tf.shape(y_pred)
-        y_true_shape = tf.shape(y_true)
-
-        y_pred_length = tf.fill((y_pred_shape[0],), y_pred_shape[1])
-        y_pred = tf.keras.backend.ctc_decode(y_pred, y_pred_length)[0][0]
-        y_pred_shape = y_pred_shape[:-1]  # y_pred shape after the decoding loses the last dimension (classes count)
-
-        # If y_true is padded, update it to use the same padding constant as y_pred_decoded
-        if self.true_labels_padding_value is not None and \
-           self.true_labels_padding_value != CTCAccuracy.DECODE_PADDING_VALUE:
-            y_true = tf.where(tf.not_equal(y_true, self.true_labels_padding_value),
-                              y_true, tf.fill(y_true_shape, CTCAccuracy.DECODE_PADDING_VALUE))
-
-        # Pad y_true or y_pred so that they have the same max sequence length
-        if y_true_shape[1] < y_pred_shape[1]:
-            y_true = tf.pad(y_true, paddings=[[0, 0], [0, y_pred_shape[1] - y_true_shape[1]]],
-                            constant_values=CTCAccuracy.DECODE_PADDING_VALUE)
-            y_true_shape = y_pred_shape
-        elif y_pred_shape[1] < y_true_shape[1]:
-            y_pred = tf.pad(y_pred, paddings=[[0, 0], [0, y_true_shape[1] - y_pred_shape[1]]],
-                            constant_values=CTCAccuracy.DECODE_PADDING_VALUE)
-            y_pred_shape = y_true_shape
-
-        # ctc_decode() returns y_pred of int64 type and if y_true is int32, that will cause an error in tf.equal(), so
-        # we need to cast y_pred to the same type
-        if y_pred.dtype != y_true.dtype:
-            y_pred = tf.cast(y_pred, y_true.dtype)
-
-        matching_labels_count = tf.reduce_sum(tf.cast(tf.equal(y_true, y_pred), tf.int32), axis=1)
-        # A prediction considered correct if all its labels match the corresponding true sequence
-        correct_predictions = tf.equal(matching_labels_count, y_true_shape[1])
-
-        super().update_state(tf.cast(correct_predictions, tf.int32), sample_weight)
+        true_labels, true_length, decoded_labels, decoded_length, weights = self.decoding(y_true, y_pred)
+
+        # Decoded labels are truncated or padded to the length of true labels, since predictions with more labels are
+        # wrong anyway
+        max_length = tf.shape(true_labels)[1]
+        decoded_labels = tf.pad(decoded_labels[:, :max_length],
+                                [[0, 0], [0, tf.maximum(max_length - tf.shape(decoded_labels)[1], 0)]],
+                                constant_values=-1)
+
+        # A prediction considered correct if it has the same length as the true sequence and all its labels match
+        correct_predictions = tf.logical_and(tf.reduce_all(tf.equal(decoded_labels, true_labels), axis=1),
+                                             tf.equal(decoded_length, true_length))
+
+        super().update_state(tf.cast(correct_predictions, tf.int32), combine_weights(weights, sample_weight))
+
+    def reset_state(self):
+        super().reset_state()
+        self.decoding.reset()
+
+
+def combine_weights(decoding_weights, sample_weight):
+    """Multiplies weights of GreedyDecoding by sample weights (either of them can be None)."""
+    if sample_weight is None:
+        return decoding_weights
+    if decoding_weights is None:
+        return sample_weight
+    return decoding_weights * tf.cast(tf.reshape(sample_weight, [-1]), tf.float32)
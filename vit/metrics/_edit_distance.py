@@ -0,0 +1,83 @@
+"""Edit distance metrics."""
+import tensorflow as tf
+
+from vit.metrics._ctc_accuracy import combine_weights
+from vit.metrics._greedy_decoding import GreedyDecoding, to_sparse
+
+
+class CharacterErrorRate(tf.keras.metrics.Metric):
+    """Calculates the character error rate: the total edit distance between predicted and true texts divided by the
+    total length of true texts.
+
+    Edit distance is calculated by tf.edit_distance(), which doesn't support XLA, so the metric can't be used with
+    jit_compile=True.
+
+    :param true_labels_padding_value:  A padding value that was used for true labels (None if there is no padding, only
+        padding at the end of a sequence is supported).
+    :param name: A string name of the metric instance.
+    :param update_every: The metric is updated only on every update_every-th batch while skipping of batches is enabled
+        (see GreedyDecoding), which reduces its cost in training.
+    :param decoding: A GreedyDecoding instance shared with other metrics (e.g. CTCAccuracy), so that predictions are
+        decoded once for all of them (if not None, true_labels_padding_value and update_every are ignored).
+    """
+
+    def __init__(self, true_labels_padding_value=None, name="cer", update_every=1, decoding=None):
+        super().__init__(name=name)
+        if decoding is None:
+            decoding = GreedyDecoding(true_labels_padding_value, update_every)
+        self.decoding = decoding
+        self.errors = self.add_weight("errors", initializer="zeros")
+        self.chars = self.add_weight("chars", initializer="zeros")
+
+    def update_state(self, y_true, y_pred, sample_weight=None):
+        true_labels, true_length, decoded_labels, _, weights = self.decoding(y_true, y_pred)
+        distance = tf.edit_distance(to_sparse(decoded_labels), to_sparse(true_labels), normalize=False)
+        true_length = tf.cast(true_length, tf.float32)
+
+        weights = combine_weights(weights, sample_weight)
+        if weights is not None:
+            distance *= weights
+            true_length *= weights
+        self.errors.assign_add(tf.reduce_sum(distance))
+        self.chars.assign_add(tf.reduce_sum(true_length))
+
+    def result(self):
+        return tf.math.divide_no_nan(self.errors, self.chars)
+
+    def reset_state(self):
+        super().reset_state()
+        self.decoding.reset()
+
+
+class NormalizedEditDistance(tf.keras.metrics.Mean):
+    """Calculates the mean normalized edit distance: the edit distance between a predicted and a true text divided by
+    the length of the longer of them, as in the ICDAR 2019 robust reading challenges (where 1 - NED is reported).
+
+    Edit distance is calculated by tf.edit_distance(), which doesn't support XLA, so the metric can't be used with
+    jit_compile=True.
+
+    :param true_labels_padding_value:  A padding value that was used for true labels (None if there is no padding, only
+        padding at the end of a sequence is supported).
+    :param name: A string name of the metric instance.
+    :param update_every: The metric is updated only on every update_every-th batch while skipping of batches is enabled
+        (see GreedyDecoding), which reduces its cost in training.
+    :param decoding: A GreedyDecoding instance shared with other metrics (e.g. CTCAccuracy), so that predictions are
+        decoded once for all of them (if not None, true_labels_padding_value and update_every are ignored).
+    """
+
+    def __init__(self, true_labels_padding_value=None, name="ned", update_every=1, decoding=None):
+        super().__init__(name=name)
+        if decoding is None:
+            decoding = GreedyDecoding(true_labels_padding_value, update_every)
+        self.decoding = decoding
+
+    def update_state(self, y_true, y_pred, sample_weight=None):
+        true_labels, true_length, decoded_labels, decoded_length, weights = self.decoding(y_true, y_pred)
+        distance = tf.edit_distance(to_sparse(decoded_labels), to_sparse(true_labels), normalize=False)
+        max_length = tf.cast(tf.maximum(true_length, decoded_length), tf.float32)
+
+        super().update_state(tf.math.divide_no_nan(distance, max_length), combine_weights(weights, sample_weight))
+
+    def reset_state(self):
+        super().reset_state()
+        self.decoding.reset()
@@ -0,0 +1,90 @@
+"""Greedy CTC decoding shared by metrics."""
+import tensorflow as tf
+
+from vit.decoding._decoders import decode_greedily
+
+
+class GreedyDecoding:
+    """Greedily decodes CTC predictions for metrics.
+
+    Decoded labels of a batch are cached, so metrics that share a GreedyDecoding instance and are updated with the same
+    y_true and y_pred tensors (as metrics passed to model.compile()) decode predictions only once. Decoding uses dense
+    operations only, so it can be compiled with XLA.
+
+    In training, decoding may be done only on every update_every-th batch, other batches get zero weights, so that
+    metrics aren't updated with them. Batches are skipped only while skipping is enabled with set_skipping() (e.g. by
+    the vit.callbacks.SkipMetricBatches callback in fit()), so evaluation decodes every batch by default. Frames of
+    predictions where all probabilities are zeros (see vit.layers.ApplyMask) are treated as padding.
+
+    :param true_labels_padding_value: A padding value that was used for true labels (None if there is no padding, only
+        padding at the end of a sequence is supported).
+    :param update_every: Predictions are decoded on every update_every-th batch while skipping is enabled.
+    """
+
+    def __init__(self, true_labels_padding_value=None, update_every=1):
+        self.true_labels_padding_value = true_labels_padding_value
+        self.update_every = update_every
+        # Every replica counts its own batches
+        self.batches_count = tf.Variable(0, dtype=tf.int64, trainable=False,
+                                         synchronization=tf.VariableSynchronization.ON_READ,
+                                         aggregation=tf.VariableAggregation.ONLY_FIRST_REPLICA)
+        self.skipping = tf.Variable(False, trainable=False)
+
+        self._cached_inputs = None
+        self._cached_outputs = None
+
+    def __call__(self, y_true, y_pred):
+        """Decodes a batch of predictions (or returns decoded labels that are cached for the same tensors).
+
+        :param y_true: A [batch, max_length] tensor of true labels.
+        :param y_pred: A [batch, frames, classes] tensor of probabilities.
+        :return: A tuple of:
+            - a [batch, max_length] int32 tensor of true labels padded with -1 and a [batch] tensor of their lengths;
+            - a [batch, frames] int32 tensor of decoded labels padded with -1 and a [batch] tensor of their lengths;
+            - a [batch] float32 tensor of weights, which are zeros for batches that weren't decoded (None if
+              update_every is 1).
+        """
+        if self._cached_inputs is not None and self._cached_inputs[0] is y_true and self._cached_inputs[1] is y_pred:
+            return self._cached_outputs
+
+        # Inputs are cached before the cast, which creates a new tensor for labels of other dtypes
+        inputs = (y_true, y_pred)
+        y_true = tf.cast(y_true, tf.int32)
+        if self.true_labels_padding_value is None:
+            true_mask = tf.ones_like(y_true, tf.bool)
+        else:
+            true_mask = tf.not_equal(y_true, self.true_labels_padding_value)
+        true_labels = tf.where(true_mask, y_true, -1)
+        true_length = tf.reduce_sum(tf.cast(true_mask, tf.int32), axis=1)
+
+        if self.update_every == 1:
+            outputs = (true_labels, true_length) + decode_greedily(y_pred) + (None,)
+        else:
+            is_decoded = tf.logical_or(tf.logical_not(self.skipping),
+                                       (self.batches_count.assign_add(1) - 1) % self.update_every == 0)
+            batch_size = tf.shape(y_pred)[0]
+
+            def skip():
+                return tf.fill(tf.shape(y_pred)[:2], -1), tf.zeros([batch_size], tf.int32)
+
+            decoded_labels, decoded_length = tf.cond(is_decoded, lambda: decode_greedily(y_pred), skip)
+            weights = tf.fill([batch_size], tf.cast(is_decoded, tf.float32))
+            outputs = (true_labels, true_length, decoded_labels, decoded_length, weights)
+
+        self._cached_inputs = inputs
+        self._cached_outputs = outputs
+        return outputs
+
+    def set_skipping(self, enabled):
+        """Enables or disables skipping of batches (e.g. in training and in evaluation respectively)."""
+        self.skipping.assign(enabled)
+
+    def reset(self):
+        """Resets the count of batches, so that the first batch after a reset of metrics is decoded."""
+        self.batches_count.assign(0)
+
+
+def to_sparse(labels):
+    """Converts a tensor of labels padded with -1 to a tf.SparseTensor."""
+    indices = tf.where(labels >= 0)
+    return tf.SparseTensor(indices, tf.gather_nd(labels, indices), tf.shape(labels, out_type=tf.int64))
@@ -3,13 +3,17 @@ import tensorflow as tf
 
 import pytest
 
+from numpy.testing import assert_allclose
+
+from vit.losses import CTCLoss
 from vit.metrics import CTCAccuracy
 
 
 # padding_value argument is used to check that CTCAccuracy works if y_true padding value both equal and not equal to the
 # ctc_decode()'s unknown character and padding token
 @pytest.mark.parametrize("padding_value", (-1, -2))
-def test_result(padding_value):
+@pytest.mark.parametrize("dtype", (tf.float32, tf.float16, tf.bfloat16))
+def test_result(padding_value, dtype):
     classes_count = 10
 
     test_batches = [
@@ -35,7 +39,75 @@ def test_result(padding_value):
     ctc_accuracy = CTCAccuracy(true_labels_padding_value=padding_value)
 
     for y_true, y_pred in test_batches:
-        ctc_accuracy.update_state(y_true, tf.one_hot(y_pred, classes_count + 1))
+        ctc_accuracy.update_state(y_true, tf.one_hot(y_pred, classes_count + 1, dtype=dtype))
     accuracy = ctc_accuracy.result()
 
     assert accuracy == 0.5
+
+
+def test_result__zero_frames_are_treated_as_padding():
+    classes_count = 10
+    y_true = [[4, 2, -1], [0, 0, -1]]
+    y_pred = tf.one_hot([[4, classes_count, 2], [0, classes_count, 0]], classes_count + 1)
+    # Zero frames would be decoded as label 0 if they weren't treated as padding
+    padded_y_pred = tf.pad(y_pred, [[0, 0], [0, 2], [0, 0]])
+    ctc_accuracy = CTCAccuracy(true_labels_padding_value=-1)
+
+    ctc_accuracy.update_state(y_true, padded_y_pred)
+
+    assert ctc_accuracy.result() == 1.0
+
+
+def test_result__only_every_nth_batch_is_counted():
+    classes_count = 10
+    y_true = [[4, 2]]
+    correct_y_pred = tf.one_hot([[4, classes_count, 2]], classes_count + 1)
+    wrong_y_pred = tf.one_hot([[4, classes_count, 3]], classes_count + 1)
+    ctc_accuracy = CTCAccuracy(update_every=2)
+    ctc_accuracy.decoding.set_skipping(True)
+
+    @tf.function
+    def update_state(y_true, y_pred):
+        ctc_accuracy.update_state(y_true, y_pred)
+
+    for y_pred in (correct_y_pred, wrong_y_pred, correct_y_pred, wrong_y_pred, correct_y_pred):
+        update_state(y_true, y_pred)
+
+    assert ctc_accuracy.result() == 1.0
+    assert ctc_accuracy.count == 3
+
+
+def test_result__reset_state_resets_skipped_batches():
+    classes_count = 10
+    y_true = [[4, 2]]
+    correct_y_pred = tf.one_hot([[4, classes_count, 2]], classes_count + 1)
+    wrong_y_pred = tf.one_hot([[4, classes_count, 3]], classes_count + 1)
+    ctc_accuracy = CTCAccuracy(update_every=2)
+    ctc_accuracy.decoding.set_skipping(True)
+    ctc_accuracy.update_state(y_true, correct_y_pred)
+
+    ctc_accuracy.reset_state()
+    ctc_accuracy.update_state(y_true, wrong_y_pred)
+
+    assert ctc_accuracy.result() == 0.0
+    assert ctc_accuracy.count == 1
+
+
+def test_evaluate__every_batch_is_decoded_with_update_every():
+    classes_count = 10
+    y_true = tf.constant([[4, 2], [4, 2], [4, 2]])
+    # Only the first sample is predicted correctly
+    y_pred = tf.one_hot([[4, classes_count, 2], [4, classes_count, 3], [4, classes_count, 3]], classes_count + 1,
+                        on_value=0.9, off_value=0.01)
+    model = tf.keras.Sequential([tf.keras.Input([3, classes_count + 1]),
+                                 tf.keras.layers.Dense(classes_count + 1, use_bias=False,
+                                                       kernel_initializer="identity")])
+
+    results = []
+    for update_every in (1, 2):
+        model.compile(loss=CTCLoss(), metrics=[CTCAccuracy(update_every=update_every)])
+        # The second evaluation checks that batches counted by the first one don't affect it
+        for _ in range(2):
+            results.append(model.evaluate(y_pred, y_true, batch_size=1, verbose=0, return_dict=True)["accuracy"])
+
+    assert_allclose(results, [1 / 3] * 4, rtol=1E-6)
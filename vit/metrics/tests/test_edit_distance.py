@@ -0,0 +1,56 @@
+"""Tests for edit distance metrics."""
+import numpy as np
+import pytest
+import tensorflow as tf
+
+from numpy.testing import assert_allclose
+
+from vit.metrics import CharacterErrorRate, CTCAccuracy, GreedyDecoding, NormalizedEditDistance
+
+
+CLASSES_COUNT = 10
+BLANK = CLASSES_COUNT
+
+# Decoded as [0, 1, 2], [4, 2, 2] and [5]
+Y_TRUE = [[0, 1, 2], [4, 2, -1], [3, 5, 6]]
+Y_PRED = tf.one_hot([[0, 1, BLANK, 2, BLANK],
+                     [BLANK, 4, 2, BLANK, 2],
+                     [BLANK, 5, 5, BLANK, BLANK]], CLASSES_COUNT + 1)
+
+
+def test_character_error_rate__result():
+    cer = CharacterErrorRate(true_labels_padding_value=-1)
+
+    cer.update_state(Y_TRUE, Y_PRED)
+
+    # Edit distances are 0, 1 and 2 for 8 true characters
+    assert_allclose(cer.result(), 3 / 8)
+
+
+def test_normalized_edit_distance__result():
+    ned = NormalizedEditDistance(true_labels_padding_value=-1)
+
+    ned.update_state(Y_TRUE, Y_PRED)
+
+    assert_allclose(ned.result(), np.mean([0, 1 / 3, 2 / 3]), rtol=1E-6)
+
+
+@pytest.mark.parametrize("labels_dtype", (tf.int32, tf.int64))
+def test_greedy_decoding__shared_metrics_decode_once(labels_dtype):
+    decoding = GreedyDecoding(true_labels_padding_value=-1, update_every=2)
+    decoding.set_skipping(True)
+    metrics = [CTCAccuracy(decoding=decoding), CharacterErrorRate(decoding=decoding),
+               NormalizedEditDistance(decoding=decoding)]
+    y_true = tf.constant(Y_TRUE, labels_dtype)
+
+    @tf.function
+    def update_state():
+        for metric in metrics:
+            metric.update_state(y_true, Y_PRED)
+
+    update_state()
+    update_state()
+
+    assert decoding.batches_count == 2
+    assert_allclose([metric.result() for metric in metrics], [1 / 3, 3 / 8, np.mean([0, 1 / 3, 2 / 3])], rtol=1E-6)
+    assert metrics[0].count == 3
@@ -0,0 +1,3 @@
+"""Tools for building and loading models."""
+from ._vit_str import build_vit_str, load_vit_str, cast_model
+from ._legacy_weights import load_legacy_weights
@@ -0,0 +1,39 @@
+"""Loading of weights saved by previous versions of the layers."""
+import h5py
+import numpy as np
+
+
+def load_legacy_weights(model, filepath):
+    """Loads weights from an HDF5 file that was saved by model.save_weights() with previous versions of the layers
+    (e.g. before the output projection of multi-headed attention was created in build()), converting them when
+    necessary.
+
+    Layers are matched by their order, as tf.keras.Model.load_weights() does for HDF5 files. Weights of layers that
+    have a convert_legacy_weights() method are converted if their count doesn't match the current one.
+
+    :param model: A built model with the same architecture as the one that saved the weights.
+    :param filepath: Path to the HDF5 file.
+    """
+    with h5py.File(filepath, "r") as f:
+        if "model_weights" in f:
+            f = f["model_weights"]
+        saved_layers_weights = [load_layer_weights(f[name]) for name in decode_names(f.attrs["layer_names"])]
+
+    saved_layers_weights = [weights for weights in saved_layers_weights if weights]
+    layers = [layer for layer in model.layers if layer.weights]
+    if len(layers) != len(saved_layers_weights):
+        raise ValueError(f"The model has {len(layers)} layers with weights, but the file contains weights for "
+                         f"{len(saved_layers_weights)} layers")
+
+    for layer, weights in zip(layers, saved_layers_weights):
+        if len(weights) != len(layer.weights) and hasattr(layer, "convert_legacy_weights"):
+            weights = layer.convert_legacy_weights(weights)
+        layer.set_weights(weights)
+
+
+def load_layer_weights(group):
+    return [np.asarray(group[name]) for name in decode_names(group.attrs["weight_names"])]
+
+
+def decode_names(names):
+    return [name.decode("utf8") if hasattr(name, "decode") else name for name in names]
@@ -0,0 +1,117 @@
+"""ViT-STR model as it is trained in the MJSynth notebook."""
+import tensorflow as tf
+
+import datasets
+import vit
+
+
+def build_vit_str(num_classes, image_height, image_channels, image_width=None, patch_width=4, num_layers=5,
+                  model_dim=512, num_heads=8, mlp_dim=2048, dropout=0.1, max_positions=None, learned_positions=False,
+                  exit_layers=None, masking=False, attention_block_size=None, attention_window=None, global_tokens=0,
+                  recompute=False, dtype=None):
+    """Builds a ViT model for scene text recognition, that outputs per-patch probabilities of CTC labels.
+
+    :param num_classes: Number of output classes including the CTC blank label.
+    :param image_height: Height of input images.
+    :param image_channels: Number of channels of input images.
+    :param image_width: Width of input images (None allows images of any width that is a multiple of patch_width).
+    :param patch_width: Width of image patches.
+    :param num_layers: Number of encoder layers.
+    :param model_dim: Encoder dimensionality.
+    :param num_heads: Number of attention heads.
+    :param mlp_dim: Encoder MLP inner layer dimensionality.
+    :param dropout: Rate of dropout to apply.
+    :param max_positions: Maximal number of patches (required if image_width is None).
+    :param learned_positions: Whether to use learned positional embeddings instead of the sinusoidal encoding.
+    :param exit_layers: Numbers of encoder layers after which early exit heads are attached (see
+        vit.inference.EarlyExitModel). Every head is a single softmax layer, that is trained with an auxiliary CTC loss,
+        e.g. model.compile(loss=CTCLoss(), loss_weights=[0.3] * len(exit_layers) + [1.0]).
+    :param masking: Whether patches of images that consist of padding (datasets.IMAGE_PADDING_VALUE) should be masked,
+        e.g. for images with preserved aspect ratio batched by datasets.bucket_by_image_width(). Masked patches aren't
+        attended to and their output probabilities are zeros, which CTCLoss and decoders treat as padding.
+    :param attention_block_size: If not None, attention is calculated over blocks of attention_block_size patches
+        without storing full attention matrices (see vit.layers.MultiHeadAttention), e.g. for wide images.
+    :param attention_window: If not None, every patch attends only to patches that are at most attention_window patches
+        away from it, so the cost of attention grows linearly with the image width (see vit.layers.MultiHeadAttention).
+    :param global_tokens: Number of learned tokens that are attended to by all patches and attend to all of them, which
+        pass global context between distant patches with local attention (see vit.layers.TransformerEncoder).
+    :param recompute: Whether activations of encoder layers should be recomputed during the backward pass instead of
+        being stored (see vit.layers.TransformerEncoder), which allows larger batches with the same memory.
+    :param dtype: Dtype policy of the model (e.g. "mixed_bfloat16"), the output layer always computes in float32 to
+        produce numerically stable probabilities.
+    :return: A tf.keras.Sequential model or, if exit_layers is not None, a functional model that outputs a list of
+        probabilities of exit heads followed by the final probabilities.
+    """
+    layers = [
+        tf.keras.Input(shape=(image_height, image_width, image_channels)),
+        vit.layers.HorizontalPatching(patch_width, image_height, image_channels,
+                                      padding_value=datasets.IMAGE_PADDING_VALUE if masking else None, dtype=dtype),
+        tf.keras.layers.Dense(model_dim, dtype=dtype),
+        vit.layers.PositionalEncoding(max_positions, learned=learned_positions, dtype=dtype),
+        vit.layers.SeededDropout(dropout, dtype=dtype),
+        vit.layers.TransformerEncoder(num_layers, model_dim, num_heads, mlp_dim, mha_block_size=attention_block_size,
+                                      mha_attention_window=attention_window, global_tokens=global_tokens,
+                                      dropout=dropout, exit_layers=exit_layers, recompute=recompute, dtype=dtype)
+    ]
+
+    def build_head(name=None):
+        head = [tf.keras.layers.Dense(num_classes, activation="softmax", dtype="float32", name=name)]
+        if masking:
+            head.append(vit.layers.ApplyMask(dtype="float32"))
+        return head
+
+    if exit_layers is None:
+        return tf.keras.Sequential(layers + build_head())
+
+    inputs = x = layers[0]
+    for layer in layers[1:]:
+        x = layer(x)
+    heads = [build_head(f"exit_{i}") for i in sorted(exit_layers)] + [build_head()]
+    outputs = []
+    for head, head_x in zip(heads, x):
+        for layer in head:
+            head_x = layer(head_x)
+        outputs.append(head_x)
+    return tf.keras.Model(inputs, outputs)
+
+
+def load_vit_str(path):
+    """Loads a saved model built by build_vit_str(), restoring its vit layers as instances of their classes (rather
+    than generic revived layers), e.g. so that vit.inference.EarlyExitModel can find its TransformerEncoder.
+
+    :param path: Path to a saved model.
+    :return: An uncompiled model.
+    """
+    custom_objects = {name: obj for name, obj in vars(vit.layers).items()
+                      if isinstance(obj, type) and issubclass(obj, tf.keras.layers.Layer)}
+    return tf.keras.models.load_model(path, custom_objects=custom_objects, compile=False)
+
+
+def cast_model(model, dtype):
+    """Creates a copy of a model with a different dtype policy, e.g. to run inference in bfloat16 on CPUs that support
+    it. Weights are copied from the original model.
+
+    :param model: A model with layers that implement get_config().
+    :param dtype: Dtype policy of the new model (e.g. "mixed_bfloat16"), output layers keep their original policy to
+        produce numerically stable outputs.
+    :return: A new model.
+    """
+    kept_layer_names = set()
+    for name in model.output_names:
+        layer = model.get_layer(name)
+        kept_layer_names.add(layer.name)
+        # Output layers without weights (e.g. ApplyMask) only post-process outputs of the layers before them, which
+        # should also keep their policy
+        if not layer.weights:
+            kept_layer_names.update(inbound_layer.name
+                                    for inbound_layer in tf.nest.flatten(layer.inbound_nodes[0].inbound_layers))
+
+    def clone_layer(layer):
+        config = layer.get_config()
+        if layer.name not in kept_layer_names:
+            config["dtype"] = dtype
+        return layer.__class__.from_config(config)
+
+    cast = tf.keras.models.clone_model(model, clone_function=clone_layer)
+    cast.set_weights(model.get_weights())
+    return cast
@@ -0,0 +1,56 @@
+"""Tests for loading of legacy weights."""
+import numpy as np
+import tensorflow as tf
+
+from numpy.testing import assert_allclose
+
+import vit
+from vit.models import load_legacy_weights
+
+
+class LegacyMultiHeadAttention(tf.keras.layers.Layer):
+    """Multi-headed attention with Dense projections, as it was implemented before weights were created in build()."""
+
+    def __init__(self, num_heads, key_dim):
+        super().__init__()
+        self.num_heads = num_heads
+        self.dense_query = tf.keras.layers.Dense(num_heads * key_dim)
+        self.dense_value = tf.keras.layers.Dense(num_heads * key_dim)
+        self.dense_key = tf.keras.layers.Dense(num_heads * key_dim)
+        self.dense_output = None
+
+    def call(self, inputs):
+        if self.dense_output is None:
+            self.dense_output = tf.keras.layers.Dense(inputs.shape[-1])
+
+        def split_heads(x):
+            x = tf.reshape(x, [tf.shape(x)[0], tf.shape(x)[1], self.num_heads, -1])
+            return tf.transpose(x, [0, 2, 1, 3])
+
+        query = split_heads(self.dense_query(inputs))
+        value = split_heads(self.dense_value(inputs))
+        key = split_heads(self.dense_key(inputs))
+
+        attention = tf.matmul(query, key, transpose_b=True) / tf.math.sqrt(tf.cast(tf.shape(key)[-1], tf.float32))
+        context = tf.matmul(tf.nn.softmax(attention, axis=-1), value)
+        context = tf.transpose(context, [0, 2, 1, 3])
+        context = tf.reshape(context, [-1, tf.shape(context)[1], self.num_heads * tf.shape(context)[-1]])
+        return self.dense_output(context)
+
+
+def test_load_legacy_weights__outputs_match(tmp_path):
+    num_heads, key_dim, model_dim = 4, 8, 16
+    inputs = np.random.uniform(size=[2, 25, 12]).astype(np.float32)
+    legacy_model = tf.keras.Sequential([tf.keras.layers.Dense(model_dim),
+                                        LegacyMultiHeadAttention(num_heads, key_dim),
+                                        tf.keras.layers.Dense(5)])
+    legacy_model(inputs)
+    legacy_model.save_weights((tmp_path / "legacy.h5").as_posix())
+    model = tf.keras.Sequential([tf.keras.layers.Dense(model_dim),
+                                 vit.layers.MultiHeadAttention(num_heads, key_dim),
+                                 tf.keras.layers.Dense(5)])
+    model(inputs)
+
+    load_legacy_weights(model, tmp_path / "legacy.h5")
+
+    assert_allclose(model(inputs), legacy_model(inputs), rtol=1E-4, atol=1E-5)
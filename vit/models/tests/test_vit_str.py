@@ -0,0 +1,95 @@
+"""Tests for the ViT-STR model."""
+import numpy as np
+import pytest
+import tensorflow as tf
+
+import datasets
+import vit
+
+from numpy.testing import assert_allclose
+
+from vit.models import build_vit_str, cast_model
+
+
+def build_small_model():
+    return build_vit_str(num_classes=11, image_height=32, image_channels=1, image_width=100, num_layers=2,
+                         model_dim=32, num_heads=4, mlp_dim=64)
+
+
+def test_build_vit_str__output_shape_is_correct():
+    samples, patch_width = 4, 4
+    inputs = np.random.uniform(-1, 1, size=[samples, 32, 100, 1]).astype(np.float32)
+    model = build_small_model()
+
+    outputs = model(inputs)
+
+    assert outputs.shape == (samples, 100 // patch_width, 11)
+
+
+def test_cast_model__bfloat16_outputs_are_close_to_float32():
+    inputs = np.random.uniform(-1, 1, size=[16, 32, 100, 1]).astype(np.float32)
+    model = build_small_model()
+
+    bfloat16_model = cast_model(model, "mixed_bfloat16")
+    outputs = model(inputs).numpy()
+    bfloat16_outputs = bfloat16_model(inputs).numpy()
+
+    assert bfloat16_model.layers[1].compute_dtype == "bfloat16"
+    assert bfloat16_outputs.dtype == np.float32
+    assert_allclose(bfloat16_outputs, outputs, atol=0.05)
+    # Almost all per-patch predicted labels should stay the same
+    assert np.mean(bfloat16_outputs.argmax(axis=-1) == outputs.argmax(axis=-1)) > 0.95
+
+
+def test_build_vit_str__exit_heads_are_trained_with_auxiliary_loss():
+    exit_layers = [1, 2]
+    model = build_vit_str(num_classes=5, image_height=32, image_channels=1, image_width=100, num_layers=3,
+                          model_dim=16, num_heads=2, mlp_dim=32, exit_layers=exit_layers)
+    images = tf.random.uniform([4, 32, 100, 1], -1, 1)
+    labels = tf.constant([[0, 1], [2, -1], [3, 3], [1, -1]])
+
+    model.compile(optimizer="adam", loss=vit.losses.CTCLoss(true_labels_padding_value=-1),
+                  loss_weights=[0.3] * len(exit_layers) + [1.0])
+    history = model.fit(images, labels, epochs=1, verbose=0)
+
+    assert [output.shape for output in model(images)] == [[4, 25, 5]] * 3
+    assert len([name for name in history.history if name.endswith("_loss")]) == 3
+
+
+def test_cast_model__exit_heads_keep_float32():
+    model = build_vit_str(num_classes=5, image_height=32, image_channels=1, image_width=100, num_layers=2,
+                          model_dim=16, num_heads=2, mlp_dim=32, exit_layers=[1])
+
+    cast = cast_model(model, "mixed_bfloat16")
+
+    assert all(output.dtype == tf.float32 for output in cast(tf.zeros([1, 32, 100, 1])))
+    assert cast.layers[1].compute_dtype == "bfloat16"
+
+
+def test_cast_model__layers_before_weightless_outputs_keep_float32():
+    model = build_vit_str(num_classes=5, image_height=32, image_channels=1, image_width=100, num_layers=2,
+                          model_dim=16, num_heads=2, mlp_dim=32, masking=True)
+
+    cast = cast_model(model, "mixed_bfloat16")
+
+    assert [layer.compute_dtype for layer in cast.layers[-2:]] == ["float32", "float32"]
+    assert cast.layers[1].compute_dtype == "bfloat16"
+    assert cast(tf.zeros([1, 32, 100, 1])).dtype == tf.float32
+
+
+@pytest.mark.parametrize("attention_window, global_tokens", [(None, 0), (3, 0), (3, 2)])
+def test_build_vit_str__masked_padding_does_not_affect_outputs(attention_window, global_tokens):
+    patch_width, image_width, padded_width = 4, 40, 64
+    images = np.random.uniform(-1, 1, size=[2, 32, image_width, 1]).astype(np.float32)
+    padded_images = np.pad(images, [[0, 0], [0, 0], [0, padded_width - image_width], [0, 0]],
+                           constant_values=datasets.IMAGE_PADDING_VALUE)
+    model = build_vit_str(num_classes=5, image_height=32, image_channels=1, patch_width=patch_width, num_layers=2,
+                          model_dim=16, num_heads=2, mlp_dim=32, max_positions=16, masking=True,
+                          attention_window=attention_window, global_tokens=global_tokens)
+
+    outputs = model(images).numpy()
+    padded_outputs = model(padded_images).numpy()
+
+    valid_patches = image_width // patch_width
+    assert_allclose(padded_outputs[:, :valid_patches], outputs, atol=1E-5)
+    assert (padded_outputs[:, valid_patches:] == 0).all()
@@ -0,0 +1,2 @@
+"""Opt-in instrumentation for profiling of training and inference."""
+from ._tracing import trace, enable_tracing, is_tracing_enabled
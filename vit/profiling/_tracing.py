@@ -0,0 +1,46 @@
+"""Named trace annotations of model components."""
+import contextlib
+
+import tensorflow as tf
+
+
+_tracing_enabled = False
+
+
+def enable_tracing(enabled=True):
+    """Enables or disables trace annotations of vit components (attention, MLP, CTC loss, etc.).
+
+    Annotations are added when functions are traced, so tracing should be enabled before a model is built and its
+    train, test or predict functions are created.
+
+    :param enabled: Whether annotations should be added.
+    """
+    global _tracing_enabled
+    _tracing_enabled = enabled
+
+
+def is_tracing_enabled():
+    """Returns whether trace annotations are enabled."""
+    return _tracing_enabled
+
+
+@contextlib.contextmanager
+def trace(name):
+    """Annotates operations of a component with a name, if tracing is enabled (see enable_tracing()).
+
+    Operations that are created inside tf.function get the name as a name scope, so in the TensorBoard profiler their
+    time can be found and aggregated by the name (e.g. ops with "/attention/" in their names). In eager mode, the
+    component is also recorded as a tf.profiler trace event with the name.
+
+    :param name: A name of the component, which should be a valid name scope.
+    """
+    if not _tracing_enabled:
+        yield
+        return
+
+    with tf.name_scope(name):
+        if tf.executing_eagerly():
+            with tf.profiler.experimental.Trace(name):
+                yield
+        else:
+            yield
@@ -0,0 +1 @@
+"""Tests for the vit.profiling package."""
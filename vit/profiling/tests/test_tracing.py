@@ -0,0 +1,23 @@
+"""Tests for trace annotations."""
+import tensorflow as tf
+
+import vit
+
+
+def get_op_names(enabled):
+    vit.profiling.enable_tracing(enabled)
+    try:
+        model = vit.models.build_vit_str(6, 8, 1, image_width=32, num_layers=1, model_dim=16, num_heads=2, mlp_dim=32)
+        graph = tf.function(lambda images: model(images, training=False)).get_concrete_function(
+            tf.TensorSpec([None, 8, 32, 1])).graph
+    finally:
+        vit.profiling.enable_tracing(False)
+    return [op.name for op in graph.get_operations()]
+
+
+def test_trace__components_are_annotated_only_if_tracing_is_enabled():
+    op_names = get_op_names(enabled=True)
+    for name in ("patching", "positional_encoding", "attention", "mlp"):
+        assert any(f"/{name}/" in op_name for op_name in op_names), name
+
+    assert not any("/attention/" in op_name for op_name in get_op_names(enabled=False))
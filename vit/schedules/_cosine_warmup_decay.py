@@ -11,6 +11,10 @@ class CosineWarmupDecay(tf.keras.optimizers.schedules.LearningRateSchedule):
     """
 
     def __init__(self, base_value, total_steps, warmup_fraction):
+        self.base_value = base_value
+        self.total_steps = total_steps
+        self.warmup_fraction = warmup_fraction
+
         base_value = tf.cast(base_value, tf.float32)
         total_steps = tf.cast(total_steps, tf.float32)
         warmup_fraction = tf.cast(warmup_fraction, tf.float32)
@@ -28,4 +32,5 @@ class CosineWarmupDecay(tf.keras.optimizers.schedules.LearningRateSchedule):
                         self.cosine_decay(step - self.warmup_steps))
 
     def get_config(self):
-        raise NotImplementedError("CosineWarmupDecay currently doesn't have get_config() implementation")
+        return {"base_value": self.base_value, "total_steps": self.total_steps,
+                "warmup_fraction": self.warmup_fraction}
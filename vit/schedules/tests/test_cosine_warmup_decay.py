@@ -0,0 +1,27 @@
+"""Tests for the CosineWarmupDecay schedule."""
+import numpy as np
+import tensorflow as tf
+
+from numpy.testing import assert_allclose
+
+from vit.schedules import CosineWarmupDecay
+
+
+def test_call__warmup_and_decay():
+    schedule = CosineWarmupDecay(1.0, total_steps=100, warmup_fraction=0.1)
+
+    values = schedule(tf.range(101)).numpy()
+
+    assert_allclose(values[[0, 5, 10]], [0.0, 0.5, 1.0], atol=1E-6)
+    assert np.all(np.diff(values[10:]) <= 0)
+    assert abs(values[-1]) < 1E-6
+
+
+def test_from_config__restores_the_same_schedule():
+    schedule = CosineWarmupDecay(1E-3, total_steps=1000, warmup_fraction=0.1)
+
+    restored = CosineWarmupDecay.from_config(schedule.get_config())
+    serialized = tf.keras.optimizers.schedules.serialize(schedule)
+
+    assert_allclose(restored(tf.range(1000)), schedule(tf.range(1000)))
+    assert serialized["config"] == schedule.get_config()
@@ -0,0 +1 @@
+"""Tools for training models."""
@@ -0,0 +1,21 @@
+"""Trains a ViT-STR model on MJSynth with a configuration file, resuming from the latest checkpoint of the output
+directory if there is one (see vit.train.trainer).
+
+Usage: python -m vit.train --config config.yaml [--max-steps N]
+"""
+import argparse
+
+from vit.train.trainer import load_config, train
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--config", required=True, help="A JSON or YAML configuration file")
+    parser.add_argument("--max-steps", type=int, help="Maximal number of steps to run before exiting")
+    args = parser.parse_args()
+
+    train(load_config(args.config), args.max_steps)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""Distills a saved ViT-STR model (a teacher) into a smaller and faster student model, and reports latency and accuracy
+of both on IIIT5K.
+
+The student is trained on MJSynth with vit.losses.DistillationLoss. Per-frame log-probabilities of the teacher are
+calculated once and cached as GZIP-compressed TFRecord files of float16 values, so the teacher isn't run on every
+epoch (or in later runs with the same teacher and train dataset, which are stored with the cache). Cached outputs are
+matched to samples by their order, so the train dataset is read in the same order when the cache is written and read,
+and is shuffled only after that.
+
+Usage: python -m vit.train.distill --teacher notebooks/saved_model --mjsynth PATH [--mjsynth-cache PATH] --iiit5k PATH
+    [--teacher-cache teacher_cache] [--num-layers 2] [--model-dim 256] [--output-dir distilled]
+"""
+import argparse
+import json
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+
+import datasets
+import vit
+from vit.decoding import GreedyDecoder, label_folding_matrix
+from vit.inference import evaluate_accuracy
+from vit.inference.export_tflite import measure_latency
+
+
+LABELS_PADDING_CONST = -1
+
+# A file that is written after all shards of a teacher cache, so that incomplete caches are never read
+CACHE_INFO_FILENAME = "cache_info.json"
+
+CACHE_FEATURES = {
+    "log_probs": tf.io.FixedLenFeature([], tf.string)
+}
+
+
+def final_output(model, images):
+    """Returns the final output of a model (models with early exit heads return a list of outputs)."""
+    outputs = model(images, training=False)
+    return outputs[-1] if isinstance(outputs, (list, tuple)) else outputs
+
+
+def write_teacher_cache(teacher, images_ds, cache_path, source, batch_size=256, samples_per_shard=100000):
+    """Writes log-probabilities of a teacher for a dataset of images as GZIP-compressed TFRecord files of float16
+    values.
+
+    :param teacher: A model that maps a batch of images to per-frame probabilities of labels.
+    :param images_ds: A tf.data.Dataset of images (in the order that is used to read the cache).
+    :param cache_path: Path to a directory where the cache will be written.
+    :param source: A JSON-serializable value that identifies the teacher and the dataset (see cache_source()), which is
+        stored with the cache.
+    :param batch_size: Batch size of the teacher.
+    :param samples_per_shard: Number of samples per file, files contain consecutive samples.
+    :return: A dict with the source and numbers of samples, frames and classes.
+    """
+    cache_path = Path(cache_path)
+    cache_path.mkdir(parents=True, exist_ok=True)
+    (cache_path / CACHE_INFO_FILENAME).unlink(missing_ok=True)
+    for shard in cache_path.glob("teacher-*.tfrecord"):
+        shard.unlink()
+
+    @tf.function(reduce_retracing=True)
+    def predict(images):
+        probs = tf.cast(final_output(teacher, images), tf.float32)
+        return tf.cast(tf.math.log(probs + vit.losses.CTCLoss.EPSILON), tf.float16)
+
+    options = tf.io.TFRecordOptions(compression_type="GZIP")
+    writer = None
+    samples_count = 0
+    try:
+        for images in images_ds.batch(batch_size).prefetch(tf.data.experimental.AUTOTUNE):
+            for log_probs in predict(images).numpy():
+                if samples_count % samples_per_shard == 0:
+                    if writer is not None:
+                        writer.close()
+                    shard_path = cache_path / f"teacher-{samples_count // samples_per_shard:05d}.tfrecord"
+                    writer = tf.io.TFRecordWriter(shard_path.as_posix(), options)
+                writer.write(serialize_log_probs(log_probs))
+                samples_count += 1
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if not samples_count:
+        raise ValueError("The dataset of images is empty")
+    cache_info = {"source": source, "samples": samples_count, "frames": int(log_probs.shape[0]),
+                  "classes": int(log_probs.shape[1])}
+    (cache_path / CACHE_INFO_FILENAME).write_text(json.dumps(cache_info))
+    return cache_info
+
+
+def cache_source(teacher_path, mjsynth_path, mjsynth_cache_path=None, train_samples=None):
+    """Returns a dict that identifies teacher outputs of a train dataset: resolved paths of the teacher and the dataset,
+    the number of train samples, the latest modification time of teacher files, so that a cache is rebuilt when
+    the teacher is retrained at the same path, and the number of interleaved shards of a preprocessed MJSynth cache,
+    which determines the order of its samples."""
+    teacher_path = Path(teacher_path).resolve()
+    teacher_files = [teacher_path] + (list(teacher_path.rglob("*")) if teacher_path.is_dir() else [])
+    return {"teacher": teacher_path.as_posix(),
+            "teacher_mtime": max(path.stat().st_mtime for path in teacher_files),
+            "mjsynth": Path(mjsynth_path).resolve().as_posix(),
+            "mjsynth_cache": None if mjsynth_cache_path is None else Path(mjsynth_cache_path).resolve().as_posix(),
+            "mjsynth_cache_cycle_length": None if mjsynth_cache_path is None else datasets.RECORDS_CYCLE_LENGTH,
+            "train_samples": train_samples}
+
+
+def load_cache_info(cache_path):
+    """Returns a dict that was returned by write_teacher_cache() or None if there is no complete cache."""
+    cache_info_path = Path(cache_path) / CACHE_INFO_FILENAME
+    return json.loads(cache_info_path.read_text()) if cache_info_path.exists() else None
+
+
+def read_teacher_cache(cache_path):
+    """Reads a cache written by write_teacher_cache() as a tf.data.Dataset of [frames, classes] float16 tensors of
+    log-probabilities in the order they were written."""
+    cache_info = load_cache_info(cache_path)
+    if cache_info is None:
+        raise FileNotFoundError(f"No complete teacher cache was found in {cache_path}")
+
+    filenames = sorted(path.as_posix() for path in Path(cache_path).glob("teacher-*.tfrecord"))
+    shape = [cache_info["frames"], cache_info["classes"]]
+
+    def parse(record):
+        log_probs = tf.io.parse_single_example(record, CACHE_FEATURES)["log_probs"]
+        return tf.reshape(tf.io.decode_raw(log_probs, tf.float16), shape)
+
+    return tf.data.TFRecordDataset(filenames, compression_type="GZIP").map(
+        parse, num_parallel_calls=tf.data.experimental.AUTOTUNE, deterministic=True)
+
+
+def serialize_log_probs(log_probs):
+    example = tf.train.Example(features=tf.train.Features(feature={
+        "log_probs": tf.train.Feature(bytes_list=tf.train.BytesList(value=[log_probs.astype(np.float16).tobytes()]))
+    }))
+    return example.SerializeToString()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--teacher", required=True, help="Path to a saved teacher model")
+    parser.add_argument("--mjsynth", required=True, help="Path to the MJSynth dataset")
+    parser.add_argument("--mjsynth-cache", help="Path to MJSynth shards written by compile_mjsynth()")
+    parser.add_argument("--iiit5k", required=True, help="Path to the IIIT5K dataset for evaluation")
+    parser.add_argument("--teacher-cache", default="teacher_cache", help="A directory for teacher log-probabilities")
+    parser.add_argument("--output-dir", default="distilled")
+    parser.add_argument("--train-samples", type=int, help="Number of MJSynth train samples (all if None)")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--shuffle-buffer-size", type=int, default=10000)
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--learning-rate", type=float, default=1E-3)
+    parser.add_argument("--warmup-fraction", type=float, default=0.1)
+    parser.add_argument("--kl-weight", type=float, default=0.5)
+    parser.add_argument("--temperature", type=float, default=2.0)
+    parser.add_argument("--patch-width", type=int, default=4)
+    parser.add_argument("--num-layers", type=int, default=2)
+    parser.add_argument("--model-dim", type=int, default=256)
+    parser.add_argument("--num-heads", type=int, default=4)
+    parser.add_argument("--mlp-dim", type=int, default=1024)
+    parser.add_argument("--dropout", type=float, default=0.1)
+    parser.add_argument("--eval-samples", type=int, help="Maximal number of IIIT5K test samples to evaluate")
+    parser.add_argument("--latency-samples", type=int, default=200)
+    args = parser.parse_args()
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    teacher = tf.keras.models.load_model(args.teacher, compile=False)
+    train_ds = datasets.load_mjsynth(args.mjsynth, args.mjsynth_cache)[0]
+    if args.train_samples is not None:
+        train_ds = train_ds.take(args.train_samples)
+
+    source = cache_source(args.teacher, args.mjsynth, args.mjsynth_cache, args.train_samples)
+    cache_info = load_cache_info(args.teacher_cache)
+    if cache_info is None or cache_info.get("source") != source:
+        print("Caching teacher outputs...")
+        cache_info = write_teacher_cache(teacher, train_ds.map(lambda image, labels: image), args.teacher_cache,
+                                         source, args.batch_size)
+    frames_count, classes_count = cache_info["frames"], cache_info["classes"]
+
+    student = vit.models.build_vit_str(classes_count, datasets.IMAGE_HEIGHT, datasets.IMAGE_CHANNELS,
+                                       image_width=datasets.IMAGE_WIDTH, patch_width=args.patch_width,
+                                       num_layers=args.num_layers, model_dim=args.model_dim, num_heads=args.num_heads,
+                                       mlp_dim=args.mlp_dim, dropout=args.dropout)
+    if student.output_shape[1] != frames_count:
+        raise ValueError(f"The student outputs {student.output_shape[1]} frames, but the teacher outputs "
+                         f"{frames_count}, patch widths of the models should be the same")
+
+    loss = vit.losses.DistillationLoss(LABELS_PADDING_CONST, kl_weight=args.kl_weight, temperature=args.temperature)
+    distillation_ds = tf.data.Dataset.zip((train_ds, read_teacher_cache(args.teacher_cache)))
+    distillation_ds = distillation_ds.map(lambda sample, log_probs: (*sample, log_probs))
+    distillation_ds = distillation_ds.shuffle(args.shuffle_buffer_size).padded_batch(
+        args.batch_size,
+        padded_shapes=([datasets.IMAGE_HEIGHT, datasets.IMAGE_WIDTH, datasets.IMAGE_CHANNELS], [frames_count],
+                       [frames_count, classes_count]),
+        padding_values=(None, LABELS_PADDING_CONST, None))
+    distillation_ds = distillation_ds.map(lambda images, labels, log_probs: (images, loss.pack_targets(labels,
+                                                                                                       log_probs)))
+
+    steps_per_epoch = (cache_info["samples"] + args.batch_size - 1) // args.batch_size
+    lr_schedule = vit.schedules.CosineWarmupDecay(args.learning_rate, steps_per_epoch * args.epochs,
+                                                  args.warmup_fraction)
+    student.compile(optimizer=tf.keras.optimizers.Adam(lr_schedule), loss=loss)
+    student.fit(distillation_ds.prefetch(tf.data.experimental.AUTOTUNE), epochs=args.epochs, verbose=2)
+    student.save((output_dir / "saved_model").as_posix())
+
+    test_ds = datasets.load_iiit5k(args.iiit5k)[1]
+    latency_images = np.stack([image.numpy() for image, _ in test_ds.take(args.latency_samples)])
+    # IIIT5K labels are case-insensitive
+    decoder = GreedyDecoder(label_folding=label_folding_matrix(datasets.CHARS, datasets.IIIT5K_CHARS))
+
+    report = {}
+    for name, model in (("teacher", teacher), ("student", student)):
+        predict = tf.function(lambda images, model=model: final_output(model, images), reduce_retracing=True)
+        report[name] = {"parameters": model.count_params(),
+                        "latency_ms": measure_latency(lambda images: predict(images).numpy(), latency_images),
+                        "accuracy": evaluate_accuracy(predict, test_ds, decoder, max_samples=args.eval_samples)}
+        print(f"{name:>8}: {report[name]['parameters']} parameters, latency {report[name]['latency_ms']:.2f} ms, "
+              f"accuracy {report[name]['accuracy']:.2%}")
+
+    (output_dir / "report.json").write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Trains a ViT-STR model with data parallelism across workers using tf.distribute.MultiWorkerMirroredStrategy.
+
+Workers are configured with the TF_CONFIG environment variable (see python -m vit.train.launch), without it training
+runs in a single process. Every worker reads its own shard of the MJSynth train dataset (or synthetic samples if no
+dataset is passed), labels are padded to a fixed length, so that shapes of all batches are the same on all workers.
+
+Usage: python -m vit.train.distributed [--mjsynth PATH [--mjsynth-cache PATH]] [--per-worker-batch-size N]
+    [--steps N] [--epochs N] [--threads N] [--output results.json]
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+import tensorflow as tf
+
+import datasets
+import vit
+
+
+LABELS_PADDING_CONST = -1
+
+
+def build_dataset(input_context, args):
+    """Builds a per-worker dataset for strategy.distribute_datasets_from_function()."""
+    global_batch_size = args.per_worker_batch_size * input_context.num_input_pipelines
+    batch_size = input_context.get_per_replica_batch_size(global_batch_size)
+    max_label_length = datasets.IMAGE_WIDTH // args.patch_width
+
+    if args.mjsynth is not None:
+        dataset = datasets.load_mjsynth(args.mjsynth, args.mjsynth_cache, num_shards=input_context.num_input_pipelines,
+                                        shard_index=input_context.input_pipeline_id)[0]
+        dataset = dataset.shuffle(args.shuffle_buffer_size, seed=input_context.input_pipeline_id).repeat()
+    else:
+        rng = np.random.default_rng(input_context.input_pipeline_id)
+        image = rng.uniform(-1, 1, size=[datasets.IMAGE_HEIGHT, datasets.IMAGE_WIDTH, datasets.IMAGE_CHANNELS])
+        labels = rng.integers(0, len(datasets.CHARS), size=10)
+        dataset = tf.data.Dataset.from_tensors((tf.constant(image, tf.float32), tf.constant(labels, tf.int32)))
+        dataset = dataset.repeat()
+
+    dataset = dataset.padded_batch(
+        batch_size,
+        padded_shapes=([datasets.IMAGE_HEIGHT, datasets.IMAGE_WIDTH, datasets.IMAGE_CHANNELS], [max_label_length]),
+        padding_values=(None, LABELS_PADDING_CONST),
+        drop_remainder=True)
+
+    # Sharding is done above, so that images of other workers aren't even decoded
+    options = tf.data.Options()
+    options.experimental_distribute.auto_shard_policy = tf.data.experimental.AutoShardPolicy.OFF
+    return dataset.with_options(options).prefetch(tf.data.experimental.AUTOTUNE)
+
+
+def is_chief():
+    task = json.loads(os.environ.get("TF_CONFIG", "{}")).get("task", {})
+    return task.get("type", "worker") in ("chief", "worker") and task.get("index", 0) == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mjsynth", help="Path to the MJSynth dataset (synthetic samples are used if None)")
+    parser.add_argument("--mjsynth-cache", help="Path to MJSynth shards written by compile_mjsynth()")
+    parser.add_argument("--per-worker-batch-size", type=int, default=64)
+    parser.add_argument("--shuffle-buffer-size", type=int, default=1000)
+    parser.add_argument("--steps", type=int, default=100, help="Number of steps per epoch")
+    parser.add_argument("--epochs", type=int, default=1)
+    parser.add_argument("--learning-rate", type=float, default=1E-3)
+    parser.add_argument("--warmup-fraction", type=float, default=0.1)
+    parser.add_argument("--patch-width", type=int, default=4)
+    parser.add_argument("--num-layers", type=int, default=5)
+    parser.add_argument("--model-dim", type=int, default=512)
+    parser.add_argument("--num-heads", type=int, default=8)
+    parser.add_argument("--mlp-dim", type=int, default=2048)
+    parser.add_argument("--recompute", action="store_true",
+                        help="Recompute encoder activations during the backward pass to reduce memory usage")
+    parser.add_argument("--threads", type=int, help="Number of intra-op threads per worker")
+    parser.add_argument("--output", help="A JSON file for training results, that is written by the chief worker")
+    args = parser.parse_args()
+
+    if args.threads is not None:
+        tf.config.threading.set_intra_op_parallelism_threads(args.threads)
+        tf.config.threading.set_inter_op_parallelism_threads(2)
+
+    strategy = tf.distribute.MultiWorkerMirroredStrategy()
+    # Every CPU worker has a single replica
+    global_batch_size = args.per_worker_batch_size * strategy.num_replicas_in_sync
+    train_ds = strategy.distribute_datasets_from_function(lambda input_context: build_dataset(input_context, args))
+
+    with strategy.scope():
+        model = vit.models.build_vit_str(len(datasets.CHARS) + 1, datasets.IMAGE_HEIGHT, datasets.IMAGE_CHANNELS,
+                                         image_width=datasets.IMAGE_WIDTH, patch_width=args.patch_width,
+                                         num_layers=args.num_layers, model_dim=args.model_dim,
+                                         num_heads=args.num_heads, mlp_dim=args.mlp_dim, recompute=args.recompute)
+        lr_schedule = vit.schedules.CosineWarmupDecay(args.learning_rate, args.steps * args.epochs,
+                                                      args.warmup_fraction)
+        model.compile(optimizer=tf.keras.optimizers.Adam(lr_schedule),
+                      loss=vit.losses.CTCLoss(true_labels_padding_value=LABELS_PADDING_CONST),
+                      metrics=[vit.metrics.CTCAccuracy(true_labels_padding_value=LABELS_PADDING_CONST)])
+
+    throughput = vit.callbacks.Throughput(global_batch_size, warmup_steps=min(5, args.steps // 2))
+    history = model.fit(train_ds, epochs=args.epochs, steps_per_epoch=args.steps, callbacks=[throughput],
+                        verbose=2 if is_chief() else 0)
+
+    if is_chief() and args.output is not None:
+        results = {"workers": strategy.num_replicas_in_sync, "global_batch_size": global_batch_size,
+                   "samples_per_sec": throughput.history[-1] if throughput.history else None,
+                   "loss": history.history["loss"][-1], "accuracy": history.history["accuracy"][-1]}
+        with open(args.output, "w") as file:
+            json.dump(results, file)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Runs data-parallel training in a number of local worker processes, e.g. to check scaling on multi-socket CPU
+machines.
+
+Every worker gets a TF_CONFIG with a local cluster of all workers and, with --pin-cpus, a separate subset of CPUs.
+Arguments after "--" are passed to every worker.
+
+Usage: python -m vit.train.launch --workers 4 [--pin-cpus] -- [arguments of python -m vit.train.distributed]
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+
+def find_free_ports(count):
+    sockets = [socket.socket() for _ in range(count)]
+    for sock in sockets:
+        sock.bind(("localhost", 0))
+    ports = [sock.getsockname()[1] for sock in sockets]
+    for sock in sockets:
+        sock.close()
+    return ports
+
+
+def split_cpus(workers_count):
+    """Splits CPUs available to the process into contiguous groups per worker (contiguous CPU numbers usually belong
+    to the same socket)."""
+    cpus = sorted(os.sched_getaffinity(0))
+    group_size = max(len(cpus) // workers_count, 1)
+    return [set(cpus[(i * group_size) % len(cpus):(i * group_size) % len(cpus) + group_size])
+            for i in range(workers_count)]
+
+
+def launch(workers_count, worker_args, pin_cpus=False, module="vit.train.distributed"):
+    """Runs worker processes and waits for them to finish.
+
+    :param workers_count: Number of workers.
+    :param worker_args: A list of command line arguments of every worker.
+    :param pin_cpus: Whether every worker should run on a separate group of CPUs.
+    :param module: A module that is run by workers.
+    :return: The exit code of the first worker that failed (0 if all workers succeeded) and a list of exit codes of
+        all workers (if one of workers fails, the rest are terminated).
+    """
+    cluster = {"worker": [f"localhost:{port}" for port in find_free_ports(workers_count)]}
+    cpu_groups = split_cpus(workers_count) if pin_cpus else [None] * workers_count
+
+    processes = []
+    for i, cpus in enumerate(cpu_groups):
+        env = dict(os.environ, TF_CONFIG=json.dumps({"cluster": cluster, "task": {"type": "worker", "index": i}}))
+        preexec_fn = (lambda cpus=cpus: os.sched_setaffinity(0, cpus)) if cpus is not None else None
+        processes.append(subprocess.Popen([sys.executable, "-m", module] + list(worker_args), env=env,
+                                          preexec_fn=preexec_fn))
+
+    # Workers wait for each other in collective operations, so a failed worker would block the rest forever
+    exit_code = 0
+    while any(process.poll() is None for process in processes):
+        # The exit code is taken before the rest are terminated, as they exit with -SIGTERM
+        exit_code = next((process.poll() for process in processes if process.poll()), 0)
+        if exit_code:
+            for process in processes:
+                if process.poll() is None:
+                    process.terminate()
+            break
+        time.sleep(0.1)
+    exit_codes = [process.wait() for process in processes]
+    return exit_code or next((code for code in exit_codes if code), 0), exit_codes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--pin-cpus", action="store_true", help="Run every worker on a separate group of CPUs")
+    parser.add_argument("worker_args", nargs=argparse.REMAINDER, help="Arguments of workers after --")
+    args = parser.parse_args()
+
+    worker_args = args.worker_args[1:] if args.worker_args[:1] == ["--"] else args.worker_args
+    exit_code, _ = launch(args.workers, worker_args, args.pin_cpus)
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Captures a TensorBoard profile of a number of training steps of a ViT-STR model, e.g. to investigate a regression of
+training speed on a CPU-only machine.
+
+The model and the train dataset are built from a configuration file of vit.train (or from DEFAULT_CONFIG with
+synthetic data if no configuration is passed). Trace annotations of vit components are enabled (see vit.profiling),
+so time of attention, MLP, CTC loss and decoding ops can be found in the profile by their names, and dataset stages are
+named in tf.data events. Input waiting and computation time of every step are written by vit.callbacks.StepProfiler.
+
+Usage: python -m vit.train.profile [--config config.yaml] [--steps 10] [--warmup-steps 5] [--log-dir profile]
+    [--no-summaries]
+    and then: tensorboard --logdir profile
+"""
+import argparse
+import json
+from pathlib import Path
+
+import tensorflow as tf
+
+import vit
+from vit.train.trainer import build_datasets, build_model, load_config, merge_config
+
+
+class ProfileSteps(tf.keras.callbacks.Callback):
+    """Captures a profile of training steps in [start_step, start_step + steps) (counted from 0).
+
+    Unlike the TensorBoard callback, it doesn't write summaries, so it doesn't require the tensorboard package.
+    """
+
+    def __init__(self, log_dir, start_step, steps):
+        super().__init__()
+        self.log_dir = log_dir
+        self.start_step = start_step
+        self.steps = steps
+        self._step = 0
+        self._is_profiling = False
+
+    def on_train_batch_begin(self, batch, logs=None):
+        if self._step == self.start_step:
+            tf.profiler.experimental.start(str(self.log_dir))
+            self._is_profiling = True
+
+    def on_train_batch_end(self, batch, logs=None):
+        self._step += 1
+        if self._is_profiling and self._step == self.start_step + self.steps:
+            self._stop()
+
+    def on_train_end(self, logs=None):
+        if self._is_profiling:
+            self._stop()
+
+    def _stop(self):
+        tf.profiler.experimental.stop()
+        self._is_profiling = False
+
+
+def capture_profile(config, log_dir, steps=10, warmup_steps=5, summaries=True):
+    """Runs warmup_steps + steps training steps and captures a profile of the last steps.
+
+    :param config: A configuration dict (see vit.train.trainer.DEFAULT_CONFIG).
+    :param log_dir: A directory where the profile, TensorBoard summaries and step records ("steps.jsonl") are written.
+    :param steps: Number of profiled steps.
+    :param warmup_steps: Number of steps before profiling, which include tracing and compilation.
+    :param summaries: Whether step records should also be written as TensorBoard summaries (requires the tensorboard
+        package).
+    :return: A dict with input waiting fraction, images per second and peak host memory of the profiled steps.
+    """
+    log_dir = Path(log_dir)
+    log_dir.mkdir(parents=True, exist_ok=True)
+    # Annotations are added when functions are traced, so tracing is enabled before the model is built
+    vit.profiling.enable_tracing()
+    tf.keras.utils.set_random_seed(config["seed"])
+
+    try:
+        model = build_model(config, warmup_steps + steps)
+        train_ds, _ = build_datasets(config["data"], model.outputs[-1].shape[1], config["seed"])
+
+        step_profiler = vit.callbacks.StepProfiler(log_dir if summaries else None, log_dir / "steps.jsonl",
+                                                   warmup_steps=warmup_steps)
+        model.fit(train_ds, epochs=1, steps_per_epoch=warmup_steps + steps,
+                  callbacks=[step_profiler, ProfileSteps(log_dir, warmup_steps, steps)], verbose=0)
+    finally:
+        vit.profiling.enable_tracing(False)
+    return step_profiler.history[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--config", help="A JSON or YAML configuration file (synthetic data is used if not passed)")
+    parser.add_argument("--steps", type=int, default=10, help="Number of profiled steps")
+    parser.add_argument("--warmup-steps", type=int, default=5, help="Number of steps before profiling")
+    parser.add_argument("--log-dir", default="profile")
+    parser.add_argument("--no-summaries", action="store_true",
+                        help="Don't write TensorBoard summaries of steps, e.g. if tensorboard isn't installed")
+    args = parser.parse_args()
+
+    config = load_config(args.config) if args.config is not None else merge_config({})
+    summary = capture_profile(config, args.log_dir, args.steps, args.warmup_steps, not args.no_summaries)
+    print(json.dumps(summary))
+    print(f"The profile is written to {args.log_dir}, run: tensorboard --logdir {args.log_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Tests for knowledge distillation."""
+import os
+
+import numpy as np
+import tensorflow as tf
+
+from numpy.testing import assert_allclose
+
+import vit
+from vit.train.distill import cache_source, load_cache_info, read_teacher_cache, write_teacher_cache
+
+
+def build_model(num_layers, model_dim):
+    return vit.models.build_vit_str(num_classes=5, image_height=32, image_channels=1, image_width=40,
+                                    num_layers=num_layers, model_dim=model_dim, num_heads=2, mlp_dim=2 * model_dim,
+                                    dropout=0.0)
+
+
+def test_write_teacher_cache__outputs_are_read_in_order(tmp_path):
+    images = np.random.uniform(-1, 1, size=[7, 32, 40, 1]).astype(np.float32)
+    teacher = build_model(num_layers=2, model_dim=16)
+
+    cache_info = write_teacher_cache(teacher, tf.data.Dataset.from_tensor_slices(images), tmp_path, {"teacher": "t"},
+                                     batch_size=3, samples_per_shard=2)
+    log_probs = np.stack(list(read_teacher_cache(tmp_path).as_numpy_iterator()))
+
+    assert cache_info == load_cache_info(tmp_path) == {"source": {"teacher": "t"}, "samples": 7, "frames": 10,
+                                                       "classes": 5}
+    assert log_probs.dtype == np.float16
+    assert_allclose(np.exp(log_probs.astype(np.float32)), teacher(images), atol=1E-3)
+
+
+def test_distillation_loss__student_is_trained_on_cached_outputs(tmp_path):
+    images = np.random.uniform(-1, 1, size=[8, 32, 40, 1]).astype(np.float32)
+    labels = np.array([[0, 1, -1], [2, 3, 3], [1, -1, -1], [3, 2, 1]] * 2, dtype=np.int32)
+    teacher = build_model(num_layers=2, model_dim=16)
+    student = build_model(num_layers=1, model_dim=8)
+    loss = vit.losses.DistillationLoss()
+
+    write_teacher_cache(teacher, tf.data.Dataset.from_tensor_slices(images), tmp_path, "teacher")
+    dataset = tf.data.Dataset.zip((tf.data.Dataset.from_tensor_slices((images, labels)), read_teacher_cache(tmp_path)))
+    dataset = dataset.batch(4).map(lambda sample, log_probs: (sample[0], loss.pack_targets(sample[1], log_probs)))
+    student.compile(optimizer=tf.keras.optimizers.Adam(1E-2), loss=loss)
+    history = student.fit(dataset, epochs=5, verbose=0)
+
+    assert history.history["loss"][-1] < history.history["loss"][0]
+
+
+def test_cache_source__changes_with_the_teacher_and_the_dataset(tmp_path):
+    teacher_path = tmp_path / "teacher"
+    (teacher_path / "variables").mkdir(parents=True)
+    (teacher_path / "variables" / "variables.index").write_bytes(b"weights")
+    source = cache_source(teacher_path, tmp_path / "mjsynth", train_samples=100)
+
+    assert cache_source(teacher_path, tmp_path / "mjsynth", train_samples=100) == source
+    assert cache_source(teacher_path, tmp_path / "mjsynth", train_samples=200) != source
+    assert cache_source(teacher_path, tmp_path / "other_mjsynth", train_samples=100) != source
+    assert cache_source(teacher_path, tmp_path / "mjsynth", tmp_path / "shards", train_samples=100) != source
+    # The teacher is retrained at the same path
+    os.utime(teacher_path / "variables" / "variables.index", (source["teacher_mtime"] + 10,) * 2)
+    assert cache_source(teacher_path, tmp_path / "mjsynth", train_samples=100) != source
@@ -0,0 +1,34 @@
+"""Tests for local multi-worker training."""
+import json
+import signal
+
+from vit.train.launch import launch
+
+
+def test_launch__workers_train_together(tmp_path):
+    output_path = tmp_path / "results.json"
+    worker_args = ["--steps", "4", "--per-worker-batch-size", "4", "--num-layers", "1", "--model-dim", "16",
+                   "--num-heads", "2", "--mlp-dim", "32", "--output", str(output_path)]
+
+    exit_code, exit_codes = launch(2, worker_args)
+
+    results = json.loads(output_path.read_text())
+    assert exit_code == 0
+    assert exit_codes == [0, 0]
+    assert results["workers"] == 2
+    assert results["global_batch_size"] == 8
+
+
+def test_launch__exit_code_of_failed_worker_is_returned(tmp_path, monkeypatch):
+    # The first worker fails, while the second one would wait for it forever
+    (tmp_path / "failing_worker.py").write_text(
+        "import json, os, sys, time\n"
+        "if json.loads(os.environ['TF_CONFIG'])['task']['index'] == 0:\n"
+        "    sys.exit(3)\n"
+        "time.sleep(60)\n")
+    monkeypatch.setenv("PYTHONPATH", str(tmp_path))
+
+    exit_code, exit_codes = launch(2, [], module="failing_worker")
+
+    assert exit_code == 3
+    assert exit_codes == [3, -signal.SIGTERM]
@@ -0,0 +1,19 @@
+"""Tests for profile capturing."""
+import json
+
+from vit.train.profile import capture_profile
+from vit.train.trainer import merge_config
+
+
+def test_capture_profile__profile_and_step_records_are_written(tmp_path):
+    config = merge_config({
+        "data": {"synthetic_samples": 16, "batch_size": 4, "shuffle_buffer_size": 16},
+        "model": {"num_layers": 1, "model_dim": 16, "num_heads": 2, "mlp_dim": 32}
+    })
+
+    summary = capture_profile(config, tmp_path, steps=2, warmup_steps=1, summaries=False)
+
+    assert list(tmp_path.glob("**/*.xplane.pb"))
+    records = [json.loads(line) for line in (tmp_path / "steps.jsonl").read_text().splitlines()]
+    assert len(records) == 3
+    assert summary["images_per_sec"] > 0
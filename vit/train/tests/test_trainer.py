@@ -0,0 +1,52 @@
+"""Tests for resumable training."""
+import json
+
+import numpy as np
+import pytest
+
+from vit.train.trainer import load_config, merge_config, train
+
+
+def build_config(output_dir, recompute=False):
+    return merge_config({
+        "data": {"synthetic_samples": 24, "batch_size": 4, "shuffle_buffer_size": 16},
+        "model": {"num_layers": 1, "model_dim": 16, "num_heads": 2, "mlp_dim": 32, "dropout": 0.1,
+                  "recompute": recompute},
+        "training": {"epochs": 2, "log_every": 1, "checkpoint_every": 100},
+        "output_dir": str(output_dir)
+    })
+
+
+@pytest.mark.parametrize("recompute", (False, True))
+def test_train__resumed_training_matches_uninterrupted_one(tmp_path, recompute):
+    model = train(build_config(tmp_path / "uninterrupted", recompute))
+
+    interrupted_config = build_config(tmp_path / "interrupted", recompute)
+    # Training is interrupted in the middle of both epochs
+    train(interrupted_config, max_steps=4)
+    train(interrupted_config, max_steps=5)
+    resumed_model = train(interrupted_config)
+
+    for weights, resumed_weights in zip(model.get_weights(), resumed_model.get_weights()):
+        np.testing.assert_array_equal(resumed_weights, weights)
+    history = [json.loads(line) for line in (tmp_path / "interrupted" / "history.jsonl").read_text().splitlines()]
+    assert [logs["step"] for logs in history] == list(range(1, 13))
+    assert (tmp_path / "interrupted" / "saved_model").exists()
+
+
+def test_train__model_with_exit_layers_is_trained(tmp_path):
+    config = build_config(tmp_path)
+    config["model"].update(num_layers=2, exit_layers=[1])
+
+    model = train(config, max_steps=2)
+
+    assert len(model.outputs) == 2
+    assert (tmp_path / "history.jsonl").exists()
+
+
+def test_load_config__unknown_keys_raise_error(tmp_path):
+    config_path = tmp_path / "config.json"
+    config_path.write_text(json.dumps({"training": {"epoch": 1}}))
+
+    with pytest.raises(ValueError):
+        load_config(config_path)
@@ -0,0 +1,218 @@
+"""Training of ViT-STR models on MJSynth from a configuration file, which can be interrupted and resumed.
+
+The model, the optimizer, random states of dropout layers and the state of the train dataset iterator (including its
+shuffle buffer) are checkpointed together, so training resumes from the step where the last checkpoint was saved rather
+than from the start of the epoch, and sees the same batches and dropout masks that it would see without an
+interruption.
+
+A configuration of the training notebook looks like this (missing values are taken from DEFAULT_CONFIG):
+
+    data: {mjsynth: /datasets/mjsynth, batch_size: 512}
+    model: {num_layers: 5, model_dim: 512, num_heads: 8, mlp_dim: 2048}
+    training: {epochs: 6, learning_rate: 0.001, weight_decay: 0.0}
+    output_dir: training/mjsynth
+"""
+import copy
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+
+import datasets
+import vit
+
+
+LABELS_PADDING_CONST = -1
+
+# Configuration sections and their default values. Values of the model section are passed to build_vit_str(). If
+# data.mjsynth is None, data.synthetic_samples random samples are used instead of MJSynth.
+DEFAULT_CONFIG = {
+    "data": {
+        "mjsynth": None,
+        "mjsynth_cache": None,
+        "train_size": 7224586,
+        "synthetic_samples": 1024,
+        "batch_size": 512,
+        "shuffle_buffer_size": 1000,
+        "validation_steps": None
+    },
+    "model": {
+        "patch_width": 4,
+        "num_layers": 5,
+        "model_dim": 512,
+        "num_heads": 8,
+        "mlp_dim": 2048,
+        "dropout": 0.1
+    },
+    "training": {
+        "epochs": 6,
+        "learning_rate": 1E-3,
+        "warmup_fraction": 0.1,
+        "weight_decay": 0.0,
+        "jit_compile": False,
+        "log_every": 100,
+        "checkpoint_every": 1000,
+        "max_checkpoints": 3
+    },
+    "output_dir": "training",
+    "seed": 42
+}
+
+
+def load_config(path):
+    """Loads a JSON or YAML (requires PyYAML) configuration file and fills missing values with DEFAULT_CONFIG.
+
+    :param path: Path to a .json, .yaml or .yml file.
+    :return: A configuration dict.
+    """
+    path = Path(path)
+    if path.suffix in (".yaml", ".yml"):
+        import yaml
+        config = yaml.safe_load(path.read_text())
+    else:
+        config = json.loads(path.read_text())
+    return merge_config(config or {})
+
+
+def merge_config(config):
+    """Fills missing values of a configuration dict with DEFAULT_CONFIG, raises ValueError for unknown keys."""
+    merged = copy.deepcopy(DEFAULT_CONFIG)
+    for key, value in config.items():
+        if key not in merged:
+            raise ValueError(f"Unknown configuration key '{key}'")
+        if isinstance(merged[key], dict):
+            # Any build_vit_str() argument can be passed in the model section
+            unknown_keys = set(value) - set(merged[key])
+            if unknown_keys and key != "model":
+                raise ValueError(f"Unknown keys of the '{key}' section: {', '.join(sorted(unknown_keys))}")
+            merged[key].update(value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def build_datasets(data_config, frames_count, seed):
+    """Builds a repeated and shuffled train dataset and a validation dataset (None for synthetic data)."""
+    if data_config["mjsynth"] is not None:
+        train_ds, val_ds, _ = datasets.load_mjsynth(data_config["mjsynth"], data_config["mjsynth_cache"])
+    else:
+        rng = np.random.default_rng(seed)
+        samples_count = data_config["synthetic_samples"]
+        images = rng.uniform(-1, 1, size=[samples_count, datasets.IMAGE_HEIGHT, datasets.IMAGE_WIDTH,
+                                          datasets.IMAGE_CHANNELS]).astype(np.float32)
+        lengths = rng.integers(1, 11, size=[samples_count, 1])
+        labels = rng.integers(0, len(datasets.CHARS), size=[samples_count, 10]).astype(np.int32)
+        labels = np.where(np.arange(10) < lengths, labels, LABELS_PADDING_CONST)
+        train_ds = tf.data.Dataset.from_tensor_slices((images, labels))
+        val_ds = None
+
+    def batch(dataset):
+        return dataset.padded_batch(
+            data_config["batch_size"],
+            padded_shapes=([datasets.IMAGE_HEIGHT, datasets.IMAGE_WIDTH, datasets.IMAGE_CHANNELS], [frames_count]),
+            padding_values=(None, LABELS_PADDING_CONST))
+
+    # The shuffle buffer is a part of the iterator state, so it is checkpointed too
+    train_ds = train_ds.shuffle(data_config["shuffle_buffer_size"], seed=seed).repeat()
+    train_ds = batch(train_ds).prefetch(tf.data.experimental.AUTOTUNE)
+    if val_ds is not None:
+        val_ds = batch(val_ds).prefetch(tf.data.experimental.AUTOTUNE)
+    return train_ds, val_ds
+
+
+def build_optimizer(training_config, total_steps):
+    """Builds AdamW with CosineWarmupDecay of the learning rate.
+
+    Keras AdamW multiplies weight decay by the learning rate, so it is divided by the maximal learning rate, which makes
+    the effective weight decay follow the same warmup and decay schedule with weight_decay as the maximal value.
+    """
+    learning_rate = training_config["learning_rate"]
+    lr_schedule = vit.schedules.CosineWarmupDecay(learning_rate, total_steps, training_config["warmup_fraction"])
+    return tf.keras.optimizers.AdamW(learning_rate=lr_schedule,
+                                     weight_decay=training_config["weight_decay"] / learning_rate)
+
+
+def build_model(config, total_steps):
+    """Builds a model from the model section of a configuration and compiles it with CTC loss, accuracy and an optimizer
+    from build_optimizer().
+    """
+    model = vit.models.build_vit_str(len(datasets.CHARS) + 1, datasets.IMAGE_HEIGHT, datasets.IMAGE_CHANNELS,
+                                     image_width=datasets.IMAGE_WIDTH, **config["model"])
+    model.compile(optimizer=build_optimizer(config["training"], total_steps),
+                  loss=vit.losses.CTCLoss(true_labels_padding_value=LABELS_PADDING_CONST,
+                                          jit_compile=config["training"]["jit_compile"]),
+                  metrics=[vit.metrics.CTCAccuracy(true_labels_padding_value=LABELS_PADDING_CONST)],
+                  jit_compile=config["training"]["jit_compile"])
+    return model
+
+
+def train(config, max_steps=None):
+    """Trains a model, resuming from the latest checkpoint in config["output_dir"] if there is one.
+
+    :param config: A configuration dict (see DEFAULT_CONFIG and load_config()).
+    :param max_steps: Maximal number of steps to run in this call (None to train until the end), e.g. to split
+        training into several jobs.
+    :return: The trained model.
+    """
+    data_config, training_config = config["data"], config["training"]
+    output_dir = Path(config["output_dir"])
+    output_dir.mkdir(parents=True, exist_ok=True)
+    (output_dir / "config.json").write_text(json.dumps(config, indent=2))
+    # Initial weights and initial random states of dropout are the same for the same seed
+    tf.keras.utils.set_random_seed(config["seed"])
+
+    train_size = data_config["train_size"] if data_config["mjsynth"] is not None else data_config["synthetic_samples"]
+    steps_per_epoch = (train_size + data_config["batch_size"] - 1) // data_config["batch_size"]
+    total_steps = steps_per_epoch * training_config["epochs"]
+
+    model = build_model(config, total_steps)
+    optimizer = model.optimizer
+    # Models with early exit heads (see the exit_layers argument of build_vit_str()) have a list of outputs
+    train_ds, val_ds = build_datasets(data_config, model.outputs[-1].shape[1], config["seed"])
+
+    iterator = iter(train_ds)
+    # Random states of dropout are checkpointed with the model (see vit.layers.SeededDropout)
+    checkpoint = tf.train.Checkpoint(model=model, optimizer=optimizer, iterator=iterator)
+    manager = tf.train.CheckpointManager(checkpoint, output_dir / "checkpoints",
+                                         max_to_keep=training_config["max_checkpoints"])
+    if manager.latest_checkpoint is not None:
+        checkpoint.restore(manager.latest_checkpoint).expect_partial()
+        print(f"Resumed from {manager.latest_checkpoint} at step {int(optimizer.iterations)}")
+
+    train_function = model.make_train_function()
+    history_path = output_dir / "history.jsonl"
+    saved_step = int(optimizer.iterations)
+    steps_run = 0
+    start_time = time.perf_counter()
+    while int(optimizer.iterations) < total_steps and (max_steps is None or steps_run < max_steps):
+        step = int(optimizer.iterations)
+        epoch, epoch_step = divmod(step, steps_per_epoch)
+        # Metrics of an epoch that was interrupted are accumulated from the step where training was resumed
+        if epoch_step == 0 or steps_run == 0:
+            model.reset_metrics()
+
+        logs = train_function(iterator)
+        steps_run += 1
+        step += 1
+
+        is_epoch_end = step % steps_per_epoch == 0
+        if step % training_config["log_every"] == 0 or is_epoch_end:
+            logs = {name: float(value) for name, value in logs.items()}
+            logs.update(epoch=epoch + 1, step=step, seconds=time.perf_counter() - start_time)
+            if is_epoch_end and val_ds is not None:
+                val_logs = model.evaluate(val_ds, steps=data_config["validation_steps"], return_dict=True, verbose=0)
+                logs.update({f"val_{name}": value for name, value in val_logs.items()})
+            print(json.dumps(logs))
+            with open(history_path, "a") as file:
+                file.write(json.dumps(logs) + "\n")
+        if step % training_config["checkpoint_every"] == 0 or is_epoch_end:
+            manager.save(checkpoint_number=step)
+            saved_step = step
+
+    if int(optimizer.iterations) >= total_steps:
+        model.save((output_dir / "saved_model").as_posix())
+    elif int(optimizer.iterations) != saved_step:
+        manager.save(checkpoint_number=int(optimizer.iterations))
+    return model